@@ -0,0 +1,329 @@
+"""
+Audio Analysis - Análisis por ventanas de grabaciones WAV/PCM
+El archivo se mapea en memoria (no se lee entero) y las ventanas son vistas
+con strides sobre las mismas muestras: energía RMS, cruces por cero, rasgos
+espectrales y probabilidad de voz se calculan vectorizados con NumPy.
+
+Es también el VAD del micrófono: is_speech_block decide voz/silencio de cada
+bloque en vivo (endpointing y cortes del STT por trozos) y trim_bounds recorta
+el silencio de una frase antes de subirla.
+
+NumPy es opcional (en Termux: pkg install python-numpy). Sin él solo hay
+energía y cruces por cero, calculados en Python puro.
+"""
+import math
+import mmap
+import os
+import struct
+from array import array
+from typing import Optional
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+try:
+    import audioop  # Eliminado en Python 3.13: hay alternativa en Python puro
+except ImportError:
+    audioop = None
+
+
+class AudioFormatError(ValueError):
+    """El archivo no es un WAV PCM que se pueda analizar"""
+
+
+class PCMInfo:
+    """Dónde están las muestras dentro del archivo y cómo son"""
+
+    def __init__(self, offset: int, length: int, rate: int, width: int, channels: int):
+        self.offset = offset
+        self.length = length
+        self.rate = rate
+        self.width = width
+        self.channels = channels
+
+    @property
+    def duration(self) -> float:
+        return self.length / (self.rate * self.width * self.channels)
+
+
+def read_wav_header(path: str) -> PCMInfo:
+    """Recorre los chunks RIFF hasta 'data' (sin leer las muestras)"""
+    with open(path, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            raise AudioFormatError("No es un WAV (RIFF/WAVE)")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise AudioFormatError("WAV sin chunk 'data'")
+            chunk_id, size = header[:4], struct.unpack('<I', header[4:])[0]
+            if chunk_id == b'fmt ':
+                fmt = struct.unpack('<HHIIHH', f.read(16))
+                f.seek(size - 16 + (size & 1), os.SEEK_CUR)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise AudioFormatError("WAV sin chunk 'fmt '")
+                audio_format, channels, rate, _, _, bits = fmt
+                # 0xFFFE (extensible) suele ser PCM igualmente
+                if audio_format not in (1, 0xFFFE) or bits not in (8, 16):
+                    raise AudioFormatError(f"Formato WAV no soportado ({audio_format}, {bits} bits)")
+                offset = f.tell()
+                available = os.path.getsize(path) - offset
+                # Grabaciones cortadas a medias declaran más datos de los que hay
+                return PCMInfo(offset, min(size, available), rate, bits // 8, channels)
+            else:
+                f.seek(size + (size & 1), os.SEEK_CUR)
+
+
+def is_wav(path: str) -> bool:
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(12)
+    except OSError:
+        return False
+    return head[:4] == b'RIFF' and head[8:12] == b'WAVE'
+
+
+def map_samples(path: str, info: PCMInfo = None, rate: int = 16000, width: int = 2,
+                channels: int = 1):
+    """Muestras del archivo mapeadas en memoria (solo lectura) y su PCMInfo
+
+    Con NumPy devuelve un np.memmap (canal 0 si es estéreo, como vista); sin
+    NumPy, un array copiado desde el mapa. Los .pcm crudos usan rate/width/channels.
+    """
+    if info is None:
+        if is_wav(path):
+            info = read_wav_header(path)
+        else:
+            info = PCMInfo(0, os.path.getsize(path), rate, width, channels)
+    frame_bytes = info.width * info.channels
+    length = info.length - info.length % frame_bytes
+    if HAS_NUMPY:
+        dtype = np.dtype('<i2') if info.width == 2 else np.dtype('u1')
+        if length == 0:
+            return np.zeros(0, dtype=dtype), info
+        samples = np.memmap(path, dtype=dtype, mode='r', offset=info.offset,
+                            shape=(length // frame_bytes, info.channels))
+        return samples[:, 0], info
+    data = array('h' if info.width == 2 else 'B')
+    if length:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data.frombytes(mapped[info.offset:info.offset + length])
+    return (data[::info.channels] if info.channels > 1 else data), info
+
+
+def frame_view(samples, frame_length: int, hop: int):
+    """Ventanas (n_frames, frame_length) como vista con strides: no copia muestras"""
+    count = 0 if len(samples) < frame_length else 1 + (len(samples) - frame_length) // hop
+    stride = samples.strides[0]
+    return np.lib.stride_tricks.as_strided(samples, shape=(count, frame_length),
+                                           strides=(hop * stride, stride), writeable=False)
+
+
+def _as_float(frames, width: int):
+    """Ventanas a float32 normalizado en [-1, 1] (PCM de 8 bits es sin signo)"""
+    if width == 1:
+        return (frames.astype(np.float32) - 128.0) / 128.0
+    return frames.astype(np.float32) / 32768.0
+
+
+def frame_features(samples, rate: int, width: int = 2, frame_ms: float = 25,
+                   hop_ms: float = 10, noise_floor: Optional[float] = None) -> dict:
+    """Rasgos por ventana como arrays de NumPy
+
+    rms y zcr siempre; centroid (Hz), rolloff (Hz, 85 % de la energía) y flatness
+    del espectro; speech_prob combina energía sobre el suelo de ruido, cruces por
+    cero y planitud espectral (la voz es tonal, el ruido es plano).
+    """
+    if not HAS_NUMPY:
+        raise RuntimeError("frame_features necesita NumPy")
+    frame_length = max(1, int(rate * frame_ms / 1000))
+    hop = max(1, int(rate * hop_ms / 1000))
+    frames = frame_view(samples, frame_length, hop)
+    if not len(frames):
+        empty = np.zeros(0, dtype=np.float32)
+        return {name: empty for name in ('rms', 'zcr', 'centroid', 'rolloff', 'flatness', 'speech_prob')}
+
+    signal = _as_float(frames, width)
+    rms = np.sqrt(np.mean(signal * signal, axis=1))
+    signs = np.signbit(signal)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_length
+
+    spectrum = np.abs(np.fft.rfft(signal * np.hanning(frame_length).astype(np.float32), axis=1))
+    power = spectrum * spectrum + 1e-12
+    freqs = np.fft.rfftfreq(frame_length, 1 / rate).astype(np.float32)
+    total = power.sum(axis=1)
+    centroid = (power * freqs).sum(axis=1) / total
+    cumulative = np.cumsum(power, axis=1)
+    rolloff = freqs[np.argmax(cumulative >= 0.85 * total[:, None], axis=1)]
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+    if noise_floor is None:
+        # Suelo de ruido: percentil bajo de la propia grabación, acotado a -40 dBFS
+        # para que una grabación que es toda voz no se tome a sí misma como ruido
+        noise_floor = min(float(np.percentile(rms, 10)), 0.01)
+    snr_db = 20 * np.log10((rms + 1e-6) / (noise_floor + 1e-6))
+    score = (0.6 * (snr_db - 6)
+             - 8.0 * flatness
+             - 10.0 * np.clip(zcr - 0.25, 0, None))
+    speech_prob = 1 / (1 + np.exp(-score))
+
+    return {
+        'rms': rms,
+        'zcr': zcr,
+        'centroid': centroid,
+        'rolloff': rolloff,
+        'flatness': flatness,
+        'speech_prob': speech_prob,
+    }
+
+
+def _to_array(samples, width: int) -> array:
+    if isinstance(samples, array):
+        return samples
+    data = array('h' if width == 2 else 'B')
+    data.frombytes(samples[:len(samples) - len(samples) % width])
+    return data
+
+
+def _frame_rms_zcr(data: array, rate: int, width: int, frame_ms: float, hop_ms: float) -> tuple:
+    """Energía y cruces por cero en Python puro (sin NumPy)"""
+    frame_length = max(1, int(rate * frame_ms / 1000))
+    hop = max(1, int(rate * hop_ms / 1000))
+    if width == 1:
+        data = array('h', (x - 128 for x in data))
+    scale = 32768.0 if width == 2 else 128.0
+    rms, zcr = [], []
+    for start in range(0, len(data) - frame_length + 1, hop):
+        frame = data[start:start + frame_length]
+        rms.append(math.sqrt(sum(x * x for x in frame) / frame_length) / scale)
+        zcr.append(sum(1 for a, b in zip(frame, frame[1:]) if (a < 0) != (b < 0)) / frame_length)
+    return rms, zcr
+
+
+def speech_segments(speech: list, hop_ms: float, min_speech_ms: float = 120,
+                    hangover_ms: float = 250) -> list:
+    """[(inicio_s, fin_s), ...] a partir de la decisión voz/no-voz por ventana
+
+    Huecos más cortos que hangover_ms no cortan el tramo (endpointing) y los
+    tramos más cortos que min_speech_ms se descartan como clics.
+    """
+    hangover = int(hangover_ms / hop_ms)
+    min_frames = max(1, int(min_speech_ms / hop_ms))
+    segments, start, silence = [], None, 0
+    for i, voiced in enumerate(list(speech) + [False] * (hangover + 1)):
+        if voiced:
+            if start is None:
+                start = i
+            silence = 0
+        elif start is not None:
+            silence += 1
+            if silence > hangover:
+                end = i - silence + 1
+                if end - start >= min_frames:
+                    segments.append((start * hop_ms / 1000, end * hop_ms / 1000))
+                start, silence = None, 0
+    return segments
+
+
+def analyze_file(path: str, frame_ms: float = 25, hop_ms: float = 10,
+                 threshold: float = 0.5, rate: int = 16000) -> dict:
+    """Resumen de una grabación: duración, fracción con voz y tramos de voz"""
+    samples, info = map_samples(path, rate=rate)
+    return analyze_samples(samples, info.rate, info.width, frame_ms, hop_ms, threshold)
+
+
+def analyze_samples(samples, rate: int, width: int = 2, frame_ms: float = 25,
+                    hop_ms: float = 10, threshold: float = 0.5,
+                    noise_floor: Optional[float] = None) -> dict:
+    """Como analyze_file sobre muestras ya cargadas (array de NumPy, bytes o memoryview)
+
+    noise_floor (en [0, 1]) fija el suelo de ruido en vez de estimarlo de la grabación
+    """
+    if HAS_NUMPY:
+        if not isinstance(samples, np.ndarray):
+            samples = np.frombuffer(samples, dtype='<i2' if width == 2 else 'u1',
+                                    count=len(samples) // width)
+        features = frame_features(samples, rate, width, frame_ms, hop_ms, noise_floor)
+        speech = features['speech_prob'] > threshold
+        rms = features['rms']
+        peak = float(rms.max()) if len(rms) else 0.0
+    else:
+        samples = _to_array(samples, width)
+        rms, zcr = _frame_rms_zcr(samples, rate, width, frame_ms, hop_ms)
+        # Sin espectro: voz = energía claramente sobre el suelo de ruido
+        floor = noise_floor
+        if floor is None:
+            floor = min(sorted(rms)[len(rms) // 10], 0.01) if rms else 0.0
+        speech = [r > max(2 * floor, 0.01) and z < 0.35 for r, z in zip(rms, zcr)]
+        peak = max(rms, default=0.0)
+    frames = len(speech)
+    voiced = int(sum(speech))
+    return {
+        'duration': len(samples) / rate,
+        'frames': frames,
+        'speech_ratio': voiced / frames if frames else 0.0,
+        'peak_rms': peak,
+        'segments': speech_segments(speech, hop_ms),
+    }
+
+
+def _full_scale(width: int) -> float:
+    return 32768.0 if width == 2 else 128.0
+
+
+def block_rms(pcm, width: int = 2) -> float:
+    """Energía RMS de un bloque PCM con signo, en unidades de muestra (como audioop.rms)"""
+    usable = len(pcm) - len(pcm) % width
+    if not usable:
+        return 0.0
+    if HAS_NUMPY:
+        samples = np.frombuffer(pcm, dtype='<i2' if width == 2 else 'i1',
+                                count=usable // width).astype(np.float64)
+        return float(np.sqrt(np.mean(samples * samples)))
+    if audioop is not None:
+        return float(audioop.rms(bytes(pcm[:usable]), width))
+    samples = array('h' if width == 2 else 'b', bytes(pcm[:usable]))
+    return math.sqrt(sum(x * x for x in samples) / len(samples))
+
+
+def is_speech_block(pcm, rate: int, width: int = 2, noise_floor: float = 50.0,
+                    speech_ratio: float = 2.5) -> tuple:
+    """(rms, ¿voz?) de un bloque del micrófono, para decidir en vivo
+
+    noise_floor y rms en unidades de muestra. El bloque tiene que superar
+    speech_ratio veces el suelo de ruido; con NumPy además su speech_prob
+    (frame_features sobre el bloque entero) descarta el ruido plano o con
+    muchos cruces por cero que apenas pasa el umbral (ventilador, soplido).
+    """
+    rms = block_rms(pcm, width)
+    if rms <= noise_floor * speech_ratio:
+        return rms, False
+    if not HAS_NUMPY or width != 2:
+        return rms, True
+    samples = np.frombuffer(pcm, dtype='<i2', count=len(pcm) // width)
+    block_ms = 1000 * len(samples) / rate
+    features = frame_features(samples, rate, width, block_ms, block_ms,
+                              noise_floor / _full_scale(width))
+    speech = features['speech_prob']
+    return rms, bool(len(speech)) and float(speech[0]) > 0.5
+
+
+def trim_bounds(pcm, rate: int, width: int = 2, noise_floor: Optional[float] = None,
+                margin_ms: float = 150) -> tuple:
+    """(inicio, fin) en bytes de la parte con voz de una frase, con margin_ms de colchón
+
+    noise_floor en unidades de muestra (el del micrófono); (0, 0) si no hay voz.
+    """
+    floor = None if noise_floor is None else noise_floor / _full_scale(width)
+    segments = analyze_samples(pcm, rate, width, noise_floor=floor)['segments']
+    if not segments:
+        return 0, 0
+    start = int(max(0.0, segments[0][0] - margin_ms / 1000) * rate) * width
+    end = min(len(pcm), int((segments[-1][1] + margin_ms / 1000) * rate) * width)
+    return start, end - (end - start) % width
@@ -0,0 +1,228 @@
+"""
+Benchmark - Latencia extremo a extremo del pipeline contra un backend local simulado
+Ejecutar: python benchmark.py [--iterations 50] [--latency 0.2] [--output bench.json]
+
+Mide p50/p95/p99 por etapa: wake word, análisis (router), ejecución MCP,
+respuesta del LLM, transcripción (STT) y TTS hasta que empieza a sonar. El
+resultado es JSON.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import tracing
+from core import Assistant
+from mock_backend import MockLLMServer, StubMCP, install_fake_termux_bin, make_wav
+
+
+# Comandos de prueba y el plan que devuelve el router simulado
+SCENARIOS = {
+    "pausa spotify": {
+        "requires_mcp": True, "mcp": "spotify", "action": "pause", "params": {}
+    },
+    "pon despacito en youtube": {
+        "requires_mcp": True, "mcp": "youtube", "action": "search_video",
+        "params": {"query": "despacito", "auto_play": True}
+    },
+    "pausa spotify, pon el volumen al 30 y mándame una notificación": {
+        "requires_mcp": True, "actions": [
+            {"id": 1, "mcp": "spotify", "action": "pause", "params": {}},
+            {"id": 2, "mcp": "spotify", "action": "volume", "params": {"level": 30}, "depends_on": [1]},
+            {"id": 3, "mcp": "mobile", "action": "notify", "params": {"title": "Asistente"}}
+        ]
+    },
+    # El LLM a veces repite el id del ejemplo del prompt: las dos acciones deben ejecutarse
+    "pausa spotify y abre whatsapp": {
+        "requires_mcp": True, "actions": [
+            {"id": 1, "mcp": "spotify", "action": "pause", "params": {}},
+            {"id": 1, "mcp": "mobile", "action": "open_app", "params": {"app_name": "whatsapp"}}
+        ]
+    },
+    "cuéntame un chiste": None,
+}
+
+STAGES = ['wake_word', 'analysis', 'mcp', 'response', 'stt', 'tts', 'total']
+
+
+def planned_actions(plan: Optional[dict]) -> int:
+    """Acciones que el router simulado pide para un escenario"""
+    if not plan:
+        return 0
+    return len(plan['actions']) if 'actions' in plan else 1
+
+
+def percentile(values: list, pct: float) -> float:
+    """Percentil por rango más cercano (values ya ordenados)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(samples: dict) -> dict:
+    """{etapa: [ms, ...]} → {etapa: {count, mean, p50, p95, p99, max}}"""
+    summary = {}
+    for stage in STAGES:
+        values = sorted(samples.get(stage, []))
+        if not values:
+            continue
+        summary[stage] = {
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values), 3),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "max_ms": round(values[-1], 3),
+        }
+    return summary
+
+
+def build_assistant(base_url: str, mcp_latency: float, wake_word: str = 'yeni',
+                    speculative: bool = False) -> Assistant:
+    """Assistant real apuntando al backend simulado, con MCPs de prueba"""
+    config = {
+        "assistant": {"wake_word": wake_word, "language": "es", "speculative": speculative},
+        "llm": {"provider": "groq", "api_key": "bench", "base_url": base_url,
+                # Sin cuota local: se mide el pipeline, no el limitador
+                "rate_limit": {"requests_per_minute": 1e9, "tokens_per_minute": 1e12}},
+        "mcps": {"mobile": {"enabled": False}},
+    }
+    assistant = Assistant(config)
+    assistant.mcps = {
+        'spotify': StubMCP('spotify', ['play', 'pause', 'volume'], mcp_latency),
+        'youtube': StubMCP('youtube', ['search_video'], mcp_latency),
+        'mobile': StubMCP('mobile', ['open_app', 'notify'], mcp_latency),
+    }
+    assistant.system_prompt = assistant._build_system_prompt()
+    return assistant
+
+
+async def run_benchmark(args) -> dict:
+    routes = {command: plan for command, plan in SCENARIOS.items() if plan}
+    mock = MockLLMServer(latency=args.latency, jitter=args.jitter, token_rate=args.token_rate,
+                         stt_latency=args.stt_latency, routes=routes,
+                         transcript="hey yeni, pausa spotify", seed=args.seed).start()
+
+    # El camino de voz usa los binarios termux-* y la API de Whisper simulados
+    bin_dir = install_fake_termux_bin(args.tts_seconds_per_char)
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ.get('PATH', '')
+    os.environ['GROQ_API_KEY'] = 'bench'
+
+    samples = {stage: [] for stage in STAGES}
+    dropped = [0]
+    commands = list(SCENARIOS)
+    work_dir = tempfile.mkdtemp(prefix='bench-')
+    wav_path = os.path.join(work_dir, 'audio.wav')
+    with open(wav_path, 'wb') as f:
+        f.write(make_wav(1.0))
+
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            from voice import VoiceManagerTermux
+            assistant = build_assistant(mock.base_url, args.mcp_latency,
+                                        speculative=args.speculative)
+            voice_manager = VoiceManagerTermux('es', api_base=mock.base_url)
+            await voice_manager.start_tts()
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def one(i: int):
+                async with semaphore:
+                    command = f"hey yeni, {commands[i % len(commands)]}"
+                    voice = args.voice_every and i % args.voice_every == 0
+
+                    if voice:
+                        stage = time.perf_counter()
+                        await asyncio.to_thread(voice_manager._transcribe_with_groq, wav_path)
+                        samples['stt'].append((time.perf_counter() - stage) * 1000)
+
+                    details = {}
+                    events = []
+                    response = await assistant.process_command(command, details=details,
+                                                               on_event=events.append)
+                    for name, value in details['timings'].items():
+                        samples.setdefault(name, []).append(value)
+                    # Cada acción del plan tiene que haberse ejecutado (ids repetidos incluidos)
+                    ran = sum(1 for event in events if event.get('type') == 'action')
+                    dropped[0] += max(0, planned_actions(SCENARIOS[commands[i % len(commands)]]) - ran)
+
+                    if voice:
+                        # Hasta que empieza a sonar: cola, síntesis y arranque del reproductor
+                        stage = time.perf_counter()
+                        if await voice_manager.say(response):
+                            samples['tts'].append((time.perf_counter() - stage) * 1000)
+
+            for i in range(args.warmup):
+                await one(i)
+            samples = {stage: [] for stage in STAGES}
+            dropped[0] = 0
+            tracing.enable(args.trace)
+            tracing.reset()
+
+            start = time.perf_counter()
+            await asyncio.gather(*[one(i) for i in range(args.iterations)])
+            elapsed = time.perf_counter() - start
+            await voice_manager.stop_tts()
+    finally:
+        mock.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+        shutil.rmtree(bin_dir, ignore_errors=True)
+
+    result = {
+        "config": {k: v for k, v in vars(args).items() if k != 'output'},
+        "elapsed_s": round(elapsed, 3),
+        "throughput": round(args.iterations / elapsed, 3) if elapsed else 0,
+        "upstream_requests": mock.requests,
+        "dropped_actions": dropped[0],
+        "stages": summarize(samples),
+    }
+    if args.trace:
+        result['spans'] = tracing.snapshot()
+    if args.speculative:
+        result['speculation'] = assistant.speculation_stats
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de latencia del asistente")
+    parser.add_argument('--iterations', type=int, default=40)
+    parser.add_argument('--warmup', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.2, help="latencia LLM (s)")
+    parser.add_argument('--jitter', type=float, default=0.05, help="± jitter uniforme (s)")
+    parser.add_argument('--token-rate', type=float, default=0, help="tokens/s (0 = instantáneo)")
+    parser.add_argument('--stt-latency', type=float, default=0.3, help="latencia Whisper (s)")
+    parser.add_argument('--mcp-latency', type=float, default=0.05, help="latencia MCP de prueba (s)")
+    parser.add_argument('--tts-seconds-per-char', type=float, default=0.0,
+                        help="duración simulada de la locución por carácter")
+    parser.add_argument('--voice-every', type=int, default=1,
+                        help="incluir STT/TTS cada N comandos (0 = nunca)")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--trace', action='store_true', help="incluir histogramas de tracing")
+    parser.add_argument('--speculative', action='store_true',
+                        help="router y respuesta de chat en paralelo")
+    parser.add_argument('--output', default='-', help="archivo JSON de salida (- = stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(run_benchmark(args))
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"📊 Resultados en {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Capture - Captura continua del micrófono a un ring buffer mapeado en memoria
+Un solo proceso de grabación (parec o arecord) vive todo el rato y escribe PCM
+crudo en un buffer circular de tamaño fijo. Quien lo necesite (VAD, wake word,
+subida a STT) lee ventanas por instante de tiempo directamente del mapa, sin
+copiar y sin lanzar una grabación por frase.
+
+En Termux: pkg install pulseaudio y cargar module-sles-source para parec.
+"""
+import mmap
+import shutil
+import struct
+import subprocess
+import threading
+import time
+from typing import List, Optional
+
+
+# Cabecera al inicio del mapa (para lectores en otros procesos):
+# magia, frecuencia, bytes por muestra, capacidad, bytes escritos en total,
+# instante (monotónico) en que se alcanzó ese total y posición hasta la que el
+# escritor está sobrescribiendo (se anuncia antes de tocar los bytes)
+_HEADER = struct.Struct('<4sIIIQdQ')
+HEADER_SIZE = 64
+MAGIC = b'RING'
+
+
+def recorder_command(rate: int = 16000) -> Optional[List[str]]:
+    """Grabador disponible que saca PCM s16le mono por stdout"""
+    if shutil.which('parec'):
+        return ['parec', '--raw', '--format=s16le', f'--rate={rate}', '--channels=1',
+                '--latency-msec=20']
+    if shutil.which('arecord'):
+        return ['arecord', '-q', '-t', 'raw', '-f', 'S16_LE', '-r', str(rate), '-c', '1']
+    return None
+
+
+class RingBuffer:
+    """Buffer circular de PCM sobre un mmap (anónimo o en archivo, para compartirlo)
+
+    Las posiciones son absolutas (bytes escritos desde el arranque); una
+    posición es legible mientras no haya sido sobrescrita, es decir, si está
+    dentro de los últimos capacity bytes. El escritor publica en writing hasta
+    dónde va a escribir antes de copiar, así que un lector que comprueba
+    writing después de copiar detecta también una escritura a medias.
+    """
+
+    def __init__(self, seconds: float = 30, rate: int = 16000, width: int = 2,
+                 path: str = None):
+        self.rate = rate
+        self.width = width
+        self.capacity = int(seconds * rate) * width
+        self.path = path
+        size = HEADER_SIZE + self.capacity
+        if path:
+            with open(path, 'w+b') as f:
+                f.truncate(size)
+                self._map = mmap.mmap(f.fileno(), size)
+        else:
+            self._map = mmap.mmap(-1, size)
+        self._view = memoryview(self._map)[HEADER_SIZE:]
+        self.written = 0
+        self.writing = 0
+        self.anchor = time.monotonic()
+        self._attached = False
+        self._cond = threading.Condition()
+        self._publish()
+
+    @classmethod
+    def attach(cls, path: str) -> 'RingBuffer':
+        """Abre (solo lectura) el ring de otro proceso"""
+        ring = cls.__new__(cls)
+        with open(path, 'rb') as f:
+            ring._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, ring.rate, ring.width, ring.capacity, _, _, _ = _HEADER.unpack_from(ring._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} no es un ring de captura")
+        ring.path = path
+        ring._view = memoryview(ring._map)[HEADER_SIZE:]
+        ring._attached = True
+        ring._cond = threading.Condition()
+        ring.written, ring.writing, ring.anchor = 0, 0, time.monotonic()
+        ring.refresh()
+        return ring
+
+    def refresh(self):
+        """Relee la posición de escritura de la cabecera (lectores de otro proceso)"""
+        _, _, _, _, self.written, self.anchor, self.writing = _HEADER.unpack_from(self._map, 0)
+
+    def _publish(self):
+        _HEADER.pack_into(self._map, 0, MAGIC, self.rate, self.width, self.capacity,
+                          self.written, self.anchor, self.writing)
+
+    @property
+    def bytes_per_second(self) -> int:
+        return self.rate * self.width
+
+    @property
+    def oldest(self) -> int:
+        """Primera posición que sigue en el buffer (y que no se está sobrescribiendo)"""
+        return max(0, self.writing - self.capacity)
+
+    def write(self, data: bytes):
+        """Añade PCM (el escritor es uno solo: el hilo lector del grabador)"""
+        total = len(data)
+        with self._cond:
+            # Anunciar lo que se va a pisar antes de tocarlo
+            self.writing = self.written + total
+            self._publish()
+        # Si llega más que la capacidad, solo sobrevive el final
+        data = memoryview(data)[-self.capacity:]
+        start = (self.written + total - len(data)) % self.capacity
+        first = min(len(data), self.capacity - start)
+        self._view[start:start + first] = data[:first]
+        if first < len(data):
+            self._view[:len(data) - first] = data[first:]
+        with self._cond:
+            self.written += total
+            self.anchor = time.monotonic()
+            self._publish()
+            self._cond.notify_all()
+
+    def wait(self, position: int, timeout: float = None) -> bool:
+        """Espera a que se haya escrito hasta position"""
+        deadline_at = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.written < position:
+                remaining = None if deadline_at is None else deadline_at - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def position_at(self, instant: float) -> int:
+        """Posición (alineada a muestra) que corresponde a un instante time.monotonic()"""
+        position = self.written - int((self.anchor - instant) * self.rate) * self.width
+        return max(0, min(self.written, position))
+
+    def time_at(self, position: int) -> float:
+        return self.anchor - (self.written - position) / self.bytes_per_second
+
+    def views(self, start: int, end: int) -> List[memoryview]:
+        """Vistas sin copia de [start, end): una, o dos si la ventana da la vuelta
+
+        Las vistas apuntan al mapa: son válidas mientras valid(start) sea cierto.
+        """
+        start = max(start, self.oldest)
+        end = min(end, self.written)
+        if end <= start:
+            return []
+        a, b = start % self.capacity, end % self.capacity
+        if a < b or b == 0:
+            return [self._view[a:b or self.capacity]]
+        return [self._view[a:], self._view[:b]]
+
+    def window(self, start_time: float, end_time: float = None) -> List[memoryview]:
+        """Vistas del audio entre dos instantes (end_time=None → hasta ahora)"""
+        end = self.written if end_time is None else self.position_at(end_time)
+        return self.views(self.position_at(start_time), end)
+
+    def valid(self, start: int) -> bool:
+        """¿Sigue sin sobrescribirse (ni estar sobrescribiéndose) lo que empieza en start?"""
+        if self._attached:
+            self.refresh()
+        return start >= self.oldest
+
+    def read(self, start: int, end: int) -> bytes:
+        """Copia [start, end) (comprueba que no se haya sobrescrito mientras se copiaba)"""
+        start = max(start, self.oldest)
+        data = b''.join(bytes(v) for v in self.views(start, end))
+        # writing se anuncia antes de escribir: si tras copiar ya alcanza start,
+        # parte de lo copiado pudo pisarse durante la copia
+        if not self.valid(start):
+            raise BufferError("El ring se sobrescribió durante la lectura")
+        return data
+
+    def close(self):
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # Quedan vistas de lectores: el mapa se libera con la última
+
+
+class RingMicrophone:
+    """Adaptador con la interfaz de speech_recognition.Microphone sobre el ring
+
+    Permite usar MicrophoneStream (calibración, pre-roll, ruido adaptativo)
+    leyendo del ring en vez de abrir un micrófono.
+    """
+
+    def __init__(self, ring: RingBuffer, chunk: int = 1024):
+        self.ring = ring
+        self.SAMPLE_RATE = ring.rate
+        self.SAMPLE_WIDTH = ring.width
+        self.CHUNK = chunk
+        self.position = None
+        self.stream = self
+
+    def __enter__(self):
+        self.position = self.ring.written
+        return self
+
+    def __exit__(self, *exc):
+        self.position = None
+
+    def read(self, frames: int):
+        """Siguiente bloque de frames muestras (bloquea hasta que se haya grabado)
+
+        Devuelve una vista del ring sin copiar (bytes solo si el bloque da la
+        vuelta al final del buffer). La vista sigue siendo válida mientras el
+        ring no la sobrescriba, es decir, durante capture_seconds.
+        """
+        size = frames * self.SAMPLE_WIDTH
+        if not self.ring.wait(self.position + size, timeout=2):
+            raise TimeoutError("La captura no entrega audio")
+        # Si el lector se quedó atrás más que la capacidad, salta a lo más antiguo
+        self.position = max(self.position, self.ring.oldest)
+        views = self.ring.views(self.position, self.position + size)
+        data = views[0] if len(views) == 1 else b''.join(views)
+        if not self.ring.valid(self.position):
+            raise BufferError("El ring se sobrescribió durante la lectura")
+        self.position += len(data)
+        return data
+
+
+class CaptureDaemon:
+    """Mantiene vivo el grabador y vuelca su salida en el ring
+
+    Si el grabador muere (p.ej. PulseAudio reiniciado) se relanza con espera
+    creciente mientras el daemon siga activo.
+    """
+
+    def __init__(self, seconds: float = 30, rate: int = 16000, path: str = None,
+                 command: List[str] = None, read_bytes: int = 640):
+        self.command = command or recorder_command(rate)
+        self.ring = RingBuffer(seconds, rate, 2, path)
+        self.read_bytes = read_bytes
+        self.process = None
+        self.restarts = 0
+        self._running = False
+        self._thread = None
+
+    @property
+    def available(self) -> bool:
+        return self.command is not None
+
+    def start(self):
+        if self._running:
+            return
+        if not self.command:
+            raise RuntimeError("No hay grabador (instala pulseaudio o alsa-utils)")
+        self._running = True
+        self._thread = threading.Thread(target=self._pump, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def microphone(self, chunk: int = 1024) -> RingMicrophone:
+        return RingMicrophone(self.ring, chunk)
+
+    def _pump(self):
+        backoff = 0.5
+        while self._running:
+            try:
+                self.process = subprocess.Popen(self.command, stdout=subprocess.PIPE,
+                                                stderr=subprocess.DEVNULL,
+                                                start_new_session=True)
+            except OSError as e:
+                print(f"❌ Captura: {e}")
+                return
+            started = time.monotonic()
+            pending = b''
+            while self._running:
+                data = self.process.stdout.read1(self.read_bytes)
+                if not data:
+                    break
+                # Escribir solo muestras completas: las posiciones quedan alineadas
+                data = pending + data
+                cut = len(data) - len(data) % self.ring.width
+                pending = data[cut:]
+                if cut:
+                    self.ring.write(data[:cut])
+            self.process.stdout.close()
+            self.process.wait()
+            if not self._running:
+                return
+            self.restarts += 1
+            if time.monotonic() - started > 10:
+                backoff = 0.5
+            print(f"⚠️ El grabador terminó, relanzando en {backoff:.1f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 10)
@@ -0,0 +1,223 @@
+"""
+Circuit Breaker - Fallo rápido cuando un backend está caído
+Un breaker por backend (termux, adb, spotify, groq). Tras varios fallos
+seguidos (o llamadas que superan slow_ms) se abre: las llamadas fallan al
+instante con un mensaje útil en vez de esperar el timeout completo. Mientras
+está abierto, una sonda en segundo plano comprueba si el backend volvió; si no
+hay sonda, pasado reset_timeout se deja pasar una llamada de prueba.
+
+Uso:
+    breaker = circuit_breaker.get('termux', probe=probe_termux)
+    result = await breaker.call(executor.run, ['termux-toast', 'hola'])
+"""
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Valores por backend; config.json ("circuit_breakers") los sobrescribe
+DEFAULTS = {
+    'termux': {'message': "Termux:API no responde", 'slow_ms': 8000},
+    'adb': {'message': "ADB no tiene ningún dispositivo conectado", 'slow_ms': 8000},
+    'spotify': {'message': "Spotify no responde", 'slow_ms': 10000},
+    'groq': {'message': "El LLM no responde", 'slow_ms': 20000},
+}
+
+
+class CircuitOpenError(Exception):
+    """El backend está marcado como caído (el mensaje se muestra al usuario)"""
+
+    def __init__(self, breaker: 'CircuitBreaker'):
+        self.breaker = breaker
+        retry_in = math.ceil(max(0.0, breaker.retry_at - time.monotonic()))
+        super().__init__(f"{breaker.message} (reintento en {retry_in}s)")
+
+
+class CircuitBreaker:
+    """Estado cerrado → abierto tras failure_threshold fallos → semiabierto → cerrado
+
+    slow_ms: una llamada más lenta que esto cuenta como fallo aunque termine bien
+    reset_timeout: espera antes de probar otra vez; se duplica (hasta
+    max_reset_timeout) cada vez que la prueba falla
+    probe: corrutina sin argumentos que devuelve True si el backend responde
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, slow_ms: float = None,
+                 reset_timeout: float = 30, max_reset_timeout: float = 300,
+                 probe: Callable[[], Awaitable[bool]] = None, probe_timeout: float = 5,
+                 message: str = None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.slow_ms = slow_ms
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.probe = probe
+        self.probe_timeout = probe_timeout
+        self.message = message or f"{name} no responde"
+        self.state = CLOSED
+        self.failures = 0
+        self.retry_at = 0.0
+        self._current_reset = reset_timeout
+        self._trial_started = 0.0
+        self._probe_task = None
+        self.stats = {'calls': 0, 'failures': 0, 'slow': 0, 'rejected': 0, 'opened': 0,
+                      'probes': 0}
+
+    def check(self):
+        """Lanza CircuitOpenError si no se debe llamar al backend ahora"""
+        if self.state == CLOSED:
+            return
+        now = time.monotonic()
+        if self.state == OPEN and now >= self.retry_at:
+            # Una sola llamada de prueba; el resto sigue fallando rápido
+            self.state = HALF_OPEN
+            self._trial_started = now
+            return
+        if self.state == HALF_OPEN and now - self._trial_started >= self._current_reset:
+            # La prueba anterior nunca informó (cancelada): se permite otra
+            self._trial_started = now
+            return
+        self.stats['rejected'] += 1
+        raise CircuitOpenError(self)
+
+    def record_success(self, duration_ms: float = None):
+        if self.slow_ms and duration_ms is not None and duration_ms > self.slow_ms:
+            self.stats['slow'] += 1
+            self.record_failure()
+            return
+        self.failures = 0
+        if self.state != CLOSED:
+            self._close()
+
+    def record_failure(self):
+        self.failures += 1
+        self.stats['failures'] += 1
+        if self.state == HALF_OPEN:
+            # Falló la prueba: otra vez abierto, esperando el doble
+            self._current_reset = min(self._current_reset * 2, self.max_reset_timeout)
+            self._open()
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._current_reset = self.reset_timeout
+            self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.retry_at = time.monotonic() + self._current_reset
+        self.stats['opened'] += 1
+        print(f"🔌 {self.name}: circuito abierto - {self.message}")
+        self._start_probe()
+
+    def _close(self):
+        was_open = self.state != CLOSED
+        self.state = CLOSED
+        self.failures = 0
+        self._current_reset = self.reset_timeout
+        if was_open:
+            print(f"🔌 {self.name}: circuito cerrado, vuelve a responder")
+
+    def _start_probe(self):
+        if self.probe is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Sin loop (llamada desde un hilo): queda la llamada de prueba
+        task = self._probe_task
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        self._probe_task = loop.create_task(self._probe_loop())
+
+    async def _probe_loop(self):
+        """Sondea el backend mientras el circuito no esté cerrado"""
+        while self.state != CLOSED:
+            await asyncio.sleep(max(0.0, self.retry_at - time.monotonic()))
+            if self.state == CLOSED:
+                return
+            self.stats['probes'] += 1
+            try:
+                healthy = await asyncio.wait_for(self.probe(), timeout=self.probe_timeout)
+            except Exception:
+                healthy = False
+            if healthy:
+                self._close()
+                return
+            self._current_reset = min(self._current_reset * 2, self.max_reset_timeout)
+            self.retry_at = time.monotonic() + self._current_reset
+
+    async def call(self, func: Callable[..., Awaitable], *args,
+                   is_failure: Callable[[BaseException], bool] = None,
+                   failed_result: Callable[[object], bool] = None, **kwargs):
+        """await func(*args, **kwargs) contabilizando el resultado en el breaker
+
+        is_failure decide qué excepciones son caída del backend (por defecto,
+        todas); failed_result marca como fallo un resultado sin excepción.
+        Una cancelación solo cuenta si la llamada ya superaba slow_ms.
+        """
+        self.check()
+        self.stats['calls'] += 1
+        start = time.perf_counter()
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            elapsed = (time.perf_counter() - start) * 1000
+            if self.slow_ms and elapsed > self.slow_ms:
+                self.stats['slow'] += 1
+                self.record_failure()
+            raise
+        except Exception as e:
+            if is_failure is None or is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        if failed_result is not None and failed_result(result):
+            self.record_failure()
+        else:
+            self.record_success((time.perf_counter() - start) * 1000)
+        return result
+
+    def to_dict(self) -> dict:
+        return dict(self.stats, state=self.state, failures=self.failures,
+                    retry_in=round(max(0.0, self.retry_at - time.monotonic()), 1)
+                    if self.state != CLOSED else 0.0)
+
+
+_breakers = {}
+_config = {}
+
+
+def configure(config: dict):
+    """Ajustes por backend de la sección "circuit_breakers" (afecta a los que se creen después)"""
+    global _config
+    _config = config or {}
+
+
+def get(name: str, probe: Callable[[], Awaitable[bool]] = None) -> CircuitBreaker:
+    """Breaker compartido del backend name (se crea la primera vez)"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        settings = dict(DEFAULTS.get(name, {}))
+        settings.update(_config.get('default', {}))
+        settings.update(_config.get(name, {}))
+        if not settings.pop('enabled', True):
+            # Desactivado: umbral inalcanzable, nunca se abre
+            settings['failure_threshold'] = float('inf')
+            settings['slow_ms'] = None
+        breaker = _breakers[name] = CircuitBreaker(name, **settings)
+    if probe is not None:
+        breaker.probe = probe
+    return breaker
+
+
+def stats() -> dict:
+    return {name: breaker.to_dict() for name, breaker in _breakers.items()}
+
+
+def reset():
+    """Olvida todos los breakers (pruebas, benchmark)"""
+    _breakers.clear()
@@ -2,13 +2,21 @@
 Core del Asistente - Lógica principal y conexión con LLM
 Compatible con Termux (sin dependencias que necesitan Rust)
 """
-from typing import Optional
-import os
-import json
-import urllib.request
-import urllib.error
-
+from typing import Callable, Optional
+import asyncio
+import time
+import circuit_breaker
+import deadline
+import progress
+import tracing
+from event_log import EventLog, default_path as default_event_path, intent_label
+from intent_index import IntentIndex, default_path as default_intent_path
+from json_stream import JSONStreamParser
+from llm_client import GroqClient, LLMError, track_usage
+from speculation import IntentSpeculator
+from text_utils import normalize
 # Importar MCPs
+from mcps import executor
 from mcps.mobile_mcp import MobileMCP
 from mcps.spotify_mcp import SpotifyMCP
 
@@ -25,13 +33,64 @@ class Assistant:
         self.provider = config['llm'].get('provider', 'groq')
         self.api_key = config['llm'].get('api_key', '')
         self.model_name = config['llm'].get('model', 'llama-3.3-70b-versatile')
+        self.base_url = config['llm'].get('base_url', 'https://api.groq.com/openai/v1').rstrip('/')
+        # Fallo rápido por backend caído (groq, termux, adb, spotify)
+        circuit_breaker.configure(config.get('circuit_breakers', {}))
+        self.llm = GroqClient(self.api_key, self.model_name, self.base_url,
+                              config['llm'].get('rate_limit', {}))
+        
+        # Tiempo máximo por acción de MCP y presupuesto total por comando (segundos)
+        self.action_timeout = config['assistant'].get('action_timeout', 15)
+        self.command_timeout = config['assistant'].get('command_timeout', 25)
+        
+        # Modo especulativo: router y respuesta de chat en paralelo (gasta tokens de más)
+        self.speculative = config['assistant'].get('speculative', False)
+        self.speculation_stats = {'started': 0, 'used': 0, 'discarded': 0,
+                                  'wasted_prompt_tokens': 0, 'wasted_completion_tokens': 0}
+        
+        # Índice de decisiones pasadas del router: comandos parecidos no llaman al LLM
+        index_config = config.get('intent_index', {})
+        self.intent_index = None
+        if index_config.get('enabled', False):
+            self.intent_index = IntentIndex(
+                path=index_config.get('path') or default_intent_path(),
+                threshold=index_config.get('threshold', 0.85),
+                max_entries=index_config.get('max_entries', 1000),
+                max_age_days=index_config.get('max_age_days', 30),
+                verify_rate=index_config.get('verify_rate', 0.1)
+            )
+        self._background = set()
+        self._index_save = None
+        
+        # Registro de cada comando en SQLite: latencias reales y corpus para el índice
+        log_config = config.get('event_log', {})
+        self.event_log = None
+        if log_config.get('enabled', False):
+            try:
+                self.event_log = EventLog(
+                    log_config.get('path') or default_event_path(),
+                    retention_days=log_config.get('retention_days', 90),
+                    max_rows=log_config.get('max_rows', 100000)
+                )
+                self._warm_intent_index()
+            except Exception as e:
+                print(f"⚠️ Registro de eventos no disponible: {e}")
         
         print(f"✅ LLM: {self.provider} ({self.model_name})")
         
+        # Procesos de los MCPs: tope de simultáneos y de salida capturada
+        executor.configure(config.get('processes', {}))
+        
         # Inicializar MCPs habilitados
         self.mcps = {}
         self._init_mcps()
         
+        # Intent anticipado desde transcripciones parciales (modo voz con STT por trozos)
+        self.speculator = None
+        if config['assistant'].get('speculative_intent', False):
+            self.speculator = IntentSpeculator(
+                self, use_llm=config['assistant'].get('speculative_intent_llm', False))
+        
         # Contexto del sistema
         self.system_prompt = self._build_system_prompt()
     
@@ -53,7 +112,7 @@ class Assistant:
         if mcp_config.get('youtube', {}).get('enabled', False):
             try:
                 from mcps.youtube_mcp import YouTubeMCP
-                self.mcps['youtube'] = YouTubeMCP()
+                self.mcps['youtube'] = YouTubeMCP(mcp_config.get('youtube', {}))
             except ImportError as e:
                 print(f"❌ Falta yt-dlp para YouTube: {e}")
             except Exception as e:
@@ -87,89 +146,301 @@ IMPORTANTE PARA YOUTUBE:
 
 Responde de forma natural y útil."""
     
-    async def process_command(self, command: str) -> str:
-        """Procesa un comando del usuario"""
+    async def process_command(self, command: str,
+                              on_event: Optional[Callable[[dict], None]] = None,
+                              details: Optional[dict] = None, spoken: bool = False) -> str:
+        """Procesa un comando del usuario
+        
+        on_event recibe los avances parciales (p.ej. cada acción terminada de un plan)
+        details, si se pasa, se rellena con el comando normalizado, el intent resuelto,
+        el resultado ('mcp', 'chat', 'empty', 'error' o 'timeout') y los tiempos por etapa en ms
+        spoken: es el transcript final del modo voz; solo entonces se usa (y se
+        cierra) lo especulado con sus transcripciones parciales
+        
+        Todo el comando comparte un deadline (command_timeout): LLM, MCPs y subprocesos
+        toman su timeout de lo que queda, y si se agota se cancela y se responde ya
+        """
+        if details is None:
+            details = {}
+        details.setdefault('timings', {})
+        
+        start = time.perf_counter()
+        started_at = time.time()
+        try:
+            with progress.listening(on_event), deadline.scope(self.command_timeout) as budget, \
+                    track_usage() as usage:
+                return await asyncio.wait_for(self._process_command(command, details, spoken),
+                                              timeout=budget.remaining())
+        except asyncio.TimeoutError:
+            details['outcome'] = 'timeout'
+            return "⏱️ Lo siento, eso está tardando demasiado. Inténtalo de nuevo."
+        finally:
+            if spoken and self.speculator:
+                # Pase lo que pase (error, deadline), la frase terminó: fuera lo especulado
+                self.speculator.settle(details.get('intent'))
+            details['timings']['total'] = (time.perf_counter() - start) * 1000
+            details['usage'] = dict(usage)
+            self._log_event(started_at, command, details)
+    
+    def _log_event(self, started_at: float, raw_command: str, details: dict):
+        """Encola el comando en el registro de eventos (no espera a la escritura)"""
+        if not self.event_log:
+            return
+        command = details.get('command', raw_command)
+        plan = details.get('intent')
+        # Sin resultado: el comando se canceló desde fuera (cliente desconectado, Ctrl+C)
+        outcome = details.get('outcome') or 'cancelled'
+        self.event_log.record({
+            'ts': started_at,
+            'command': command,
+            'normalized': normalize(command),
+            'intent': intent_label(plan, outcome),
+            'intent_source': details.get('intent_source'),
+            'outcome': outcome,
+            'provider': self.provider,
+            'model': self.model_name,
+            'prompt_tokens': details['usage']['prompt_tokens'],
+            'completion_tokens': details['usage']['completion_tokens'],
+            'total_ms': details['timings']['total'],
+            'timings': dict(details['timings']),
+            'plan': plan,
+            'error': details.get('error'),
+        })
+    
+    def _warm_intent_index(self):
+        """Un índice de intents vacío se siembra con lo que el router resolvió antes"""
+        if not self.intent_index or self.intent_index.entries:
+            return
+        routed = self.event_log.routed_commands(self.intent_index.max_entries)
+        # Del más antiguo al más reciente, para que la expulsión respete el uso
+        for command, plan in reversed(routed):
+            self.intent_index.add(command, plan)
+        if routed:
+            print(f"🧠 Índice de intents: {len(self.intent_index.entries)} comandos del registro")
+    
+    async def _process_command(self, command: str, details: dict, spoken: bool = False) -> str:
+        """Cuerpo de process_command, con el receptor de eventos ya configurado"""
+        timings = details['timings']
+        
         # Remover wake word si está presente
-        command_lower = command.lower()
-        for trigger in [f"hey {self.wake_word}", f"oye {self.wake_word}", self.wake_word]:
-            if command_lower.startswith(trigger):
-                command = command[len(trigger):].strip()
-                if command.startswith(','):
-                    command = command[1:].strip()
-                break
+        stage = time.perf_counter()
+        command = self._strip_wake_word(command)
+        timings['wake_word'] = (time.perf_counter() - stage) * 1000
+        details['command'] = command
+        details['intent'] = None
         
         if not command:
+            details['outcome'] = 'empty'
             return "¿En qué puedo ayudarte?"
         
+        speculative_chat = None
+        # Acciones ya lanzadas mientras el router todavía está generando
+        dispatched = {}
         try:
-            # Analizar si el comando requiere un MCP
-            mcp_action = await self._analyze_for_mcp(command)
+            # Analizar si el comando requiere uno o varios MCPs
+            stage = time.perf_counter()
+            plan = self._route_locally(command)
+            if plan:
+                details['intent_source'] = 'index'
+            else:
+                # El router quizá ya arrancó con la última transcripción parcial
+                claimed, plan, complete = (await self.speculator.claim(command)
+                                           if spoken and self.speculator else (False, None, False))
+                if claimed:
+                    details['intent_source'] = 'speculative'
+                else:
+                    if self.speculative:
+                        # La respuesta de chat arranca ya; se descarta si el router elige un MCP
+                        speculative_chat = self._start_speculative_chat(command)
+                    routed = {}
+                    plan = await self._analyze_for_mcp(
+                        command, on_action=lambda action: self._dispatch_action(dispatched, action),
+                        report=routed)
+                    complete = routed.get('complete', False)
+                    details['intent_source'] = 'llm'
+                if not complete:
+                    # Router cortado: el plan es lo que llegó a lanzarse, no se aprende
+                    details['intent_source'] += '_partial'
+                elif plan and self.intent_index:
+                    self.intent_index.add(command, plan)
+                    self._save_intent_index()
+            timings['analysis'] = (time.perf_counter() - stage) * 1000
+            details['intent'] = plan
+            
+            if speculative_chat is not None:
+                details['speculative'] = 'discarded' if plan else 'used'
+                if plan:
+                    self._discard_speculative_chat(speculative_chat)
+                    speculative_chat = None
             
-            if mcp_action:
-                # Ejecutar acción de MCP
-                result = await self._execute_mcp_action(mcp_action)
+            stage = time.perf_counter()
+            if speculative_chat is not None:
+                # Sin MCP: la respuesta ya estaba en camino
+                pending, speculative_chat = speculative_chat, None
+                self.speculation_stats['used'] += 1
+                with tracing.span('llm.generate'):
+                    result = await asyncio.shield(pending)
+                timings['response'] = (time.perf_counter() - stage) * 1000
+                details['outcome'] = 'chat'
+                return result['content']
+            elif plan:
+                # Ejecutar plan de acciones (concurrente cuando se puede)
+                result = await self._execute_plan(plan, dispatched)
+                timings['mcp'] = (time.perf_counter() - stage) * 1000
+                details['outcome'] = 'mcp'
                 return result
             else:
                 # Respuesta general con LLM
-                response = self._generate_response(command)
+                response = await self._generate_response(command)
+                timings['response'] = (time.perf_counter() - stage) * 1000
+                details['outcome'] = 'chat'
                 return response
                 
         except Exception as e:
+            details['outcome'] = 'error'
+            details['error'] = str(e)
             return f"Lo siento, hubo un error: {str(e)}"
+        finally:
+            # Error o cancelación (deadline) con la especulación aún pendiente
+            if speculative_chat is not None:
+                self._discard_speculative_chat(speculative_chat)
+            for task in dispatched.values():
+                if not task.done():
+                    task.cancel()
     
-    def _call_groq_api(self, messages: list) -> str:
-        """Llama a la API de Groq directamente con urllib (sin dependencias)"""
-        url = "https://api.groq.com/openai/v1/chat/completions"
-        
-        data = {
-            "model": self.model_name,
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 500
-        }
+    def _strip_wake_word(self, command: str) -> str:
+        """Quita 'hey <wake word>' (o variantes) del principio del comando"""
+        command_lower = command.lower()
+        for trigger in [f"hey {self.wake_word}", f"oye {self.wake_word}", self.wake_word]:
+            if command_lower.startswith(trigger):
+                command = command[len(trigger):].strip()
+                if command.startswith(','):
+                    command = command[1:].strip()
+                break
+        return command
+    
+    def _route_locally(self, command: str) -> Optional[list]:
+        """Plan desde el índice de intents (y, por muestreo, se contrasta con el LLM)"""
+        if not self.intent_index:
+            return None
+        plan = self.intent_index.lookup(command)
+        if plan:
+            # Planes guardados antes de renumerar los ids pueden traer ids repetidos
+            plan = self._normalize_plan({'actions': plan})
+        if plan and self.intent_index.should_verify():
+            task = asyncio.ensure_future(self._verify_local_plan(command, plan))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+        return plan
+    
+    async def _verify_local_plan(self, command: str, plan: list):
+        """Pregunta al LLM en segundo plano y anota si coincidía con el índice"""
+        routed = {}
+        try:
+            with deadline.scope(self.command_timeout):
+                llm_plan = await self._analyze_for_mcp(command, report=routed)
+        except Exception:
+            return
+        if routed.get('complete'):
+            self.intent_index.record_verification(command, plan, llm_plan)
+            self._save_intent_index()
+    
+    def _save_intent_index(self):
+        """Guarda el índice (como mucho cada 10 s) en un hilo, fuera del camino del comando"""
+        if self._index_save is not None or not self.intent_index.save_due():
+            return
+        self._index_save = asyncio.ensure_future(asyncio.to_thread(self.intent_index.save))
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "User-Agent": "Mozilla/5.0 (Linux; Android 13) AppleWebKit/537.36",
-            "Accept": "application/json"
-        }
+        def saved(task: asyncio.Future):
+            self._index_save = None
+            if not task.cancelled() and task.exception() is not None:
+                print(f"⚠️ Índice de intents: {task.exception()}")
         
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode('utf-8'),
-            headers=headers,
-            method='POST'
-        )
+        self._index_save.add_done_callback(saved)
+    
+    def _start_speculative_chat(self, command: str) -> asyncio.Task:
+        """Lanza la respuesta de chat en paralelo al router"""
+        self.speculation_stats['started'] += 1
+        return asyncio.ensure_future(self._speculative_chat(command))
+    
+    async def _speculative_chat(self, command: str) -> dict:
+        """Respuesta de chat en streaming, para poder cortarla si el router elige un MCP
         
+        Si se cancela, el stream se cierra (la conexión y la generación en el
+        servidor se cortan) y lo gastado hasta entonces cuenta como desperdicio.
+        """
+        usage = {}
+        pieces = []
+        stream = self.llm.stream(self._chat_messages(command), report=usage)
         try:
-            with urllib.request.urlopen(req, timeout=30) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                return result['choices'][0]['message']['content']
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode('utf-8')
-            raise Exception(f"Error API: {e.code} - {error_body}")
-    
-    def _generate_response(self, prompt: str) -> str:
-        """Genera respuesta usando el LLM configurado"""
-        messages = [
+            async for piece in stream:
+                pieces.append(piece)
+        except asyncio.CancelledError:
+            # El generador ya se cerró (y anotó el uso) al propagarse la cancelación
+            self._count_wasted_tokens(usage)
+            raise
+        finally:
+            await stream.aclose()
+        return {'content': ''.join(pieces), 'usage': usage}
+    
+    def _discard_speculative_chat(self, task: asyncio.Task):
+        """Cancela la respuesta especulativa (si ya terminó, sus tokens se dan por perdidos)"""
+        self.speculation_stats['discarded'] += 1
+        if task.done():
+            if not task.cancelled() and task.exception() is None:
+                self._count_wasted_tokens(task.result()['usage'])
+        else:
+            task.cancel()
+    
+    def _count_wasted_tokens(self, usage: dict):
+        self.speculation_stats['wasted_prompt_tokens'] += usage.get('prompt_tokens', 0)
+        self.speculation_stats['wasted_completion_tokens'] += usage.get('completion_tokens', 0)
+    
+    async def _call_groq_api(self, messages: list) -> str:
+        """Llama a la API de Groq (con limitador de cuota, reintentos y singleflight)"""
+        result = await self.llm.chat(messages)
+        return result['content']
+    
+    def _chat_messages(self, prompt: str) -> list:
+        """Mensajes para el LLM con el prompt del sistema"""
+        return [
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": prompt}
         ]
+    
+    @tracing.traced('llm.generate')
+    async def _generate_response(self, prompt: str) -> str:
+        """Genera respuesta usando el LLM configurado"""
+        messages = self._chat_messages(prompt)
         
         if self.provider == 'groq':
-            return self._call_groq_api(messages)
+            return await self._call_groq_api(messages)
         else:
             raise ValueError(f"Provider '{self.provider}' no soportado")
     
-    async def _analyze_for_mcp(self, command: str) -> Optional[dict]:
-        """Analiza si el comando requiere una acción de MCP"""
+    @tracing.traced('llm.analyze')
+    async def _analyze_for_mcp(self, command: str,
+                               on_action: Optional[Callable[[dict], None]] = None,
+                               report: Optional[dict] = None) -> Optional[list]:
+        """Analiza si el comando requiere acciones de MCP y devuelve el plan
+        
+        La respuesta del router se lee en streaming: cada acción válida se pasa a
+        on_action en cuanto su objeto JSON se cierra (para lanzarla ya) y la
+        generación se corta en cuanto el JSON raíz está completo.
+        report, si se pasa, recibe 'complete': False si el stream se cortó antes
+        de cerrar el JSON raíz (el plan devuelto es solo lo que llegó).
+        """
         mcp_tools = self._get_mcp_tools_description()
         
         if not mcp_tools or mcp_tools == "Ninguna herramienta disponible":
+            if report is not None:
+                report['complete'] = True
             return None
+        if report is not None:
+            report['complete'] = False
         
-        analysis_prompt = f"""Analiza este comando y determina si requiere una acción de MCP.
+        analysis_prompt = f"""Analiza este comando y determina si requiere acciones de MCP.
+Un comando puede pedir varias acciones a la vez (ej: "pausa Spotify y mándame una notificación").
 
 MCPs disponibles:
 {mcp_tools}
@@ -177,27 +448,95 @@ MCPs disponibles:
 Comando: "{command}"
 
 Responde SOLO en formato JSON:
-{{"requires_mcp": true/false, "mcp": "nombre", "action": "accion", "params": {{}}}}
+{{"requires_mcp": true, "actions": [{{"id": 1, "mcp": "nombre", "action": "accion", "params": {{}}, "depends_on": []}}]}}
+
+- Una entrada en "actions" por cada acción, en el orden en que el usuario las pidió
+- "depends_on" lista los "id" de acciones que deben terminar antes (vacío si es independiente)
 
 Si no requiere MCP, responde: {{"requires_mcp": false}}"""
         
+        parser = JSONStreamParser()
+        early = []
+        aliases = {}
+        data = None
+        stream = self.llm.stream(self._chat_messages(analysis_prompt))
         try:
-            response = self._generate_response(analysis_prompt)
-            text = response.strip()
-            
-            # Extraer JSON
-            import re
-            
-            # Buscar JSON en la respuesta
-            json_match = re.search(r'\{.*\}', text, re.DOTALL)
-            if json_match:
-                data = json.loads(json_match.group())
-                if data.get('requires_mcp', False):
-                    return data
-        except:
-            pass
+            async for piece in stream:
+                for path, value in parser.feed(piece):
+                    if len(path) == 2 and path[0] == 'actions' and isinstance(path[1], int):
+                        action = self._normalize_action(value, path[1] + 1, early, aliases)
+                        if action:
+                            early.append(action)
+                            if on_action:
+                                on_action(action)
+                    elif 'requires_mcp' in value or (not path and value.get('mcp')):
+                        data = value
+                        break
+                if data is not None:
+                    break
+        except (LLMError, OSError) as e:
+            print(f"⚠️ Router: {e}")
+        finally:
+            # Cierra la conexión: el resto de la generación no se necesita
+            await stream.aclose()
+        
+        if data is None:
+            # Respuesta cortada: lo ya lanzado sigue siendo el plan
+            return early or None
+        if report is not None:
+            report['complete'] = True
+        if not data.get('requires_mcp', bool(data.get('mcp'))):
+            return early or None
+        return self._normalize_plan(data)
+    
+    def _normalize_plan(self, data: dict) -> Optional[list]:
+        """Normaliza la respuesta del router a una lista de acciones con id y depends_on"""
+        actions = data.get('actions')
+        if not isinstance(actions, list):
+            # Formato de una sola acción: {"mcp": ..., "action": ..., "params": ...}
+            actions = [data] if data.get('mcp') else []
         
-        return None
+        plan = []
+        aliases = {}
+        for index, action in enumerate(actions, 1):
+            normalized = self._normalize_action(action, index, plan, aliases)
+            if normalized:
+                plan.append(normalized)
+        
+        return plan or None
+    
+    def _normalize_action(self, action, index: int, previous: list, aliases: dict) -> Optional[dict]:
+        """Valida una acción del router (None si no sirve) y le pone id y depends_on
+        
+        El id es la posición en el plan: el LLM puede repetir ids (el ejemplo del
+        prompt usa 1) y una acción con id repetido no se lanzaría. aliases
+        traduce los ids del LLM ya vistos a esa posición para depends_on.
+        """
+        if not isinstance(action, dict) or not isinstance(action.get('mcp'), str) or not action['mcp']:
+            return None
+        params = action.get('params') or {}
+        if not isinstance(params, dict):
+            return None
+        depends_on = action.get('depends_on') or []
+        if not isinstance(depends_on, list):
+            depends_on = []
+        action_id = len(previous) + 1
+        # Solo se permiten dependencias hacia acciones anteriores (evita ciclos)
+        deps = []
+        for d in depends_on:
+            if isinstance(d, (int, str)) and d in aliases and aliases[d] not in deps:
+                deps.append(aliases[d])
+        raw_id = action.get('id', index)
+        if isinstance(raw_id, (int, str)):
+            # Con ids repetidos, depends_on apunta a la última acción con ese id
+            aliases[raw_id] = action_id
+        return {
+            'id': action_id,
+            'mcp': action['mcp'],
+            'action': action.get('action') if isinstance(action.get('action'), str) else '',
+            'params': params,
+            'depends_on': deps
+        }
     
     def _get_mcp_tools_description(self) -> str:
         """Obtiene descripción de herramientas de MCPs"""
@@ -209,6 +548,7 @@ Si no requiere MCP, responde: {{"requires_mcp": false}}"""
         
         return "\n".join(descriptions) if descriptions else "Ninguna herramienta disponible"
     
+    @tracing.traced('mcp.execute')
     async def _execute_mcp_action(self, action: dict) -> str:
         """Ejecuta una acción de MCP"""
         mcp_name = action.get('mcp', '')
@@ -226,6 +566,54 @@ Si no requiere MCP, responde: {{"requires_mcp": false}}"""
             return f"MCP '{mcp_name}' no está disponible"
         
         mcp = self.mcps[mcp_name]
-        result = await mcp.execute(action_name, params)
+        with tracing.span(f"mcp.{mcp_name}.{action_name}"):
+            result = await mcp.execute(action_name, params)
+        
+        return result
+    
+    def _dispatch_action(self, tasks: dict, action: dict):
+        """Lanza una acción del plan; espera antes a las dependencias ya lanzadas"""
+        if action['id'] in tasks:
+            return
+        
+        async def run_after_deps() -> str:
+            deps = [tasks[d] for d in action['depends_on'] if d in tasks]
+            if deps:
+                # Las dependencias son pistas de orden: se espera aunque fallen
+                await asyncio.gather(*deps, return_exceptions=True)
+            return await self._run_action(action)
+        
+        tasks[action['id']] = asyncio.ensure_future(run_after_deps())
+    
+    async def _execute_plan(self, plan: list, tasks: Optional[dict] = None) -> str:
+        """Ejecuta un plan de acciones: las independientes en paralelo, las dependientes en orden
+        
+        tasks trae las acciones que ya se lanzaron durante el análisis
+        """
+        tasks = {} if tasks is None else tasks
+        if len(plan) == 1 and not tasks:
+            return await self._run_action(plan[0])
+        
+        for action in plan:
+            self._dispatch_action(tasks, action)
+        
+        results = await asyncio.gather(*tasks.values())
+        
+        # Una sola respuesta hablada, en el orden en que se pidieron las acciones
+        return "\n".join(results)
+    
+    async def _run_action(self, action: dict) -> str:
+        """Ejecuta una acción con timeout propio, sin propagar errores al resto del plan"""
+        label = f"{action.get('mcp', '')}.{action.get('action', '')}"
+        try:
+            result = await asyncio.wait_for(
+                self._execute_mcp_action(action),
+                timeout=deadline.timeout(self.action_timeout)
+            )
+        except asyncio.TimeoutError:
+            result = f"⏱️ {label}: tardó demasiado"
+        except Exception as e:
+            result = f"❌ {label}: {e}"
         
+        progress.emit({"type": "action", "id": action.get('id'), "action": label, "result": result})
         return result
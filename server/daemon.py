@@ -0,0 +1,432 @@
+"""
+Daemon - Servidor HTTP/WebSocket local con un Assistant siempre caliente
+Widgets, atajos de Tasker u otros dispositivos envían comandos sin pagar el arranque
+Solo usa la librería estándar (compatible con Termux)
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import itertools
+import json
+from typing import Optional
+
+import circuit_breaker
+import tracing
+from mcps import executor
+
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+HTTP_REASONS = {
+    101: 'Switching Protocols',
+    200: 'OK',
+    400: 'Bad Request',
+    401: 'Unauthorized',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    408: 'Request Timeout',
+    413: 'Payload Too Large',
+    431: 'Request Header Fields Too Large',
+    503: 'Service Unavailable',
+}
+
+MAX_BODY = 64 * 1024
+MAX_HEADERS = 64
+
+
+class HTTPError(Exception):
+    """Petición que se rechaza con status y un mensaje de error en JSON"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+    """Un comando en cola: sus eventos salen por una cola propia"""
+
+    def __init__(self, job_id: int, command: str, session: str):
+        self.id = job_id
+        self.command = command
+        self.session = session
+        self.events = asyncio.Queue()
+        self.task = None
+        self.cancelled = False
+
+    def push(self, event: dict):
+        event = dict(event, job=self.id, session=self.session)
+        self.events.put_nowait(event)
+
+    def cancel(self):
+        """El cliente se fue: si sigue en cola no se ejecuta; si ya corre, se cancela"""
+        self.cancelled = True
+        if self.task is not None:
+            self.task.cancel()
+
+
+class AssistantDaemon:
+    """Sirve Assistant.process_command por HTTP y WebSocket"""
+
+    def __init__(self, assistant, config: dict = None):
+        config = config or {}
+        self.assistant = assistant
+        self.host = config.get('host', '127.0.0.1')
+        self.port = config.get('port', 8765)
+        self.workers = config.get('workers', 4)
+        self.token = config.get('token', '')
+        # Tiempo máximo para recibir la petición completa (cabeceras y cuerpo)
+        self.read_timeout = config.get('read_timeout', 10)
+
+        # Cola acotada: si se llena, se rechaza con 503 en vez de acumular latencia
+        self.queue = asyncio.Queue(maxsize=config.get('max_queue', 32))
+        self._ids = itertools.count(1)
+        self._worker_tasks = []
+        self._server = None
+        self.stats = {'accepted': 0, 'rejected': 0, 'completed': 0, 'cancelled': 0, 'running': 0}
+
+    async def start(self):
+        """Arranca los workers y el servidor"""
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        print(f"🛰️ Daemon escuchando en http://{self.host}:{self.port}")
+
+    async def serve_forever(self):
+        """Arranca y atiende peticiones hasta que se cancele"""
+        await self.start()
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """Detiene servidor y workers"""
+        if self._server:
+            self._server.close()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def submit(self, command: str, session: str = 'default') -> Optional[Job]:
+        """Encola un comando; devuelve None si la cola está llena (backpressure)"""
+        job = Job(next(self._ids), command, session)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            return None
+        self.stats['accepted'] += 1
+        job.push({"type": "queued", "position": self.queue.qsize()})
+        return job
+
+    async def _worker(self):
+        """Procesa comandos de la cola compartida"""
+        while True:
+            job = await self.queue.get()
+            if job.cancelled:
+                self.stats['cancelled'] += 1
+                self.queue.task_done()
+                continue
+            self.stats['running'] += 1
+            try:
+                job.push({"type": "started"})
+                job.task = asyncio.ensure_future(
+                    self.assistant.process_command(job.command, on_event=job.push))
+                response = await job.task
+                job.push({"type": "done", "response": response})
+            except asyncio.CancelledError:
+                if not job.cancelled:
+                    raise  # Se para el daemon
+                self.stats['cancelled'] += 1
+            except Exception as e:
+                job.push({"type": "done", "response": f"Lo siento, hubo un error: {e}"})
+            finally:
+                self.stats['running'] -= 1
+                self.stats['completed'] += 1
+                self.queue.task_done()
+
+    # ---------- HTTP ----------
+
+    async def _handle_client(self, reader, writer):
+        """Atiende una conexión: HTTP simple o upgrade a WebSocket"""
+        try:
+            try:
+                request = await asyncio.wait_for(self._read_request(reader),
+                                                 timeout=self.read_timeout)
+            except HTTPError as e:
+                await self._send_json(writer, e.status, {"error": str(e)})
+                return
+            except asyncio.TimeoutError:
+                await self._send_json(writer, 408, {"error": "petición incompleta"})
+                return
+            if request is None:
+                return
+            method, path, headers, body = request
+
+            if self.token and not hmac.compare_digest(
+                    headers.get('authorization', '').encode('utf-8'),
+                    f"Bearer {self.token}".encode('utf-8')):
+                await self._send_json(writer, 401, {"error": "token inválido"})
+                return
+
+            if path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                await self._handle_websocket(reader, writer, headers)
+            elif path == '/health':
+                await self._send_json(writer, 200, {
+                    "status": "ok",
+                    "queue": self.queue.qsize(),
+                    "max_queue": self.queue.maxsize,
+                    **self.stats,
+                    "llm": self.assistant.llm.stats,
+                    "speculation": self.assistant.speculation_stats,
+                    "intent_index": (self.assistant.intent_index.stats
+                                     if self.assistant.intent_index else None),
+                    "intent_speculation": (self.assistant.speculator.stats
+                                           if self.assistant.speculator else None),
+                    "processes": executor.stats(),
+                    "circuit_breakers": circuit_breaker.stats(),
+                    "event_log": (self.assistant.event_log.stats
+                                  if self.assistant.event_log else None)
+                })
+            elif path == '/metrics':
+                await self._send_json(writer, 200, {"enabled": tracing.ENABLED,
+                                                    "spans": tracing.snapshot()})
+            elif path == '/command':
+                if method != 'POST':
+                    await self._send_json(writer, 405, {"error": "usa POST"})
+                    return
+                await self._handle_command(reader, writer, body)
+            else:
+                await self._send_json(writer, 404, {"error": "ruta no encontrada"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Lee línea de petición, cabeceras (como mucho MAX_HEADERS) y cuerpo"""
+        line = await self._readline(reader)
+        if not line:
+            return None
+        parts = line.decode('latin-1').split()
+        if len(parts) < 2:
+            return None
+        method, path = parts[0].upper(), parts[1].split('?', 1)[0]
+
+        headers = {}
+        while True:
+            line = await self._readline(reader)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HTTPError(431, "demasiadas cabeceras")
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise HTTPError(400, "Content-Length inválido")
+        if length < 0:
+            raise HTTPError(400, "Content-Length inválido")
+        if length > MAX_BODY:
+            raise HTTPError(413, "petición demasiado grande")
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    @staticmethod
+    async def _readline(reader) -> bytes:
+        """readline con la línea acotada al límite del StreamReader (64 KiB)"""
+        try:
+            return await reader.readline()
+        except ValueError:
+            raise HTTPError(431, "línea de cabecera demasiado larga")
+
+    async def _handle_command(self, reader, writer, body: bytes):
+        """POST /command {"command": "...", "session": "...", "stream": false}
+
+        Si el cliente cuelga antes de la respuesta, el comando se cancela.
+        """
+        try:
+            payload = json.loads(body or b'{}')
+            command = str(payload['command'])
+        except (ValueError, KeyError, TypeError):
+            await self._send_json(writer, 400, {"error": "se espera {\"command\": \"...\"}"})
+            return
+
+        job = self.submit(command, str(payload.get('session', 'default')))
+        if job is None:
+            await self._send_json(writer, 503, {"error": "cola llena, reintenta"},
+                                  extra_headers={'Retry-After': '1'})
+            return
+
+        finished = False
+        closed = asyncio.ensure_future(self._wait_closed(reader))
+        try:
+            if not payload.get('stream', False):
+                while not finished:
+                    event = await self._next_event(job, closed)
+                    if event is None:
+                        return
+                    finished = event['type'] == 'done'
+                await self._send_json(writer, 200, {"job": job.id, "response": event['response']})
+                return
+
+            # Streaming: un objeto JSON por línea (NDJSON) en chunked transfer
+            writer.write(self._status_line(200) + b'Content-Type: application/x-ndjson\r\n'
+                         b'Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n')
+            while not finished:
+                event = await self._next_event(job, closed)
+                if event is None:
+                    return
+                finished = event['type'] == 'done'
+                data = json.dumps(event, ensure_ascii=False).encode('utf-8') + b'\n'
+                writer.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+                await writer.drain()
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        finally:
+            closed.cancel()
+            if not finished:
+                job.cancel()
+
+    @staticmethod
+    async def _next_event(job: Job, closed: asyncio.Future) -> Optional[dict]:
+        """Siguiente evento de job, o None si antes se cerró la conexión"""
+        getter = asyncio.ensure_future(job.events.get())
+        await asyncio.wait({getter, closed}, return_when=asyncio.FIRST_COMPLETED)
+        if not getter.done():
+            getter.cancel()
+            return None
+        return getter.result()
+
+    @staticmethod
+    async def _wait_closed(reader):
+        """Vuelve cuando el cliente cierra su lado (lo que mande después se descarta)"""
+        try:
+            while await reader.read(4096):
+                pass
+        except ConnectionError:
+            pass
+
+    def _status_line(self, status: int) -> bytes:
+        return f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n".encode()
+
+    async def _send_json(self, writer, status: int, data: dict, extra_headers: dict = None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        head = self._status_line(status)
+        head += b'Content-Type: application/json; charset=utf-8\r\n'
+        head += f"Content-Length: {len(body)}\r\nConnection: close\r\n".encode()
+        for name, value in (extra_headers or {}).items():
+            head += f"{name}: {value}\r\n".encode()
+        writer.write(head + b'\r\n' + body)
+        await writer.drain()
+
+    # ---------- WebSocket ----------
+
+    async def _handle_websocket(self, reader, writer, headers: dict):
+        """Cada mensaje {"command": "...", "session": "..."} genera eventos con su "job" """
+        key = headers.get('sec-websocket-key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(self._status_line(101) + b'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+                     + f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode())
+        await writer.drain()
+
+        send_lock = asyncio.Lock()
+        pumps = {}
+
+        async def send(data: dict):
+            async with send_lock:
+                await self._ws_send(writer, json.dumps(data, ensure_ascii=False))
+
+        async def pump(job: Job):
+            while True:
+                event = await job.events.get()
+                await send(event)
+                if event['type'] == 'done':
+                    break
+
+        fragments = None
+        try:
+            while True:
+                fin, opcode, payload = await self._ws_read(reader)
+                if opcode == 0x8:
+                    # Cierre: se responde con otro frame de cierre (mismo código) antes de colgar
+                    async with send_lock:
+                        await self._ws_send(writer, payload[:2], opcode=0x8)
+                    break
+                if opcode == 0x9:
+                    async with send_lock:
+                        await self._ws_send(writer, payload, opcode=0xA)
+                    continue
+                if opcode in (0x1, 0x2) and not fin:
+                    # Mensaje fragmentado: llegan frames de continuación (0x0) hasta FIN
+                    fragments = [opcode, bytearray(payload)]
+                    continue
+                if opcode == 0x0:
+                    if fragments is None:
+                        continue
+                    fragments[1] += payload
+                    if len(fragments[1]) > MAX_BODY:
+                        raise ConnectionError("mensaje demasiado grande")
+                    if not fin:
+                        continue
+                    opcode, payload = fragments[0], bytes(fragments[1])
+                    fragments = None
+                if opcode != 0x1:
+                    continue
+
+                try:
+                    message = json.loads(payload.decode('utf-8'))
+                    command = str(message['command'])
+                except (ValueError, KeyError, TypeError):
+                    await send({"type": "error", "error": "se espera {\"command\": \"...\"}"})
+                    continue
+
+                job = self.submit(command, str(message.get('session', 'default')))
+                if job is None:
+                    await send({"type": "error", "error": "cola llena, reintenta",
+                                "ref": message.get('id')})
+                    continue
+                # Varios comandos en vuelo por conexión
+                task = asyncio.create_task(pump(job))
+                pumps[task] = job
+                task.add_done_callback(lambda done: pumps.pop(done, None))
+        finally:
+            # Conexión cerrada: lo que quede en vuelo ya no tiene a quién responder
+            for task, job in list(pumps.items()):
+                task.cancel()
+                job.cancel()
+
+    async def _ws_read(self, reader) -> tuple:
+        """Lee un frame: (fin, opcode, payload) (los clientes siempre envían con máscara)"""
+        head = await reader.readexactly(2)
+        fin = bool(head[0] & 0x80)
+        opcode = head[0] & 0x0F
+        masked = head[1] & 0x80
+        length = head[1] & 0x7F
+        if length == 126:
+            length = int.from_bytes(await reader.readexactly(2), 'big')
+        elif length == 127:
+            length = int.from_bytes(await reader.readexactly(8), 'big')
+        if length > MAX_BODY:
+            raise ConnectionError("frame demasiado grande")
+        mask = await reader.readexactly(4) if masked else b'\x00\x00\x00\x00'
+        data = await reader.readexactly(length)
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+        return fin, opcode, payload
+
+    async def _ws_send(self, writer, data, opcode: int = 0x1):
+        """Envía un frame sin máscara (servidor → cliente)"""
+        payload = data.encode('utf-8') if isinstance(data, str) else data
+        head = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            head += bytes([len(payload)])
+        elif len(payload) < 65536:
+            head += bytes([126]) + len(payload).to_bytes(2, 'big')
+        else:
+            head += bytes([127]) + len(payload).to_bytes(8, 'big')
+        writer.write(head + payload)
+        await writer.drain()
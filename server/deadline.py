@@ -0,0 +1,83 @@
+"""
+Deadline - Presupuesto de tiempo por comando
+process_command abre un scope y cada etapa (LLM, MCP, subprocesos) toma su timeout
+de lo que queda, en vez de elegir uno propio
+"""
+import asyncio
+import contextvars
+import os
+import signal
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar('deadline', default=None)
+
+
+class Deadline:
+    """Instante límite (reloj monotónico)"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def current() -> Optional[Deadline]:
+    """Deadline activo (None fuera de un comando)"""
+    return _current.get()
+
+
+@contextmanager
+def scope(seconds: float):
+    """Activa un deadline; si ya hay uno más cercano, se respeta el más cercano"""
+    deadline = Deadline(seconds)
+    outer = _current.get()
+    if outer is not None and outer.expires_at < deadline.expires_at:
+        deadline = outer
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def timeout(cap: float) -> float:
+    """Timeout para una etapa: cap, recortado a lo que queda del deadline"""
+    deadline = _current.get()
+    if deadline is None:
+        return cap
+    # Nunca 0: urllib y asyncio interpretan 0 de forma distinta a "ya vencido"
+    return max(0.001, min(cap, deadline.remaining()))
+
+
+def kill_process(process):
+    """Mata el proceso y, si lidera su grupo (start_new_session=True), a sus hijos"""
+    if process.returncode is not None:
+        return
+    try:
+        if os.getpgid(process.pid) == process.pid:
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def communicate(process, input: bytes = None, cap: float = 30) -> tuple:
+    """process.communicate() acotado por el deadline; si vence o se cancela, mata el proceso"""
+    try:
+        return await asyncio.wait_for(process.communicate(input=input), timeout=timeout(cap))
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        kill_process(process)
+        try:
+            # Recoger el proceso para no dejar zombis
+            await asyncio.wait_for(process.wait(), timeout=1)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+        raise
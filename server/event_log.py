@@ -0,0 +1,226 @@
+"""
+Event Log - Registro duradero de cada comando en SQLite
+Cada process_command deja una fila: texto normalizado, intent resuelto, origen
+del plan, proveedor/modelo, tokens, tiempos por etapa y resultado. record() solo
+encola; un hilo escribe por lotes en una transacción, fuera del camino del
+comando. Hay índices por tiempo e intent, y una política de retención por edad
+y por número de filas.
+
+Consultas útiles:
+    sqlite3 events.db "SELECT intent, count(*), avg(total_ms) FROM events GROUP BY intent"
+"""
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    command TEXT,
+    normalized TEXT,
+    intent TEXT,
+    intent_source TEXT,
+    outcome TEXT,
+    provider TEXT,
+    model TEXT,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_ms REAL,
+    timings TEXT,
+    plan TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_intent_ts ON events (intent, ts);
+"""
+
+COLUMNS = ('ts', 'command', 'normalized', 'intent', 'intent_source', 'outcome', 'provider',
+           'model', 'prompt_tokens', 'completion_tokens', 'total_ms', 'timings', 'plan', 'error')
+
+_STOP = object()
+
+
+def default_path() -> str:
+    base = os.getenv('XDG_DATA_HOME', os.path.join(os.path.expanduser('~'), '.local', 'share'))
+    return os.path.join(base, 'asistente-movil', 'events.db')
+
+
+def intent_label(plan: Optional[list], outcome: Optional[str]) -> Optional[str]:
+    """'spotify.play' (o 'spotify.play+mobile.notify' si son varias); sin plan, el resultado"""
+    if plan:
+        return '+'.join(f"{a.get('mcp', '')}.{a.get('action', '')}" for a in plan)
+    return outcome
+
+
+class EventLog:
+    """Almacén de solo-añadir de comandos, escrito por lotes desde un hilo
+
+    retention_days / max_rows: lo más antiguo se borra al pasar cualquiera de
+    los dos (se comprueba como mucho cada prune_interval segundos).
+    """
+
+    def __init__(self, path: str, retention_days: float = 90, max_rows: int = 100000,
+                 batch_size: int = 50, flush_interval: float = 1.0, max_pending: int = 1000,
+                 prune_interval: float = 3600):
+        self.path = path
+        self.retention = retention_days * 86400
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.prune_interval = prune_interval
+        self.stats = {'queued': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'pruned': 0,
+                      'errors': 0}
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._pruned_at = 0.0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # El esquema se crea aquí para que las lecturas funcionen antes de la primera escritura
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        # WAL: las lecturas no bloquean al escritor
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    # --- escritura ---
+
+    def record(self, event: dict):
+        """Encola un evento (nunca bloquea: si la cola está llena se descarta)"""
+        try:
+            self._queue.put_nowait(event)
+            self.stats['queued'] += 1
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    def _writer(self):
+        conn = self._connect()
+        try:
+            while True:
+                first = self._queue.get()
+                batch = [first]
+                # Juntar lo que llegue en flush_interval (o hasta llenar el lote)
+                flush_at = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                    remaining = flush_at - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                stop = batch[-1] is _STOP
+                rows = [self._row(e) for e in batch if e is not _STOP]
+                if rows:
+                    self._write(conn, rows)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row(event: dict) -> tuple:
+        row = dict(event)
+        for key in ('timings', 'plan'):
+            if row.get(key) is not None:
+                row[key] = json.dumps(row[key], ensure_ascii=False)
+        return tuple(row.get(column) for column in COLUMNS)
+
+    def _write(self, conn: sqlite3.Connection, rows: list):
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO events ({', '.join(COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in COLUMNS)})", rows)
+            self.stats['written'] += len(rows)
+            self.stats['batches'] += 1
+            if time.monotonic() - self._pruned_at >= self.prune_interval:
+                self._prune(conn)
+        except sqlite3.Error as e:
+            self.stats['errors'] += 1
+            print(f"⚠️ Registro de eventos: {e}")
+
+    def _prune(self, conn: sqlite3.Connection):
+        """Aplica la retención: por edad y, si sigue por encima, por número de filas"""
+        self._pruned_at = time.monotonic()
+        with conn:
+            deleted = conn.execute("DELETE FROM events WHERE ts < ?",
+                                   (time.time() - self.retention,)).rowcount
+            deleted += conn.execute(
+                "DELETE FROM events WHERE id <= "
+                "(SELECT id FROM events ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (self.max_rows,)).rowcount
+        self.stats['pruned'] += deleted
+
+    def flush(self, timeout: float = 5.0):
+        """Espera a que lo encolado hasta ahora esté escrito"""
+        target = self.stats['queued'] - self.stats['dropped']
+        end = time.monotonic() + timeout
+        while self.stats['written'] + self.stats['errors'] < target and time.monotonic() < end:
+            if not self._thread.is_alive():
+                return
+            time.sleep(0.01)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5)
+
+    # --- lectura ---
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def recent(self, limit: int = 20) -> list:
+        return self._query("SELECT * FROM events ORDER BY ts DESC LIMIT ?", (limit,))
+
+    def latency_by_intent(self, since: float = 0) -> dict:
+        """{intent: {count, p50_ms, p95_ms, max_ms}} desde el instante since (epoch)"""
+        rows = self._query("SELECT intent, total_ms FROM events "
+                           "WHERE ts >= ? AND total_ms IS NOT NULL ORDER BY intent, total_ms",
+                           (since,))
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row['intent'], []).append(row['total_ms'])
+        result = {}
+        for intent, values in grouped.items():
+            result[intent] = {
+                'count': len(values),
+                'p50_ms': round(values[int(0.50 * (len(values) - 1))], 3),
+                'p95_ms': round(values[int(0.95 * (len(values) - 1))], 3),
+                'max_ms': round(values[-1], 3),
+            }
+        return result
+
+    def routed_commands(self, limit: int = 1000) -> list:
+        """[(comando, plan)] más recientes que el router resolvió con un MCP
+
+        Corpus de arranque en caliente para el índice de intents.
+        """
+        rows = self._query("SELECT command, plan FROM events "
+                           "WHERE outcome = 'mcp' AND intent_source IN ('llm', 'speculative') AND plan IS NOT NULL "
+                           "ORDER BY ts DESC LIMIT ?", (limit,))
+        result = []
+        for row in rows:
+            try:
+                result.append((row['command'], json.loads(row['plan'])))
+            except ValueError:
+                continue
+        return result
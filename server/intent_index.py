@@ -0,0 +1,335 @@
+"""
+Intent Index - Enrutado local a partir de decisiones pasadas del router (LLM)
+Cada comando que el LLM resolvió a un plan de MCP se guarda con su vector de
+n-gramas de caracteres. Un comando parecido ("ponme despacito en youtube" tras
+"pon despacito en youtube") se resuelve por similitud coseno sin llamar al LLM,
+re-extrayendo los parámetros (slots) de las palabras del comando nuevo.
+
+Con NumPy la similitud contra todo el índice es un solo producto matriz-vector;
+sin él se calcula con vectores dispersos en Python puro.
+"""
+import atexit
+import copy
+import difflib
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import zlib
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from text_utils import normalize
+
+
+# Vectores por hashing: tamaño fijo sin vocabulario (1000 entradas ≈ 4 MB con NumPy)
+DIMENSIONS = 1024
+
+
+def ngram_vector(text: str, sizes=(2, 3, 4)) -> dict:
+    """{índice: peso} de los n-gramas de caracteres, normalizado a norma 1"""
+    padded = f" {text} "
+    counts = {}
+    for n in sizes:
+        for i in range(len(padded) - n + 1):
+            index = zlib.crc32(padded[i:i + n].encode('utf-8')) % DIMENSIONS
+            counts[index] = counts.get(index, 0) + 1
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {k: v / norm for k, v in counts.items()}
+
+
+def cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+def _slots(command_tokens: list, plan: list) -> list:
+    """Parámetros de texto/número que aparecen literalmente en el comando
+
+    Devuelve [(acción, parámetro, inicio, fin, es_número)] con la posición en
+    tokens; los parámetros que no aparecen se tratan como constantes.
+    """
+    slots = []
+    for index, action in enumerate(plan):
+        for name, value in (action.get('params') or {}).items():
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                continue
+            tokens = normalize(str(value)).split()
+            if not tokens:
+                continue
+            for start in range(len(command_tokens) - len(tokens) + 1):
+                if command_tokens[start:start + len(tokens)] == tokens:
+                    slots.append((index, name, start, start + len(tokens),
+                                  not isinstance(value, str)))
+                    break
+    return slots
+
+
+class IntentIndex:
+    """Índice acotado de comando → plan con enrutado por vecino más cercano
+
+    threshold: similitud mínima entre el comando y la plantilla re-rellenada
+    exact_threshold: para planes con parámetros que no salen del texto (solo
+    casi-idénticos pueden reutilizarlos)
+    verify_rate: fracción de aciertos locales que se contrastan con el LLM
+    """
+
+    def __init__(self, path: str = None, threshold: float = 0.85, exact_threshold: float = 0.97,
+                 max_entries: int = 1000, max_age_days: float = 30, verify_rate: float = 0.1,
+                 candidates: int = 5):
+        self.path = path
+        self.threshold = threshold
+        self.exact_threshold = exact_threshold
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.verify_rate = verify_rate
+        self.candidates = candidates
+        self.entries = []
+        self._matrix = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = 0.0
+        self.stats = {'lookups': 0, 'hits': 0, 'misses': 0, 'added': 0, 'evicted': 0,
+                      'verified': 0, 'agreed': 0, 'disagreed': 0}
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    # --- consulta ---
+
+    def lookup(self, command: str, record: bool = True) -> Optional[list]:
+        """Plan para command si hay un vecino suficientemente parecido (None si no)
+
+        record=False consulta sin contar el uso (predicciones especulativas)
+        """
+        text = normalize(command)
+        if not text:
+            return None
+        with self._lock:
+            if record:
+                self.stats['lookups'] += 1
+            best = None
+            # Palabras con mayúsculas y tildes, para que los slots salgan como se dijeron
+            original = re.findall(r'\w+', command)
+            for entry, _ in self._nearest(ngram_vector(text)):
+                plan, confidence = self._reextract(entry, text, original)
+                if plan is not None and (best is None or confidence > best[1]):
+                    best = (plan, confidence, entry)
+            if best is None:
+                if record:
+                    self.stats['misses'] += 1
+                return None
+            plan, confidence, entry = best
+            if not record:
+                return plan
+            entry['hits'] += 1
+            entry['used'] = time.time()
+            self._dirty = True
+            self.stats['hits'] += 1
+            return plan
+
+    def _nearest(self, vector: dict) -> list:
+        """Los candidates vecinos más parecidos (similitud del texto completo)"""
+        if not self.entries:
+            return []
+        if np is not None:
+            if self._matrix is None:
+                self._matrix = np.zeros((len(self.entries), DIMENSIONS), dtype=np.float32)
+                for row, entry in enumerate(self.entries):
+                    for k, v in entry['vector'].items():
+                        self._matrix[row, k] = v
+            query = np.zeros(DIMENSIONS, dtype=np.float32)
+            for k, v in vector.items():
+                query[k] = v
+            scores = self._matrix @ query
+            count = min(self.candidates, len(scores))
+            top = np.argpartition(-scores, count - 1)[:count]
+            ranked = sorted(((float(scores[i]), int(i)) for i in top), reverse=True)
+        else:
+            ranked = sorted(((cosine(vector, e['vector']), i) for i, e in enumerate(self.entries)),
+                            reverse=True)[:self.candidates]
+        # Por debajo de esto ni con slots distintos se parecen
+        return [(self.entries[i], score) for score, i in ranked if score >= 0.4]
+
+    def _reextract(self, entry: dict, text: str, original: list = None) -> tuple:
+        """Rellena la plantilla de entry con las palabras de text → (plan, confianza)"""
+        template = entry['tokens']
+        tokens = text.split()
+        if not original or len(original) != len(tokens):
+            original = tokens
+        plan = copy.deepcopy(entry['plan'])
+        rendered = list(template)
+        # Posición en el comando nuevo de cada palabra de la plantilla que coincide
+        matcher = difflib.SequenceMatcher(None, template, tokens, autojunk=False)
+        aligned = {}
+        for block in matcher.get_matching_blocks():
+            for offset in range(block.size):
+                aligned[block.a + offset] = block.b + offset
+
+        # Sustituir de derecha a izquierda para no mover las posiciones pendientes
+        for index, name, start, end, numeric in sorted(entry['slots'], key=lambda s: -s[2]):
+            # El slot nuevo va entre la última palabra fija anterior y la primera posterior
+            before = [aligned[p] for p in range(start) if p in aligned]
+            after = [aligned[p] for p in range(end, len(template)) if p in aligned]
+            new_start = before[-1] + 1 if before else min(start, len(tokens))
+            if after:
+                new_end = after[0]
+            else:
+                # Sin palabra fija detrás nada acota el hueco: se queda con la longitud
+                # de la plantilla y lo que sobre baja la confianza
+                new_end = min(len(tokens), new_start + end - start)
+            if new_end <= new_start:
+                return None, 0.0
+            words = tokens[new_start:new_end]
+            if numeric:
+                if len(words) != 1 or not re.fullmatch(r'\d+(\.\d+)?', words[0]):
+                    return None, 0.0
+                value = float(words[0]) if '.' in words[0] else int(words[0])
+            else:
+                value = ' '.join(original[new_start:new_end])
+            plan[index]['params'][name] = value
+            rendered[start:end] = words
+
+        confidence = cosine(ngram_vector(' '.join(rendered)), ngram_vector(text))
+        required = self.threshold if entry['complete'] else self.exact_threshold
+        if confidence < required:
+            return None, confidence
+        return plan, confidence
+
+    # --- aprendizaje ---
+
+    def add(self, command: str, plan: list):
+        """Guarda (o actualiza) lo que resolvió el LLM para command"""
+        text = normalize(command)
+        if not text or not plan:
+            return
+        tokens = text.split()
+        slots = _slots(tokens, plan)
+        string_params = sum(1 for a in plan for v in (a.get('params') or {}).values()
+                            if isinstance(v, str))
+        entry = {
+            'command': text,
+            'tokens': tokens,
+            'plan': plan,
+            'slots': slots,
+            # Todos los textos salen del comando: la plantilla vale para otros valores
+            'complete': sum(1 for s in slots if not s[4]) >= string_params,
+            'vector': ngram_vector(text),
+            'hits': 0,
+            'created': time.time(),
+            'used': time.time(),
+        }
+        with self._lock:
+            self.entries = [e for e in self.entries if e['command'] != text]
+            self.entries.append(entry)
+            self.stats['added'] += 1
+            self._evict()
+            self._matrix = None
+            self._dirty = True
+
+    def forget(self, command: str):
+        text = normalize(command)
+        with self._lock:
+            self.entries = [e for e in self.entries if e['command'] != text]
+            self._matrix = None
+            self._dirty = True
+
+    def should_verify(self) -> bool:
+        return random.random() < self.verify_rate
+
+    def record_verification(self, command: str, local_plan: list, llm_plan: Optional[list]):
+        """Contrasta un acierto local con el LLM; si no coinciden, manda el LLM"""
+        agreed = _comparable(local_plan) == _comparable(llm_plan)
+        with self._lock:
+            self.stats['verified'] += 1
+            self.stats['agreed' if agreed else 'disagreed'] += 1
+        if agreed:
+            return
+        if llm_plan:
+            self.add(command, llm_plan)
+        else:
+            self.forget(command)
+
+    @property
+    def accuracy(self) -> Optional[float]:
+        verified = self.stats['verified']
+        return self.stats['agreed'] / verified if verified else None
+
+    def _evict(self):
+        """Quita entradas sin uso en max_age y, si sigue lleno, las usadas hace más tiempo"""
+        now = time.time()
+        before = len(self.entries)
+        self.entries = [e for e in self.entries if now - e['used'] <= self.max_age]
+        if len(self.entries) > self.max_entries:
+            self.entries.sort(key=lambda e: e['used'])
+            self.entries = self.entries[-self.max_entries:]
+        self.stats['evicted'] += before - len(self.entries)
+
+    # --- persistencia ---
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        for entry in stored.get('entries', []):
+            try:
+                entry['slots'] = [tuple(s) for s in entry['slots']]
+                entry['vector'] = ngram_vector(entry['command'])
+                self.entries.append(entry)
+            except (KeyError, TypeError):
+                continue
+        self._evict()
+
+    def save(self):
+        """Escritura atómica (temporal + rename) si hay cambios"""
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            entries = [{k: v for k, v in e.items() if k != 'vector'} for e in self.entries]
+            self._dirty = False
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'entries': entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._saved_at = time.monotonic()
+
+    def save_due(self, min_interval: float = 10.0) -> bool:
+        """Hay cambios y pasaron min_interval segundos desde el último guardado"""
+        return self._dirty and time.monotonic() - self._saved_at >= min_interval
+
+    def maybe_save(self, min_interval: float = 10.0):
+        """Guarda como mucho cada min_interval segundos"""
+        if self.save_due(min_interval):
+            self.save()
+
+
+def _comparable(plan: Optional[list]):
+    """Plan reducido a lo que importa al comparar (sin ids ni mayúsculas)"""
+    if not plan:
+        return None
+    return [(a.get('mcp'), a.get('action'),
+             json.dumps({k: normalize(v) if isinstance(v, str) else v
+                         for k, v in (a.get('params') or {}).items()}, sort_keys=True))
+            for a in plan]
+
+
+def default_path() -> str:
+    base = os.getenv('XDG_DATA_HOME', os.path.join(os.path.expanduser('~'), '.local', 'share'))
+    return os.path.join(base, 'asistente-movil', 'intents.json')
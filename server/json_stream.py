@@ -0,0 +1,122 @@
+"""
+JSON Stream - Extractor incremental de objetos JSON sobre un flujo de tokens
+Se alimenta con los trozos que llegan del LLM y devuelve cada objeto en cuanto
+se cierra, sin esperar al final de la respuesta. El texto fuera del JSON (prosa,
+markdown, llaves sueltas que no forman JSON válido) se ignora.
+"""
+import json
+from typing import List, Tuple
+
+
+class _Container:
+    """Objeto o array abierto: dónde empieza y en qué clave/índice vamos"""
+
+    __slots__ = ('kind', 'start', 'key', 'index', 'expect_key')
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind
+        self.start = start
+        self.key = None
+        self.index = 0
+        self.expect_key = kind == '{'
+
+
+class JSONStreamParser:
+    """Parser incremental: feed(texto) → [(ruta, objeto), ...]
+
+    ruta es la tupla de claves/índices desde la raíz, p.ej. () para el objeto
+    raíz o ('actions', 0) para el primer elemento de "actions". Solo se
+    devuelven objetos (dicts) que además son JSON válido.
+    """
+
+    def __init__(self, max_buffer: int = 64 * 1024):
+        self.max_buffer = max_buffer
+        self.buffer = ''
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+
+    def feed(self, text: str) -> List[Tuple[tuple, dict]]:
+        self.buffer += text
+        found = []
+        buffer = self.buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            position = self._pos
+            self._pos += 1
+
+            if not self._stack:
+                # Fuera del JSON: solo interesa dónde empieza el siguiente objeto
+                if char == '{':
+                    self._stack.append(_Container('{', position))
+                continue
+
+            top = self._stack[-1]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if top.kind == '{' and top.expect_key:
+                        try:
+                            top.key = json.loads(buffer[self._string_start:position + 1])
+                        except ValueError:
+                            top.key = None
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = position
+            elif char in '{[':
+                self._stack.append(_Container(char, position))
+            elif char == ':' and top.kind == '{':
+                top.expect_key = False
+            elif char == ',':
+                if top.kind == '{':
+                    top.expect_key = True
+                else:
+                    top.index += 1
+            elif char in '}]':
+                closed = self._stack.pop()
+                if (char == '}') != (closed.kind == '{'):
+                    # Cierre que no corresponde: no es JSON, se descarta el candidato
+                    self._reset()
+                    continue
+                if closed.kind == '{':
+                    path = self._path()
+                    try:
+                        value = json.loads(buffer[closed.start:position + 1])
+                    except ValueError:
+                        value = None
+                    # Llaves en la prosa ("{nombre}") no son JSON válido y se saltan
+                    if isinstance(value, dict):
+                        found.append((path, value))
+                if not self._stack:
+                    self._compact()
+                    buffer = self.buffer
+
+        if len(self.buffer) > self.max_buffer:
+            # Un objeto que nunca se cierra no debe crecer sin límite
+            self._reset()
+        return found
+
+    def _path(self) -> tuple:
+        path = []
+        for container in self._stack:
+            path.append(container.key if container.kind == '{' else container.index)
+        return tuple(path)
+
+    def _compact(self):
+        """Olvida el texto ya consumido (no hay nada abierto que lo necesite)"""
+        self.buffer = self.buffer[self._pos:]
+        self._pos = 0
+
+    def _reset(self):
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._compact()
@@ -0,0 +1,408 @@
+"""
+LLM Client - Cliente de chat completions de Groq con control de cuota
+- Limitador de peticiones/tokens por minuto alimentado por las cabeceras x-ratelimit-*
+- Un 429 se espera y se reintenta (backoff con jitter) dentro del deadline del comando
+- Peticiones idénticas en vuelo comparten una sola llamada (singleflight), que se
+  cancela (y corta la conexión) cuando ya no queda nadie esperándola
+- stream() entrega el texto según se genera (SSE) y se puede cortar a medias
+Solo usa urllib (compatible con Termux)
+"""
+import asyncio
+import contextvars
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from typing import Optional
+
+import circuit_breaker
+import deadline
+import tracing
+from circuit_breaker import CircuitOpenError
+
+
+class LLMError(Exception):
+    """Error de la API del LLM (el mensaje se muestra al usuario)"""
+
+    def __init__(self, message: str, status: int = 0):
+        super().__init__(message)
+        self.status = status
+
+
+# Tokens gastados por el comando actual (se hereda en las tareas hijas de asyncio)
+_usage: contextvars.ContextVar = contextvars.ContextVar('llm_usage', default=None)
+
+
+@contextmanager
+def track_usage():
+    """Suma en el dict devuelto los tokens de las llamadas hechas dentro del bloque"""
+    usage = {'prompt_tokens': 0, 'completion_tokens': 0}
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+
+def parse_duration(value: Optional[str]) -> float:
+    """'2m59.56s', '7.66s', '120ms' o '3' (segundos) → segundos"""
+    if not value:
+        return 0.0
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    factors = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    return sum(float(n) * factors[unit] for n, unit in _DURATION_RE.findall(value))
+
+
+class TokenBucket:
+    """Cubo que se rellena a capacity/60 por segundo (límite por minuto)"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        rate = self.capacity / 60
+        self.level = min(self.capacity, self.level + (now - self.updated) * rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """Segundos hasta poder gastar cost (0 si ya se puede)"""
+        self._refill(now)
+        cost = min(cost, self.capacity)
+        if self.level >= cost:
+            return 0.0
+        return (cost - self.level) / (self.capacity / 60)
+
+
+class RateLimiter:
+    """Presupuesto de peticiones y tokens por minuto
+
+    Arranca con los límites de la configuración y se corrige con lo que informa
+    el servidor (remaining/reset) en cada respuesta.
+    """
+
+    def __init__(self, requests_per_minute: float = 30, tokens_per_minute: float = 6000):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float) -> float:
+        """Reserva una petición de ~tokens; devuelve 0 si puede salir ya o los segundos a esperar"""
+        with self._lock:
+            now = time.monotonic()
+            if self.blocked_until > now:
+                return self.blocked_until - now
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait == 0:
+                self.requests.level -= 1
+                self.tokens.level -= min(tokens, self.tokens.capacity)
+            return wait
+
+    def update(self, headers):
+        """Sincroniza con las cabeceras x-ratelimit-* de la respuesta"""
+        with self._lock:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, 'requests'), (self.tokens, 'tokens')):
+                limit = headers.get(f'x-ratelimit-limit-{kind}')
+                remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+                try:
+                    if limit is not None and kind == 'tokens':
+                        # El límite de peticiones de Groq es diario; el de tokens, por minuto
+                        bucket.capacity = float(limit)
+                    if remaining is not None:
+                        bucket._refill(now)
+                        bucket.level = min(bucket.level, float(remaining))
+                        if float(remaining) <= 0:
+                            reset = parse_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+                            self.blocked_until = max(self.blocked_until, now + reset)
+                except ValueError:
+                    pass
+
+    def penalize(self, seconds: float):
+        """Tras un 429: no enviar nada hasta que pase seconds"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def _is_outage(error: Exception) -> bool:
+    """¿El error indica que la API está caída? (no una petición rechazada o la cuota)"""
+    if isinstance(error, LLMError):
+        return error.status >= 500
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
+
+def _close_opened(opening: asyncio.Future):
+    """Cierra una respuesta SSE que terminó de abrirse cuando ya nadie la esperaba"""
+    if not opening.cancelled() and opening.exception() is None:
+        opening.result().close()
+
+
+class GroqClient:
+    """Cliente async de /chat/completions con limitador, reintentos y singleflight"""
+
+    def __init__(self, api_key: str, model: str, base_url: str = 'https://api.groq.com/openai/v1',
+                 config: dict = None):
+        config = config or {}
+        self.api_key = api_key
+        self.model = model
+        self.url = f"{base_url.rstrip('/')}/chat/completions"
+        self.models_url = f"{base_url.rstrip('/')}/models"
+        # Si la API lleva varios fallos seguidos se falla al instante (la sonda la reabre)
+        self.breaker = circuit_breaker.get('groq', probe=self.probe)
+        self.max_retries = config.get('max_retries', 4)
+        self.backoff_base = config.get('backoff_base', 0.5)
+        self.backoff_max = config.get('backoff_max', 8.0)
+        self.limiter = RateLimiter(config.get('requests_per_minute', 30),
+                                   config.get('tokens_per_minute', 6000))
+        self._inflight = {}
+        # future compartido → cuántos chat() lo esperan
+        self._waiters = {}
+        self.stats = {'requests': 0, 'coalesced': 0, 'retries': 0, 'rate_limited': 0,
+                      'waited_s': 0.0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+    async def chat(self, messages: list, temperature: float = 0.7, max_tokens: int = 500) -> dict:
+        """Devuelve {"content": str, "usage": dict}; peticiones idénticas en vuelo se comparten
+
+        Si se van todos los que esperan (deadline, cliente que cuelga, cancelación
+        en el REPL), la petición compartida se cancela y deja de generar.
+        """
+        future = self.start(messages, temperature, max_tokens)
+        self._waiters[future] = self._waiters.get(future, 0) + 1
+        try:
+            # shield: si un llamador se cancela, los demás siguen esperando la misma respuesta
+            return await asyncio.shield(future)
+        finally:
+            self._waiters[future] -= 1
+            if not self._waiters[future]:
+                del self._waiters[future]
+                if not future.done():
+                    future.cancel()
+
+    def start(self, messages: list, temperature: float = 0.7, max_tokens: int = 500) -> asyncio.Future:
+        """Lanza (o reutiliza si ya está en vuelo) la petición y devuelve su future compartido"""
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        key = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return future
+        future = asyncio.ensure_future(self._collect(messages, temperature, max_tokens))
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return future
+
+    def _estimate_tokens(self, payload: dict) -> int:
+        """Estimación barata (~4 caracteres por token) + una salida típica
+
+        No se reserva max_tokens completo: las respuestas suelen ser cortas y
+        las cabeceras del servidor corrigen el presupuesto en cada respuesta.
+        """
+        chars = sum(len(m.get('content', '')) for m in payload['messages'])
+        return chars // 4 + min(payload.get('max_tokens', 0), 100)
+
+    async def _wait_for_budget(self, tokens: int):
+        """Espera turno en el limitador sin pasarse del deadline del comando"""
+        while True:
+            wait = self.limiter.reserve(tokens)
+            if wait <= 0:
+                return
+            if wait > deadline.timeout(float('inf')):
+                raise LLMError("Límite de uso del LLM alcanzado, inténtalo en un momento", 429)
+            self.stats['waited_s'] += wait
+            await asyncio.sleep(wait)
+
+    def _backoff(self, attempt: int, minimum: float = 0.0) -> float:
+        """Backoff exponencial con jitter (entre la mitad y el techo), nunca menor que lo que pide el servidor"""
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return max(minimum, random.uniform(ceiling / 2, ceiling))
+
+    async def stream(self, messages: list, temperature: float = 0.7, max_tokens: int = 500,
+                     report: Optional[dict] = None):
+        """Generador async con los trozos de texto según llegan (SSE)
+
+        Cerrar el generador (break + aclose) corta la conexión y con ella la
+        generación en el servidor. No se comparte entre llamadores.
+        report, si se pasa, recibe el uso contabilizado (real, o estimado si se cortó).
+        """
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+        chars = sum(len(m.get('content', '')) for m in messages)
+        opening = asyncio.ensure_future(self._with_retries(payload, self._open_stream))
+        try:
+            response = await asyncio.shield(opening)
+        except asyncio.CancelledError:
+            # Cancelado mientras se abría: la conexión se cierra en cuanto llegue
+            opening.add_done_callback(_close_opened)
+            estimate = {'prompt_tokens': chars // 4, 'completion_tokens': 0}
+            self._count_usage(estimate)
+            if report is not None:
+                report.update(estimate)
+            raise
+        self.limiter.update({k.lower(): v for k, v in response.headers.items()})
+        generated = 0
+        usage_seen = False
+        try:
+            while True:
+                line = await asyncio.wait_for(asyncio.to_thread(response.readline),
+                                              timeout=deadline.timeout(30))
+                if not line:
+                    return
+                line = line.decode('utf-8', errors='replace').strip()
+                if not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    return
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                usage = chunk.get('usage') or chunk.get('x_groq', {}).get('usage')
+                if usage:
+                    usage_seen = True
+                    self._count_usage(usage)
+                    if report is not None:
+                        report.update(usage)
+                for choice in chunk.get('choices') or []:
+                    piece = (choice.get('delta') or {}).get('content')
+                    if piece:
+                        generated += len(piece)
+                        yield piece
+        finally:
+            if not usage_seen:
+                # Cortado antes del último trozo (el que trae el uso): se estima
+                estimate = {'prompt_tokens': chars // 4, 'completion_tokens': generated // 4}
+                self._count_usage(estimate)
+                if report is not None:
+                    report.update(estimate)
+            try:
+                response.close()
+            except Exception:
+                pass
+
+    def _count_usage(self, usage: Optional[dict]):
+        if usage:
+            self.stats['prompt_tokens'] += usage.get('prompt_tokens', 0)
+            self.stats['completion_tokens'] += usage.get('completion_tokens', 0)
+            command_usage = _usage.get()
+            if command_usage is not None:
+                command_usage['prompt_tokens'] += usage.get('prompt_tokens', 0)
+                command_usage['completion_tokens'] += usage.get('completion_tokens', 0)
+
+    async def _collect(self, messages: list, temperature: float, max_tokens: int) -> dict:
+        """Respuesta completa leída por SSE: cancelarla cierra la conexión y corta la generación"""
+        usage = {}
+        pieces = []
+        stream = self.stream(messages, temperature, max_tokens, report=usage)
+        try:
+            async for piece in stream:
+                pieces.append(piece)
+        finally:
+            await stream.aclose()
+        return {"content": ''.join(pieces), "usage": usage}
+
+    async def _with_retries(self, payload: dict, send):
+        """Como _attempts, pasando por el circuit breaker de la API
+
+        Cuentan como caída los 5xx y los errores de red o timeout tras agotar
+        los reintentos; un 4xx demuestra que la API responde.
+        """
+        try:
+            return await self.breaker.call(self._attempts, payload, send,
+                                           is_failure=_is_outage)
+        except CircuitOpenError as e:
+            raise LLMError(str(e), 503)
+
+    async def probe(self) -> bool:
+        """¿Responde la API? GET /models no gasta tokens; un 4xx también cuenta como viva"""
+        def get() -> bool:
+            req = urllib.request.Request(self.models_url, headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "User-Agent": "Mozilla/5.0 (Linux; Android 13) AppleWebKit/537.36"
+            })
+            try:
+                with urllib.request.urlopen(req, timeout=5):
+                    return True
+            except urllib.error.HTTPError as e:
+                return e.code < 500
+        try:
+            return await asyncio.to_thread(get)
+        except OSError:
+            return False
+
+    async def _attempts(self, payload: dict, send):
+        """Ejecuta send(payload) en un hilo respetando la cuota; 429/5xx se reintentan"""
+        tokens = self._estimate_tokens(payload)
+        attempt = 0
+        while True:
+            await self._wait_for_budget(tokens)
+            try:
+                self.stats['requests'] += 1
+                return await asyncio.to_thread(send, payload)
+            except urllib.error.HTTPError as e:
+                error_body = e.read().decode('utf-8', errors='replace')
+                retryable = e.code == 429 or e.code >= 500
+                if not retryable or attempt >= self.max_retries:
+                    raise LLMError(f"Error API: {e.code} - {error_body}", e.code)
+
+                headers = e.headers or {}
+                if e.code == 429:
+                    self.stats['rate_limited'] += 1
+                    self.limiter.update(headers)
+                    server_wait = max(parse_duration(headers.get('retry-after')),
+                                      parse_duration(headers.get('x-ratelimit-reset-requests'))
+                                      if headers.get('x-ratelimit-remaining-requests') == '0' else 0)
+                    delay = self._backoff(attempt, server_wait)
+                    self.limiter.penalize(delay)
+                else:
+                    delay = self._backoff(attempt)
+
+                if delay >= deadline.timeout(float('inf')):
+                    raise LLMError(f"Error API: {e.code} - sin tiempo para reintentar", e.code)
+                self.stats['retries'] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def _request(self, payload: dict, accept: str = "application/json") -> urllib.request.Request:
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "User-Agent": "Mozilla/5.0 (Linux; Android 13) AppleWebKit/537.36",
+            "Accept": accept
+        }
+        return urllib.request.Request(
+            self.url,
+            data=json.dumps(payload).encode('utf-8'),
+            headers=headers,
+            method='POST'
+        )
+
+    @tracing.traced('llm.http')
+    def _open_stream(self, payload: dict):
+        """Abre la respuesta SSE (bloqueante); el cuerpo se lee línea a línea"""
+        return urllib.request.urlopen(self._request(payload, "text/event-stream"),
+                                      timeout=deadline.timeout(30))
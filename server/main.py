@@ -1,13 +1,17 @@
 """
 Asistente Móvil - Punto de entrada principal
-Ejecutar: python main.py [--voice]
+Ejecutar: python main.py [--voice | --daemon | --batch [archivo.jsonl]]
 """
 import asyncio
 import json
 import os
 import sys
+import time
+from typing import Optional
 
+import tracing
 from core import Assistant
+from repl import TextREPL
 from wake_word import WakeWordDetector
 
 
@@ -26,62 +30,184 @@ def load_config():
 
 
 async def run_text_mode(assistant, wake_word):
-    """Modo texto (entrada por teclado)"""
+    """Modo texto (entrada por teclado, sin bloquear el event loop)"""
     print(f"\n✅ ¡Listo! Di 'Hey {wake_word}' seguido de tu comando")
+    print("   Puedes escribir varios comandos seguidos sin esperar la respuesta")
+    print("   Ctrl+C cancela el último en curso, '/cancelar N' uno concreto")
     print("   Escribe 'salir' para terminar\n")
     
-    while True:
-        try:
-            user_input = input("Tú: ").strip()
-            
-            if user_input.lower() in ['salir', 'exit', 'quit']:
-                print("👋 ¡Hasta luego!")
-                break
-            
-            if not user_input:
-                continue
-            
-            response = await assistant.process_command(user_input)
-            print(f"🤖: {response}\n")
-            
-        except KeyboardInterrupt:
-            print("\n👋 ¡Hasta luego!")
-            break
-        except Exception as e:
-            print(f"❌ Error: {e}")
+    await TextREPL(assistant).run()
 
 
-async def run_voice_mode(assistant, wake_word, voice_manager):
+async def run_voice_mode(assistant, wake_word, voice_manager, tts_cache_mb: int = 20):
     """Modo voz (entrada y salida por audio)"""
     print(f"\n✅ ¡Modo voz activo!")
     print(f"   Di 'Hey {wake_word}' seguido de tu comando")
     print("   Presiona Ctrl+C para salir\n")
     
-    voice_manager.speak(f"Hola, soy {wake_word}. ¿En qué puedo ayudarte?")
+    greeting = f"Hola, soy {wake_word}. ¿En qué puedo ayudarte?"
+    await voice_manager.start_tts(prewarm=[greeting], cache_mb=tts_cache_mb)
+    voice_manager.say(greeting)
+    
+    def partial(text: str):
+        # Barge-in temprano: con el wake word en el parcial ya es un comando, no eco
+        if assistant._strip_wake_word(text) != text:
+            voice_manager.interrupt()
+        if assistant.speculator:
+            assistant.speculator.on_partial(text)
+    
+    # Los parciales llegan desde hilos del STT: se pasan al event loop
+    loop = asyncio.get_running_loop()
+    on_partial = lambda text: loop.call_soon_threadsafe(partial, text)
+    
+    try:
+        while True:
+            try:
+                # Escuchar en un hilo: la voz sigue sonando mientras tanto
+                user_input = await asyncio.to_thread(voice_manager.listen, 10, on_partial)
+                
+                if not user_input:
+                    continue
+                
+                # El micro sigue abierto mientras suena la respuesta: si la frase se
+                # solapó con ella y no lleva wake word delante, es su eco y no un comando
+                if (voice_manager.heard_echo()
+                        and assistant._strip_wake_word(user_input) == user_input):
+                    print(f"🔇 Ignorado (eco de la respuesta): {user_input}")
+                    if assistant.speculator:
+                        assistant.speculator.settle(None)
+                    continue
+                
+                # Barge-in: un comando nuevo corta la respuesta anterior
+                voice_manager.interrupt()
+                print(f"Tú: {user_input}")
+                
+                # Procesar
+                response = await assistant.process_command(user_input, spoken=True)
+                print(f"🤖: {response}")
+                
+                # Responder con voz (sin bloquear)
+                voice_manager.say(response)
+                
+            except KeyboardInterrupt:
+                voice_manager.interrupt()
+                voice_manager.speak("¡Hasta luego!")
+                print("\n👋 ¡Hasta luego!")
+                break
+            except Exception as e:
+                print(f"❌ Error: {e}")
+    finally:
+        await voice_manager.stop_tts()
+        voice_manager.close()
+
+
+async def run_daemon_mode(assistant, config):
+    """Modo daemon (API HTTP/WebSocket local con el asistente siempre cargado)"""
+    from daemon import AssistantDaemon
+    
+    daemon = AssistantDaemon(assistant, config.get('daemon', {}))
+    print("   POST /command {\"command\": \"...\"} · GET /ws · GET /health")
+    print("   Presiona Ctrl+C para salir\n")
+    await daemon.serve_forever()
+
+
+def get_arg(flag: str, default=None):
+    """Valor que sigue a un flag en la línea de comandos (o default)"""
+    if flag in sys.argv:
+        index = sys.argv.index(flag)
+        if index + 1 < len(sys.argv) and not sys.argv[index + 1].startswith('--'):
+            return sys.argv[index + 1]
+    return default
+
+
+def parse_batch_line(line: str) -> Optional[dict]:
+    """Una línea JSONL: {"command": "...", "id": ..., "expected": ...}, un string JSON o texto plano"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return {"command": line}
+    if isinstance(entry, str):
+        return {"command": entry}
+    if isinstance(entry, dict) and 'command' in entry:
+        return entry
+    return None
+
+
+def intent_signature(intent) -> list:
+    """Pares mcp.action de un intent (plan o acción esperada) para medir precisión del router"""
+    if not intent:
+        return []
+    if isinstance(intent, dict):
+        intent = intent.get('actions', [intent])
+    return sorted(f"{a.get('mcp', '')}.{a.get('action', '')}" for a in intent if isinstance(a, dict))
+
+
+async def run_batch_mode(assistant, source, output, concurrency: int):
+    """Modo batch: procesa comandos JSONL con concurrencia acotada y escribe resultados JSONL"""
+    semaphore = asyncio.Semaphore(concurrency)
+    totals = []
+    stats = {'processed': 0, 'skipped': 0, 'evaluated': 0, 'matched': 0}
+    
+    async def process(line_number: int, entry: dict):
+        async with semaphore:
+            details = {}
+            response = await assistant.process_command(str(entry['command']), details=details)
+        
+        record = {
+            "line": line_number,
+            "id": entry.get('id', line_number),
+            "input": entry['command'],
+            "command": details.get('command'),
+            "response": response,
+            "intent": details.get('intent'),
+            "outcome": details.get('outcome'),
+            "timings": {k: round(v, 2) for k, v in details['timings'].items()}
+        }
+        if 'error' in details:
+            record['error'] = details['error']
+        if 'expected' in entry:
+            record['match'] = intent_signature(entry['expected']) == intent_signature(details.get('intent'))
+            stats['evaluated'] += 1
+            stats['matched'] += record['match']
+        
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+        totals.append(details['timings']['total'])
+        stats['processed'] += 1
     
+    start = time.perf_counter()
+    pending = set()
+    line_number = 0
     while True:
-        try:
-            # Escuchar
-            user_input = voice_manager.listen(timeout=10)
-            
-            if not user_input:
-                continue
-            
-            print(f"Tú: {user_input}")
-            
-            # Procesar
-            response = await assistant.process_command(user_input)
-            print(f"🤖: {response}")
-            
-            # Responder con voz
-            voice_manager.speak(response)
-            
-        except KeyboardInterrupt:
-            voice_manager.speak("¡Hasta luego!")
-            print("\n👋 ¡Hasta luego!")
+        # Leer en un hilo: con una tubería lenta los comandos en vuelo siguen avanzando
+        line = await asyncio.to_thread(source.readline)
+        if not line:
             break
-        except Exception as e:
-            print(f"❌ Error: {e}")
+        line_number += 1
+        entry = parse_batch_line(line)
+        if entry is None:
+            stats['skipped'] += 1
+            continue
+        # No leer más de lo que se puede procesar: memoria constante con logs grandes
+        while len(pending) >= concurrency * 2:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        pending.add(asyncio.create_task(process(line_number, entry)))
+    if pending:
+        await asyncio.wait(pending)
+    elapsed = time.perf_counter() - start
+    
+    totals.sort()
+    summary = dict(stats, elapsed_s=round(elapsed, 3),
+                   throughput=round(stats['processed'] / elapsed, 2) if elapsed else 0)
+    if totals:
+        summary['p50_ms'] = round(totals[len(totals) // 2], 2)
+        summary['p95_ms'] = round(totals[min(len(totals) - 1, int(len(totals) * 0.95))], 2)
+    if stats['evaluated']:
+        summary['accuracy'] = round(stats['matched'] / stats['evaluated'], 4)
+    print(f"📊 Batch: {json.dumps(summary)}", file=sys.stderr)
 
 
 async def main():
@@ -91,6 +217,13 @@ async def main():
     
     # Detectar modo
     voice_mode = '--voice' in sys.argv or '-v' in sys.argv
+    daemon_mode = '--daemon' in sys.argv
+    batch_mode = '--batch' in sys.argv
+    
+    # En batch, stdout queda reservado para los resultados JSONL
+    results_out = sys.stdout
+    if batch_mode:
+        sys.stdout = sys.stderr
     
     # Cargar configuración
     config = load_config()
@@ -100,7 +233,7 @@ async def main():
     wake_word = config['assistant'].get('wake_word', 'asistente')
     print(f"🎤 Wake word: 'Hey {wake_word}'")
     print(f"🌐 Idioma: {config['assistant'].get('language', 'es')}")
-    print(f"🔊 Modo: {'Voz' if voice_mode else 'Texto'}")
+    print(f"🔊 Modo: {'Batch' if batch_mode else 'Daemon' if daemon_mode else 'Voz' if voice_mode else 'Texto'}")
     print("=" * 50)
     
     # Verificar API key
@@ -109,21 +242,57 @@ async def main():
         print("❌ Configura tu API key en configs/config.json")
         return
     
+    # Instrumentación (kill -USR1 <pid> vuelca los histogramas)
+    metrics_server = await tracing.configure(config.get('tracing', {}))
+    
     # Inicializar asistente
     assistant = Assistant(config)
     
-    if voice_mode:
+    if batch_mode:
+        source_path = get_arg('--batch', '-')
+        output_path = get_arg('--output', '-')
+        concurrency = max(1, int(get_arg('--concurrency', 4)))
+        
+        source = sys.stdin if source_path == '-' else open(source_path, 'r', encoding='utf-8')
+        output = results_out if output_path == '-' else open(output_path, 'w', encoding='utf-8')
+        try:
+            await run_batch_mode(assistant, source, output, concurrency)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if output is not results_out:
+                output.close()
+    elif daemon_mode:
+        await run_daemon_mode(assistant, config)
+    elif voice_mode:
         # Importar voice manager
         try:
             from voice import VoiceManager, VoiceManagerTermux
             
             # Usar versión Termux si está disponible
             if os.path.exists('/data/data/com.termux'):
-                voice_manager = VoiceManagerTermux(config['assistant'].get('language', 'es'))
+                voice_manager = VoiceManagerTermux(
+                    config['assistant'].get('language', 'es'),
+                    api_base=config['llm'].get('base_url'),
+                    continuous_capture=config['assistant'].get('continuous_capture', False),
+                    capture_seconds=config['assistant'].get('capture_seconds', 30),
+                    preroll_seconds=config['assistant'].get('preroll_seconds', 0.5),
+                    phrase_time_limit=config['assistant'].get('phrase_time_limit', 10),
+                    stt_parallel=config['assistant'].get('stt_parallel', 3)
+                )
             else:
-                voice_manager = VoiceManager(config['assistant'].get('language', 'es'))
+                voice_manager = VoiceManager(
+                    config['assistant'].get('language', 'es'),
+                    persistent_mic=config['assistant'].get('persistent_mic', True),
+                    stt_backend=config['assistant'].get('stt_backend', 'google'),
+                    api_base=config['llm'].get('base_url'),
+                    phrase_time_limit=config['assistant'].get('phrase_time_limit', 10),
+                    stt_parallel=config['assistant'].get('stt_parallel', 3),
+                    preroll_seconds=config['assistant'].get('preroll_seconds', 0.5)
+                )
             
-            await run_voice_mode(assistant, wake_word, voice_manager)
+            await run_voice_mode(assistant, wake_word, voice_manager,
+                                 config['assistant'].get('tts_cache_mb', 20))
         except ImportError as e:
             print(f"❌ Error importando módulo de voz: {e}")
             print("   Instala: pip install SpeechRecognition pyttsx3 pyaudio")
@@ -134,4 +303,7 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n👋 ¡Hasta luego!")
@@ -0,0 +1,249 @@
+"""
+Executor - Ejecución de procesos compartida por todos los MCPs
+Solo exec con lista de argumentos (nunca shell), timeout por llamada recortado
+al deadline del comando, tope global de procesos simultáneos, límite de salida
+capturada y métricas de latencia de arranque por binario. Ninguna llamada
+bloquea el event loop.
+
+Uso:
+    from mcps import executor
+    result = await executor.run(['termux-open-url', url], timeout=10)
+    if not result.ok: ...
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Optional, Sequence
+
+import deadline
+import tracing
+
+
+class ProcessResult:
+    """Salida de un proceso terminado"""
+
+    def __init__(self, argv: list, returncode: int, stdout: bytes, stderr: bytes,
+                 truncated: bool, duration_ms: float):
+        self.argv = argv
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.truncated = truncated
+        self.duration_ms = duration_ms
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+    @property
+    def text(self) -> str:
+        return self.stdout.decode('utf-8', errors='replace')
+
+    @property
+    def error_text(self) -> str:
+        return self.stderr.decode('utf-8', errors='replace').strip()
+
+
+class BinaryStats:
+    """Contadores y latencias de un binario"""
+
+    def __init__(self):
+        self.spawn = tracing.Histogram()
+        self.total = tracing.Histogram()
+        self.failed = 0
+        self.timeouts = 0
+        self.spawn_errors = 0
+        self.truncated = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.total.count,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "spawn_errors": self.spawn_errors,
+            "truncated": self.truncated,
+            "spawn_p50_ms": round(self.spawn.percentile(50), 3),
+            "spawn_p95_ms": round(self.spawn.percentile(95), 3),
+            "spawn_max_ms": round(self.spawn.max_ms, 3),
+            "total_p50_ms": round(self.total.percentile(50), 3),
+            "total_p95_ms": round(self.total.percentile(95), 3),
+        }
+
+
+async def _read_limited(stream, limit: int) -> tuple:
+    """Lee hasta EOF guardando solo limit bytes (el resto se descarta para no bloquear la tubería)"""
+    chunks, kept, truncated = [], 0, False
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return b''.join(chunks), truncated
+        piece = chunk[:max(0, limit - kept)]
+        if piece:
+            chunks.append(piece)
+            kept += len(piece)
+        if len(piece) < len(chunk):
+            truncated = True
+
+
+async def _feed(process, data: Optional[bytes]):
+    if data is None:
+        return
+    try:
+        process.stdin.write(data)
+        await process.stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    finally:
+        process.stdin.close()
+
+
+class ProcessExecutor:
+    """Lanza procesos con exec, acotados en número, tiempo y salida"""
+
+    def __init__(self, max_concurrent: int = 4, max_output_bytes: int = 1024 * 1024,
+                 default_timeout: float = 30):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_output_bytes = max_output_bytes
+        self.default_timeout = default_timeout
+        self.running = 0
+        self.waiting = 0
+        self._binaries = {}
+        self._lock = threading.Lock()
+        # Un semáforo por event loop (benchmark y soak crean varios)
+        self._semaphores = {}
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            for old in [l for l in self._semaphores if l.is_closed()]:
+                del self._semaphores[old]
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrent)
+        return semaphore
+
+    def _stats_for(self, binary: str) -> BinaryStats:
+        with self._lock:
+            stats = self._binaries.get(binary)
+            if stats is None:
+                if len(self._binaries) >= tracing.MAX_HISTOGRAMS:
+                    binary = 'other'
+                    stats = self._binaries.get(binary)
+                if stats is None:
+                    stats = self._binaries[binary] = BinaryStats()
+            return stats
+
+    async def run(self, argv: Sequence, input: bytes = None, timeout: float = None,
+                  max_output_bytes: int = None) -> ProcessResult:
+        """Ejecuta argv y espera a que termine
+
+        El timeout (y la espera por un hueco libre) se recorta al deadline del
+        comando; si vence o se cancela, se mata el grupo del proceso y se lanza
+        asyncio.TimeoutError / CancelledError. Si el binario no existe, OSError.
+        """
+        if isinstance(argv, (str, bytes)):
+            raise TypeError("executor.run solo acepta una lista de argumentos (sin shell)")
+        argv = [str(arg) for arg in argv]
+        if not argv:
+            raise ValueError("executor.run necesita al menos el binario")
+        binary = os.path.basename(argv[0])
+        limit = self.max_output_bytes if max_output_bytes is None else max_output_bytes
+        cap = self.default_timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(self._run(argv, binary, input, limit),
+                                          timeout=deadline.timeout(cap))
+        except asyncio.TimeoutError:
+            self._stats_for(binary).timeouts += 1
+            raise
+
+    async def _run(self, argv: list, binary: str, input: Optional[bytes], limit: int) -> ProcessResult:
+        stats = self._stats_for(binary)
+        self.waiting += 1
+        try:
+            await self._semaphore().acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        process = None
+        started = time.perf_counter()
+        try:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *argv,
+                    stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    start_new_session=True
+                )
+            except OSError:
+                stats.spawn_errors += 1
+                raise
+            spawn_ms = (time.perf_counter() - started) * 1000
+            stats.spawn.record(spawn_ms)
+            if tracing.ENABLED:
+                tracing.record(f"proc.{binary}.spawn", spawn_ms)
+
+            (stdout, out_cut), (stderr, err_cut), _ = await asyncio.gather(
+                _read_limited(process.stdout, limit),
+                _read_limited(process.stderr, limit),
+                _feed(process, input)
+            )
+            await process.wait()
+        except asyncio.CancelledError:
+            if process is not None:
+                deadline.kill_process(process)
+                try:
+                    # Recoger el proceso para no dejar zombis
+                    await asyncio.wait_for(process.wait(), timeout=1)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    pass
+            raise
+        finally:
+            self.running -= 1
+            self._semaphore().release()
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        failed = process.returncode != 0
+        stats.total.record(duration_ms, failed)
+        stats.failed += failed
+        stats.truncated += out_cut or err_cut
+        if tracing.ENABLED:
+            tracing.record(f"proc.{binary}", duration_ms, failed)
+        return ProcessResult(argv, process.returncode, stdout, stderr, out_cut or err_cut, duration_ms)
+
+    def stats(self) -> dict:
+        with self._lock:
+            binaries = {name: stats.to_dict() for name, stats in self._binaries.items()}
+        return {
+            "max_concurrent": self.max_concurrent,
+            "running": self.running,
+            "waiting": self.waiting,
+            "binaries": binaries,
+        }
+
+
+_default = ProcessExecutor()
+
+
+def configure(config: dict):
+    """Ajusta el executor compartido con la sección "processes" de config.json"""
+    global _default
+    _default = ProcessExecutor(
+        max_concurrent=config.get('max_concurrent', 4),
+        max_output_bytes=int(config.get('max_output_kb', 1024) * 1024),
+        default_timeout=config.get('default_timeout', 30)
+    )
+
+
+def get() -> ProcessExecutor:
+    return _default
+
+
+async def run(argv: Sequence, input: bytes = None, timeout: float = None,
+              max_output_bytes: int = None) -> ProcessResult:
+    """executor.run del executor compartido"""
+    return await _default.run(argv, input, timeout, max_output_bytes)
+
+
+def stats() -> dict:
+    return _default.stats()
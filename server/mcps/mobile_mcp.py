@@ -2,11 +2,93 @@
 Mobile MCP - Control del dispositivo móvil Android
 Usa Termux:API en Termux, o ADB en PC
 """
+import difflib
 import subprocess
-import asyncio
 import os
 from typing import Optional
 
+import circuit_breaker
+from text_utils import normalize
+from mcps import executor
+
+
+# Mapeo a deep links y paquetes
+# 'search_url': URL/URI para búsquedas (usa {query})
+# 'pkg': Paquete de Android
+APPS = {
+    'whatsapp': {
+        'url': 'https://wa.me', 
+        'pkg': 'com.whatsapp',
+        'search_url': 'https://wa.me/?text={query}' 
+    },
+    'telegram': {'url': 'https://t.me', 'pkg': 'org.telegram.messenger'},
+    'instagram': {'url': 'https://instagram.com', 'pkg': 'com.instagram.android'},
+    'spotify': {
+        'url': 'spotify://', 
+        'pkg': 'com.spotify.music',
+        'search_url': 'spotify:search:{query}' 
+    },
+    'youtube': {
+        'url': 'https://youtube.com', 
+        'pkg': 'com.google.android.youtube',
+        'search_url': 'https://www.youtube.com/results?search_query={query}'
+    },
+    'gmail': {'url': 'https://mail.google.com', 'pkg': 'com.google.android.gm'},
+    'chrome': {
+        'url': 'https://google.com', 
+        'pkg': 'com.android.chrome', 
+        'search_url': 'https://www.google.com/search?q={query}'
+    },
+    'twitter': {
+        'url': 'https://twitter.com', 
+        'pkg': 'com.twitter.android',
+        'search_url': 'https://twitter.com/search?q={query}'
+    },
+    'x': {
+        'url': 'https://x.com', 
+        'pkg': 'com.twitter.android',
+        'search_url': 'https://x.com/search?q={query}'
+    },
+    'tiktok': {
+        'url': 'https://tiktok.com', 
+        'pkg': 'com.zhiliaoapp.musically',
+        'search_url': 'https://www.tiktok.com/search?q={query}'
+    },
+    'facebook': {'url': 'https://facebook.com', 'pkg': 'com.facebook.katana'},
+    'maps': {
+        'url': 'https://maps.google.com', 
+        'pkg': 'com.google.android.apps.maps',
+        'search_url': 'geo:0,0?q={query}'
+    },
+    'netflix': {
+        'url': 'https://netflix.com', 
+        'pkg': 'com.netflix.mediaclient',
+        'search_url': 'http://www.netflix.com/search/{query}'
+    },
+}
+
+
+# Nombres dichos (ya normalizados) que se recuerdan resueltos a su app
+MAX_CACHED_NAMES = 128
+
+
+def _failed(result) -> bool:
+    """El proceso terminó con código distinto de 0"""
+    return not result.ok
+
+
+def _failure(what: str, error: str, returncode: int) -> str:
+    """Mensaje para un comando de Termux:API que terminó mal"""
+    return f"❌ No se pudo {what}: {error or f'código de salida {returncode}'}"
+
+
+def _adb_unavailable(result) -> bool:
+    """adb terminó, pero porque no hay dispositivo (no por la app o el comando)"""
+    if result.ok:
+        return False
+    error = result.error_text.lower()
+    return any(s in error for s in ('no devices', 'offline', 'unauthorized', 'device not found'))
+
 
 class MobileMCP:
     """MCP para control del dispositivo móvil Android"""
@@ -15,6 +97,7 @@ class MobileMCP:
     
     def __init__(self):
         self.is_termux = os.path.exists('/data/data/com.termux')
+        self._apps = {}
         
         if self.is_termux:
             print("📱 Mobile MCP: Modo Termux")
@@ -92,77 +175,64 @@ class MobileMCP:
         
         return f"❌ Acción '{action}' no reconocida"
     
-    async def _run_termux_cmd(self, *args) -> tuple:
-        """Ejecuta un comando de Termux:API"""
-        process = await asyncio.create_subprocess_exec(
-            *args,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-        return stdout.decode(), stderr.decode(), process.returncode
+    async def _run_termux_cmd(self, *args, input: bytes = None) -> tuple:
+        """Ejecuta un comando de Termux:API, de adb o del sistema (monkey, am)
+        
+        adb y los termux-* pasan por el circuit breaker de su backend: si llevan
+        varios fallos seguidos (salir con código distinto de 0 también cuenta),
+        se falla al instante con CircuitOpenError. El resto no cuenta para
+        ninguno (que falle monkey no dice nada de Termux:API).
+        """
+        if args[0] == 'adb':
+            breaker = circuit_breaker.get('adb', probe=self._probe_adb)
+            result = await breaker.call(executor.run, args, input=input,
+                                        failed_result=_adb_unavailable)
+        elif args[0].startswith('termux-'):
+            breaker = circuit_breaker.get('termux', probe=self._probe_termux)
+            result = await breaker.call(executor.run, args, input=input,
+                                        failed_result=_failed)
+        else:
+            result = await executor.run(args, input=input)
+        return result.text, result.error_text, result.returncode
+    
+    async def _probe_termux(self) -> bool:
+        """¿Responde Termux:API? (comando sin efectos visibles)"""
+        result = await executor.run(['termux-battery-status'], timeout=5)
+        return result.ok
+    
+    async def _probe_adb(self) -> bool:
+        """¿Hay un dispositivo conectado?"""
+        result = await executor.run(['adb', 'get-state'], timeout=5)
+        return result.ok and 'device' in result.text
+    
+    def _resolve_app(self, app_name: str) -> Optional[dict]:
+        """Entrada de APPS para el nombre dicho ('Google Maps', 'whats app'...)
+        
+        Se cachean solo los aciertos, y como mucho MAX_CACHED_NAMES nombres.
+        """
+        key = normalize(app_name)
+        if key in self._apps:
+            return self._apps[key]
+        compact = key.replace(' ', '')
+        match = next((name for name in APPS if name in (key, compact)), None)
+        if match is None:
+            words = [w for w in key.split() if w in APPS]
+            close = difflib.get_close_matches(compact, APPS, n=1, cutoff=0.8)
+            match = words[-1] if words else (close[0] if close else None)
+        if match is None:
+            return None
+        if len(self._apps) >= MAX_CACHED_NAMES:
+            # Fuera el nombre más antiguo
+            del self._apps[next(iter(self._apps))]
+        self._apps[key] = APPS[match]
+        return self._apps[key]
     
     async def _open_app(self, params: dict) -> str:
         """Abre una aplicación"""
         app_name = params.get('app_name', '').lower()
         query = params.get('query', '')
         
-        # Mapeo a deep links y paquetes
-        # 'search_url': URL/URI para búsquedas (usa {query})
-        # 'pkg': Paquete de Android
-        app_data = {
-            'whatsapp': {
-                'url': 'https://wa.me', 
-                'pkg': 'com.whatsapp',
-                'search_url': 'https://wa.me/?text={query}' 
-            },
-            'telegram': {'url': 'https://t.me', 'pkg': 'org.telegram.messenger'},
-            'instagram': {'url': 'https://instagram.com', 'pkg': 'com.instagram.android'},
-            'spotify': {
-                'url': 'spotify://', 
-                'pkg': 'com.spotify.music',
-                'search_url': 'spotify:search:{query}' 
-            },
-            'youtube': {
-                'url': 'https://youtube.com', 
-                'pkg': 'com.google.android.youtube',
-                'search_url': 'https://www.youtube.com/results?search_query={query}'
-            },
-            'gmail': {'url': 'https://mail.google.com', 'pkg': 'com.google.android.gm'},
-            'chrome': {
-                'url': 'https://google.com', 
-                'pkg': 'com.android.chrome', 
-                'search_url': 'https://www.google.com/search?q={query}'
-            },
-            'twitter': {
-                'url': 'https://twitter.com', 
-                'pkg': 'com.twitter.android',
-                'search_url': 'https://twitter.com/search?q={query}'
-            },
-            'x': {
-                'url': 'https://x.com', 
-                'pkg': 'com.twitter.android',
-                'search_url': 'https://x.com/search?q={query}'
-            },
-            'tiktok': {
-                'url': 'https://tiktok.com', 
-                'pkg': 'com.zhiliaoapp.musically',
-                'search_url': 'https://www.tiktok.com/search?q={query}'
-            },
-            'facebook': {'url': 'https://facebook.com', 'pkg': 'com.facebook.katana'},
-            'maps': {
-                'url': 'https://maps.google.com', 
-                'pkg': 'com.google.android.apps.maps',
-                'search_url': 'geo:0,0?q={query}'
-            },
-            'netflix': {
-                'url': 'https://netflix.com', 
-                'pkg': 'com.netflix.mediaclient',
-                'search_url': 'http://www.netflix.com/search/{query}'
-            },
-        }
-        
-        app_info = app_data.get(app_name)
+        app_info = self._resolve_app(app_name)
         
         if self.is_termux:
             if not app_info:
@@ -173,36 +243,35 @@ class MobileMCP:
             # Si hay query y la app soporta búsqueda, usar el deep link de búsqueda
             if query and app_info.get('search_url'):
                 search_url = app_info['search_url'].format(query=query)
-                await self._run_termux_cmd('termux-open-url', search_url)
+                _, error, returncode = await self._run_termux_cmd('termux-open-url', search_url)
+                if returncode != 0:
+                    return _failure(f"buscar en {app_name}", error, returncode)
                 return f"✅ Buscando '{query}' en {app_name}"
 
             # Si no, flujo normal de abrir app
             
             # Método 1: Usar monkey (más confiable)
-            process = await asyncio.create_subprocess_shell(
-                f'monkey -p {pkg} -c android.intent.category.LAUNCHER 1 2>/dev/null',
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+            _, _, returncode = await self._run_termux_cmd(
+                'monkey', '-p', pkg, '-c', 'android.intent.category.LAUNCHER', '1'
             )
-            await process.communicate()
             
-            if process.returncode == 0:
+            if returncode == 0:
                 return f"✅ Abriendo {app_name}"
             
             # Método 2: am start directo
-            process = await asyncio.create_subprocess_shell(
-                f'am start -a android.intent.action.MAIN -c android.intent.category.LAUNCHER -p {pkg} 2>/dev/null',
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+            _, _, returncode = await self._run_termux_cmd(
+                'am', 'start', '-a', 'android.intent.action.MAIN',
+                '-c', 'android.intent.category.LAUNCHER', '-p', pkg
             )
-            await process.communicate()
             
-            if process.returncode == 0:
+            if returncode == 0:
                 return f"✅ Abriendo {app_name}"
             
             # Método 3: URL como último recurso
             if app_info.get('url'):
-                await self._run_termux_cmd('termux-open-url', app_info['url'])
+                _, error, returncode = await self._run_termux_cmd('termux-open-url', app_info['url'])
+                if returncode != 0:
+                    return _failure(f"abrir {app_name}", error, returncode)
                 return f"✅ Abriendo {app_name} (via web)"
             
             return f"❌ No se pudo abrir {app_name}"
@@ -213,13 +282,10 @@ class MobileMCP:
             
             # ADB también podría soportar OPEN URL con intents, por ahora simple launch
             pkg = app_info['pkg'] if app_info else app_name
-            process = await asyncio.create_subprocess_exec(
+            await self._run_termux_cmd(
                 'adb', 'shell', 'monkey', '-p', pkg, '-c',
-                'android.intent.category.LAUNCHER', '1',
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                'android.intent.category.LAUNCHER', '1'
             )
-            await process.communicate()
             return f"✅ Abriendo {app_name}"
 
 
@@ -232,11 +298,13 @@ class MobileMCP:
         message = params.get('message', '')
         
         if self.is_termux:
-            await self._run_termux_cmd(
+            _, error, returncode = await self._run_termux_cmd(
                 'termux-notification',
                 '-t', title,
                 '-c', message
             )
+            if returncode != 0:
+                return _failure("enviar la notificación", error, returncode)
             return f"🔔 Notificación enviada: {title}"
         else:
             return "❌ Notificaciones solo disponibles en Termux"
@@ -246,9 +314,11 @@ class MobileMCP:
         duration = params.get('duration', 500)
         
         if self.is_termux:
-            await self._run_termux_cmd(
+            _, error, returncode = await self._run_termux_cmd(
                 'termux-vibrate', '-d', str(duration)
             )
+            if returncode != 0:
+                return _failure("vibrar", error, returncode)
             return f"📳 Vibrando por {duration}ms"
         else:
             return "❌ Vibración solo disponible en Termux"
@@ -258,9 +328,11 @@ class MobileMCP:
         message = params.get('message', '')
         
         if self.is_termux:
-            await self._run_termux_cmd(
+            _, error, returncode = await self._run_termux_cmd(
                 'termux-toast', message
             )
+            if returncode != 0:
+                return _failure("mostrar el toast", error, returncode)
             return f"💬 Toast mostrado"
         else:
             return "❌ Toast solo disponible en Termux"
@@ -270,11 +342,10 @@ class MobileMCP:
         text = params.get('text', '')
         
         if self.is_termux:
-            process = await asyncio.create_subprocess_exec(
-                'termux-clipboard-set',
-                stdin=asyncio.subprocess.PIPE
-            )
-            await process.communicate(input=text.encode())
+            _, error, returncode = await self._run_termux_cmd('termux-clipboard-set',
+                                                              input=text.encode())
+            if returncode != 0:
+                return _failure("copiar al portapapeles", error, returncode)
             return f"📋 Copiado al portapapeles"
         else:
             return "❌ Portapapeles solo disponible en Termux"
@@ -284,9 +355,11 @@ class MobileMCP:
         text = params.get('text', '')
         
         if self.is_termux:
-            await self._run_termux_cmd(
+            _, error, returncode = await self._run_termux_cmd(
                 'termux-tts-speak', text
             )
+            if returncode != 0:
+                return _failure("hablar", error, returncode)
             return f"🔊 Hablando: {text}"
         else:
             return "❌ TTS solo disponible en Termux"
@@ -3,10 +3,96 @@ Spotify MCP - Control de Spotify con API oficial
 Requiere: Spotify Premium + Credenciales de Developer
 """
 import asyncio
+import difflib
+import time
+import unicodedata
 import webbrowser
 from typing import Optional
 import os
 
+import circuit_breaker
+from circuit_breaker import CircuitOpenError
+
+
+# Tipos que se buscan a la vez cuando no se sabe qué pide el usuario
+SEARCH_TYPES = ['track', 'artist', 'album', 'playlist']
+
+# Preferencia entre tipos con el mismo parecido ("pon Bad Bunny" → el artista)
+TYPE_PRIOR = {'artist': 0.08, 'track': 0.05, 'playlist': 0.02, 'album': 0.0}
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    return ' '.join(''.join(c for c in text if not unicodedata.combining(c)).split())
+
+
+def rank_results(query: str, results: dict, types: list = None) -> list:
+    """Une los resultados de varios tipos en una lista ordenada por relevancia
+    
+    Puntúa el parecido del nombre con la consulta (coincidencia exacta arriba),
+    la popularidad cuando Spotify la da y una pequeña preferencia por tipo.
+    """
+    wanted = _normalize(query)
+    ranked = []
+    for kind in types or SEARCH_TYPES:
+        for position, item in enumerate((results.get(f'{kind}s') or {}).get('items') or []):
+            if not item:
+                continue  # Spotify devuelve None en playlists borradas
+            name = _normalize(item.get('name', ''))
+            subtitle = ''
+            if kind in ('track', 'album') and item.get('artists'):
+                subtitle = item['artists'][0]['name']
+            elif kind == 'playlist':
+                subtitle = (item.get('owner') or {}).get('display_name', '')
+            
+            # "despacito luis fonsi" también debe casar con nombre + artista
+            full = f"{name} {_normalize(subtitle)}".strip()
+            similarity = max(difflib.SequenceMatcher(None, wanted, name).ratio(),
+                             difflib.SequenceMatcher(None, wanted, full).ratio())
+            score = similarity + (0.3 if wanted in (name, full) else 0.0)
+            score += 0.15 * (item.get('popularity') or 0) / 100
+            score += TYPE_PRIOR.get(kind, 0.0) - 0.01 * position
+            ranked.append({'type': kind, 'name': item.get('name', ''), 'subtitle': subtitle,
+                           'uri': item['uri'], 'score': round(score, 4)})
+    ranked.sort(key=lambda r: r['score'], reverse=True)
+    return ranked
+
+
+class URICache:
+    """Consulta → resultado reproducible, con caducidad y tamaño acotado"""
+    
+    def __init__(self, ttl: float = 3600, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self.stats = {'hits': 0, 'misses': 0}
+    
+    def get(self, query: str) -> Optional[dict]:
+        key = _normalize(query)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return entry[1]
+    
+    def put(self, query: str, result: dict):
+        if len(self._entries) >= self.max_entries:
+            # Fuera la que caduca antes
+            oldest = min(self._entries, key=lambda k: self._entries[k][0])
+            del self._entries[oldest]
+        self._entries[_normalize(query)] = (time.monotonic() + self.ttl, result)
+
+
+def _is_outage(error: Exception) -> bool:
+    """Caída del servicio (5xx, red, timeout), no un error de uso (sin dispositivo, 404...)"""
+    status = getattr(error, 'http_status', None)
+    if status is not None:
+        return status >= 500
+    # Las excepciones de requests heredan de IOError
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
 
 class SpotifyMCP:
     """MCP para control de Spotify usando la API oficial"""
@@ -17,6 +103,10 @@ class SpotifyMCP:
         self.config = config or {}
         self.sp = None
         self.authenticated = False
+        self.token_refresher = None
+        self.uri_cache = URICache(self.config.get('search_cache_ttl', 3600))
+        self._resolving = {}
+        self.breaker = circuit_breaker.get('spotify', probe=self._probe)
         self._init_spotify()
     
     def _init_spotify(self):
@@ -24,6 +114,7 @@ class SpotifyMCP:
         try:
             import spotipy
             from spotipy.oauth2 import SpotifyOAuth
+            from mcps.spotify_token import SpotifyTokenStore, TokenRefresher
             
             client_id = self.config.get('client_id', os.getenv('SPOTIFY_CLIENT_ID'))
             client_secret = self.config.get('client_secret', os.getenv('SPOTIFY_CLIENT_SECRET'))
@@ -43,16 +134,22 @@ class SpotifyMCP:
                 "user-library-read"
             ])
             
+            # Token en memoria (ruta fija, escritura atómica) en vez de releer .spotify_cache
+            token_store = SpotifyTokenStore(self.config.get('token_cache'))
             auth_manager = SpotifyOAuth(
                 client_id=client_id,
                 client_secret=client_secret,
                 redirect_uri=redirect_uri,
                 scope=scope,
-                cache_path=".spotify_cache",
+                cache_handler=token_store,
                 open_browser=False  # Crucial para Termux
             )
             
             self.sp = spotipy.Spotify(auth_manager=auth_manager)
+            # Se renueva antes de caducar: ningún comando paga el refresco
+            self.token_refresher = TokenRefresher(auth_manager, token_store,
+                                                  margin=self.config.get('token_refresh_margin', 300))
+            self.token_refresher.start()
             self.authenticated = True
             print("✅ Spotify: Conectado")
             
@@ -66,7 +163,7 @@ class SpotifyMCP:
         return [
             {
                 "name": "play",
-                "description": "Reproduce música (actual o busca una canción)",
+                "description": "Reproduce música (actual o busca canción, artista, álbum o playlist)",
                 "params": {"query": "string (opcional)"}
             },
             {
@@ -86,8 +183,8 @@ class SpotifyMCP:
             },
             {
                 "name": "search",
-                "description": "Busca canciones, artistas o álbumes",
-                "params": {"query": "string", "type": "track|artist|album"}
+                "description": "Busca canciones, artistas, álbumes o playlists (todo a la vez si no se indica tipo)",
+                "params": {"query": "string", "type": "track|artist|album|playlist|all (opcional)"}
             },
             {
                 "name": "current",
@@ -132,79 +229,119 @@ class SpotifyMCP:
             return f"❌ Acción '{action}' no reconocida"
         
         try:
-            result = await actions[action](params)
+            result = await self.breaker.call(actions[action], params, is_failure=_is_outage)
             return result
+        except CircuitOpenError as e:
+            return f"❌ {e}"
         except Exception as e:
             return f"❌ Error en Spotify: {str(e)}"
     
+    async def _probe(self) -> bool:
+        """¿Responde la API? (cualquier respuesta que no sea 5xx vale)"""
+        try:
+            await asyncio.to_thread(self.sp.current_user)
+        except Exception as e:
+            return not _is_outage(e)
+        return True
+    
     async def _play(self, params: dict) -> str:
         """Reproduce música"""
         query = params.get('query', '')
         
         if query:
-            # Buscar y reproducir
-            results = self.sp.search(q=query, type='track', limit=1)
-            tracks = results.get('tracks', {}).get('items', [])
-            
-            if not tracks:
+            best = await self._resolve(query)
+            if best is None:
                 return f"❌ No encontré '{query}'"
             
-            track = tracks[0]
-            track_uri = track['uri']
-            track_name = track['name']
-            artist = track['artists'][0]['name']
-            
-            self.sp.start_playback(uris=[track_uri])
-            return f"🎵 Reproduciendo: {track_name} - {artist}"
+            if best['type'] == 'track':
+                await asyncio.to_thread(self.sp.start_playback, uris=[best['uri']])
+            else:
+                await asyncio.to_thread(self.sp.start_playback, context_uri=best['uri'])
+            label = f"{best['name']} - {best['subtitle']}" if best['subtitle'] else best['name']
+            return f"🎵 Reproduciendo: {label}"
         else:
             # Continuar reproducción
-            self.sp.start_playback()
+            await asyncio.to_thread(self.sp.start_playback)
             return "▶️ Reproducción reanudada"
     
+    async def _resolve(self, query: str) -> Optional[dict]:
+        """Mejor resultado reproducible para query (caché; búsquedas en vuelo compartidas)"""
+        best = self.uri_cache.get(query)
+        if best is not None:
+            return best
+        key = _normalize(query)
+        task = self._resolving.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._search_best(query))
+            self._resolving[key] = task
+            task.add_done_callback(lambda _: self._resolving.pop(key, None))
+        return await asyncio.shield(task)
+    
+    async def _search_best(self, query: str) -> Optional[dict]:
+        # Una sola petición para todos los tipos: el mejor resultado gana
+        results = await asyncio.to_thread(self.sp.search, q=query,
+                                          type=','.join(SEARCH_TYPES), limit=5)
+        ranked = rank_results(query, results)
+        if not ranked:
+            return None
+        self.uri_cache.put(query, ranked[0])
+        return ranked[0]
+    
+    async def prewarm(self, action: str, params: dict):
+        """Especulativo: deja resuelta la búsqueda de un play (sin reproducir nada)"""
+        query = params.get('query')
+        if action != 'play' or not query or not self.authenticated:
+            return
+        if self.breaker.state != circuit_breaker.CLOSED:
+            return
+        await self._resolve(query)
+    
     async def _pause(self, params: dict) -> str:
         """Pausa la reproducción"""
-        self.sp.pause_playback()
+        await asyncio.to_thread(self.sp.pause_playback)
         return "⏸️ Pausado"
     
     async def _next(self, params: dict) -> str:
         """Siguiente canción"""
-        self.sp.next_track()
+        await asyncio.to_thread(self.sp.next_track)
         await asyncio.sleep(0.5)  # Esperar a que cambie
         return await self._current({})
     
     async def _previous(self, params: dict) -> str:
         """Canción anterior"""
-        self.sp.previous_track()
+        await asyncio.to_thread(self.sp.previous_track)
         await asyncio.sleep(0.5)
         return await self._current({})
     
     async def _search(self, params: dict) -> str:
         """Busca contenido"""
         query = params.get('query', '')
-        search_type = params.get('type', 'track')
+        search_type = params.get('type') or 'all'
         
         if not query:
             return "❌ Especifica qué buscar"
         
-        results = self.sp.search(q=query, type=search_type, limit=5)
-        items = results.get(f'{search_type}s', {}).get('items', [])
+        types = SEARCH_TYPES if search_type == 'all' else [search_type]
+        results = await asyncio.to_thread(self.sp.search, q=query, type=','.join(types), limit=5)
+        items = rank_results(query, results, types)[:8]
         
         if not items:
             return f"❌ No encontré resultados para '{query}'"
         
+        labels = {'track': '🎵', 'artist': '👤', 'album': '💿', 'playlist': '📝'}
         response = f"🔍 Resultados para '{query}':\n"
         for i, item in enumerate(items, 1):
-            if search_type == 'track':
-                artist = item['artists'][0]['name']
-                response += f"{i}. {item['name']} - {artist}\n"
+            prefix = f"{labels[item['type']]} " if len(types) > 1 else ''
+            if item['subtitle']:
+                response += f"{i}. {prefix}{item['name']} - {item['subtitle']}\n"
             else:
-                response += f"{i}. {item['name']}\n"
+                response += f"{i}. {prefix}{item['name']}\n"
         
         return response
     
     async def _current(self, params: dict) -> str:
         """Canción actual"""
-        current = self.sp.current_playback()
+        current = await asyncio.to_thread(self.sp.current_playback)
         
         if not current or not current.get('item'):
             return "🔇 No hay nada reproduciéndose"
@@ -222,12 +359,12 @@ class SpotifyMCP:
         level = params.get('level', 50)
         level = max(0, min(100, int(level)))
         
-        self.sp.volume(level)
+        await asyncio.to_thread(self.sp.volume, level)
         return f"🔊 Volumen: {level}%"
     
     async def _playlists(self, params: dict) -> str:
         """Lista playlists"""
-        playlists = self.sp.current_user_playlists(limit=10)
+        playlists = await asyncio.to_thread(self.sp.current_user_playlists, limit=10)
         items = playlists.get('items', [])
         
         if not items:
@@ -246,12 +383,12 @@ class SpotifyMCP:
         if not name:
             return "❌ Especifica el nombre de la playlist"
         
-        playlists = self.sp.current_user_playlists(limit=50)
+        playlists = await asyncio.to_thread(self.sp.current_user_playlists, limit=50)
         items = playlists.get('items', [])
         
         for pl in items:
             if name in pl['name'].lower():
-                self.sp.start_playback(context_uri=pl['uri'])
+                await asyncio.to_thread(self.sp.start_playback, context_uri=pl['uri'])
                 return f"🎵 Reproduciendo playlist: {pl['name']}"
         
         return f"❌ No encontré playlist '{name}'"
@@ -0,0 +1,127 @@
+"""
+Spotify Token - Token OAuth en memoria con refresco en segundo plano
+spotipy consulta la caché en cada petición; con esta caché la consulta es un
+dict en memoria y el token se renueva en un hilo antes de caducar, así ningún
+comando espera a un refresco ni a leer el disco. El archivo solo se escribe
+(de forma atómica) para sobrevivir a reinicios.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from spotipy.cache_handler import CacheHandler
+
+
+def default_token_path() -> str:
+    base = os.getenv('XDG_CONFIG_HOME', os.path.join(os.path.expanduser('~'), '.config'))
+    return os.path.join(base, 'asistente-movil', 'spotify_token.json')
+
+
+class SpotifyTokenStore(CacheHandler):
+    """CacheHandler de spotipy que vive en memoria y persiste en un archivo fijo"""
+
+    def __init__(self, path: str = None, legacy_path: str = '.spotify_cache'):
+        self.path = path or default_token_path()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._token = self._read(self.path) or self._read(legacy_path)
+        self.saved = threading.Event()
+
+    def get_cached_token(self) -> Optional[dict]:
+        with self._lock:
+            return dict(self._token) if self._token else None
+
+    def save_token_to_cache(self, token_info: dict):
+        with self._lock:
+            self._token = dict(token_info)
+        # El disco no está en el camino del comando
+        threading.Thread(target=self._write, daemon=True).start()
+
+    @staticmethod
+    def _read(path: str) -> Optional[dict]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                token = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return token if isinstance(token, dict) and token.get('access_token') else None
+
+    def _write(self):
+        """Temporal + rename: nunca queda un archivo a medio escribir
+
+        Escribe el token más reciente, así dos guardados seguidos no se pisan
+        en el orden equivocado.
+        """
+        with self._write_lock:
+            with self._lock:
+                token_info = dict(self._token)
+            self._write_file(token_info)
+
+    def _write_file(self, token_info: dict):
+        try:
+            directory = os.path.dirname(self.path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.spotify_token', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(token_info, f)
+                os.chmod(tmp_path, 0o600)
+                os.replace(tmp_path, self.path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self.saved.set()
+        except OSError as e:
+            print(f"⚠️ Spotify: no se pudo guardar el token - {e}")
+
+
+class TokenRefresher:
+    """Hilo que renueva el token margin segundos antes de que caduque"""
+
+    def __init__(self, auth_manager, store: SpotifyTokenStore, margin: float = 300,
+                 retry_seconds: float = 30):
+        self.auth_manager = auth_manager
+        self.store = store
+        self.margin = margin
+        self.retry_seconds = retry_seconds
+        self.refreshes = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _seconds_until_refresh(self) -> Optional[float]:
+        token = self.store.get_cached_token()
+        if not token or not token.get('refresh_token'):
+            return None
+        return token.get('expires_at', 0) - time.time() - self.margin
+
+    def _run(self):
+        while not self._stop.is_set():
+            wait = self._seconds_until_refresh()
+            if wait is None:
+                # Sin token todavía (falta autorizar): volver a mirar más tarde
+                self._stop.wait(self.retry_seconds)
+                continue
+            if wait > 0:
+                self._stop.wait(wait)
+                continue
+            try:
+                token = self.store.get_cached_token()
+                # spotipy guarda el token nuevo a través del store
+                self.auth_manager.refresh_access_token(token['refresh_token'])
+                self.refreshes += 1
+            except Exception as e:
+                self.failures += 1
+                print(f"⚠️ Spotify: fallo al renovar el token - {e}")
+                self._stop.wait(self.retry_seconds)
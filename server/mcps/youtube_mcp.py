@@ -1,10 +1,84 @@
 """
 YouTube MCP - Búsqueda y reproducción inteligente
 Usa yt-dlp para buscar sin API Key
+
+La búsqueda plana (--flat-playlist) es rápida pero no trae duración fiable,
+vistas ni canal: esos metadatos se piden en paralelo para los primeros
+resultados, se cachean por video y se emiten según llegan.
 """
 import asyncio
 import json
-import subprocess
+import time
+from typing import Optional
+
+import circuit_breaker
+import deadline
+import progress
+from circuit_breaker import CircuitOpenError
+from mcps import executor
+
+
+def _format_duration(seconds) -> str:
+    if not isinstance(seconds, (int, float)) or seconds <= 0:
+        return '??:??'
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+def _format_views(views) -> Optional[str]:
+    if not isinstance(views, int):
+        return None
+    if views >= 1_000_000:
+        return f"{views / 1_000_000:.1f} M vistas"
+    if views >= 1_000:
+        return f"{views / 1_000:.0f} mil vistas"
+    return f"{views} vistas"
+
+
+def _video_info(video: dict) -> dict:
+    """Campos útiles de un JSON de yt-dlp (plano o completo)"""
+    return {
+        'id': video.get('id'),
+        'title': video.get('title'),
+        'url': video.get('webpage_url') or video.get('url'),
+        'duration': video.get('duration_string') or _format_duration(video.get('duration')),
+        'views': video.get('view_count'),
+        'channel': video.get('channel') or video.get('uploader'),
+    }
+
+
+def _describe(video: dict) -> str:
+    extras = [x for x in (video.get('channel'), _format_views(video.get('views'))) if x]
+    suffix = f" · {' · '.join(extras)}" if extras else ""
+    return f"- {video['title']} ({video['duration']}){suffix}\n  URL: {video['url']}"
+
+
+class VideoCache:
+    """id de video → metadatos completos, con caducidad y tamaño acotado"""
+    
+    def __init__(self, ttl: float = 86400, max_entries: int = 512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self.stats = {'hits': 0, 'misses': 0}
+    
+    def get(self, video_id: str) -> Optional[dict]:
+        entry = self._entries.get(video_id)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(video_id, None)
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return entry[1]
+    
+    def put(self, video_id: str, info: dict):
+        if len(self._entries) >= self.max_entries:
+            # Fuera la que caduca antes
+            oldest = min(self._entries, key=lambda k: self._entries[k][0])
+            del self._entries[oldest]
+        self._entries[video_id] = (time.monotonic() + self.ttl, info)
+
 
 class YouTubeMCP:
     """MCP para YouTube usando yt-dlp"""
@@ -12,20 +86,29 @@ class YouTubeMCP:
     description = "Búsqueda avanzada de videos en YouTube"
     
     def __init__(self, config: dict = None):
-        self._check_ytdlp()
+        config = config or {}
+        # Cuántos resultados se completan con metadatos, y cuántos a la vez
+        self.enrich_top = config.get('enrich_top', 3)
+        self.enrich_parallel = max(1, config.get('enrich_parallel', 3))
+        self.enrich_timeout = config.get('enrich_timeout', 8)
+        self.metadata_cache = VideoCache(config.get('metadata_ttl', 86400))
+        # Búsquedas planas recientes (las lanza también el prewarm especulativo)
+        self.search_reuse_seconds = config.get('search_reuse_seconds', 30)
+        self._searches = {}
+        self.ytdlp_version = None
         
-    def _check_ytdlp(self):
-        """Verifica/Instala yt-dlp"""
+    async def _check_ytdlp(self) -> bool:
+        """¿Está yt-dlp? Se comprueba en el primer uso (por el executor) y se recuerda si está"""
+        if self.ytdlp_version:
+            return True
         try:
-            subprocess.run(['yt-dlp', '--version'], capture_output=True, check=True)
-            print("✅ YouTube: yt-dlp activo")
-        except (FileNotFoundError, subprocess.CalledProcessError):
-            print("⚠️ YouTube: Instalando yt-dlp...")
-            try:
-                subprocess.run(['pip', 'install', 'yt-dlp'], check=True)
-                print("✅ YouTube: yt-dlp instalado")
-            except:
-                print("❌ Error instalando yt-dlp")
+            result = await executor.run(['yt-dlp', '--version'], timeout=10)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        if result.ok:
+            self.ytdlp_version = result.text.strip()
+            print(f"✅ YouTube: yt-dlp {self.ytdlp_version}")
+        return result.ok
 
     def get_tools(self) -> list:
         return [
@@ -65,8 +148,50 @@ class YouTubeMCP:
         limit = params.get('limit', 5)
         auto_play = params.get('auto_play', False)
         
+        if not await self._check_ytdlp():
+            return "❌ YouTube necesita yt-dlp (pip install yt-dlp)"
+        
         print(f"🔍 Buscando '{query}' en YouTube...")
         
+        try:
+            # Copia: la lista cacheada se comparte y el enriquecimiento la modifica
+            videos = list(await self._flat_search(query, limit))
+        except RuntimeError as e:
+            return f"❌ Error buscando: {e}"
+                    
+        if not videos:
+            return f"❌ No encontré videos para '{query}'"
+        
+        # Si auto_play está activado, abrir el primero ya (sin esperar a los metadatos)
+        if auto_play:
+            error = await self._open_url(videos[0]['url'])
+            if error:
+                return f"❌ No pude abrir '{videos[0]['title']}': {error}\n  URL: {videos[0]['url']}"
+            return f"▶️ Reproduciendo: {videos[0]['title']}"
+        
+        for index, video in enumerate(videos):
+            progress.emit({"type": "video", "index": index, "enriched": False, **video})
+        await self._enrich(videos)
+        
+        return f"📺 Videos encontrados:\n" + "\n".join(_describe(v) for v in videos)
+    
+    def _flat_search(self, query: str, limit: int) -> asyncio.Future:
+        """Búsqueda plana compartida: un prewarm reciente o en vuelo se reutiliza"""
+        key = (str(query).strip().lower(), int(limit))
+        now = time.monotonic()
+        for stale in [k for k, (expires, _) in self._searches.items() if expires < now]:
+            del self._searches[stale]
+        entry = self._searches.get(key)
+        # Un fallo no se reutiliza: se busca de nuevo
+        if entry is not None and entry[1].done() and (entry[1].cancelled() or entry[1].exception()):
+            entry = None
+        if entry is None:
+            task = asyncio.ensure_future(self._run_flat_search(query, limit))
+            entry = self._searches[key] = (now + self.search_reuse_seconds, task)
+        # shield: cancelar un llamador no corta la búsqueda para los demás
+        return asyncio.shield(entry[1])
+    
+    async def _run_flat_search(self, query: str, limit: int) -> list:
         cmd = [
             'yt-dlp',
             f'ytsearch{limit}:{query}',
@@ -75,48 +200,105 @@ class YouTubeMCP:
             '--flat-playlist'
         ]
         
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
+        result = await executor.run(cmd)
         
-        if process.returncode != 0:
-            return f"❌ Error buscando: {stderr.decode()}"
+        if not result.ok:
+            raise RuntimeError(result.error_text)
             
-        results = []
-        output = stdout.decode()
-        first_url = None
+        videos = []
         
         # yt-dlp devuelve un JSON por línea
-        for line in output.strip().split('\n'):
+        for line in result.text.strip().split('\n'):
             if line:
                 try:
-                    video = json.loads(line)
-                    url = video.get('url')
-                    title = video.get('title')
-                    duration = video.get('duration_string', '??:??')
-                    
-                    if not first_url:
-                        first_url = url
-                    
-                    results.append(f"- {title} ({duration})\n  URL: {url}")
-                except:
-                    pass
-                    
-        if not results:
-            return f"❌ No encontré videos para '{query}'"
+                    video = _video_info(json.loads(line))
+                except ValueError:
+                    continue
+                if video['url']:
+                    videos.append(video)
+        return videos
+    
+    async def prewarm(self, action: str, params: dict):
+        """Especulativo: lanza la búsqueda (sin abrir nada) para que la acción real la encuentre hecha"""
+        query = params.get('query')
+        if not query or action == 'play_video' or not await self._check_ytdlp():
+            return
+        await self._flat_search(query, params.get('limit', 5))
+    
+    async def _enrich(self, videos: list):
+        """Completa en el sitio los primeros enrich_top videos con sus metadatos
+        
+        Como mucho enrich_parallel yt-dlp a la vez; lo que no llegue dentro de
+        enrich_timeout (o del deadline del comando) se queda con los datos planos.
+        """
+        top = [(i, v) for i, v in enumerate(videos[:self.enrich_top]) if v.get('id')]
+        if not top:
+            return
+        semaphore = asyncio.Semaphore(self.enrich_parallel)
         
-        # Si auto_play está activado, abrir el primero
-        if auto_play and first_url:
-            subprocess.run(['termux-open-url', first_url], check=False)
-            return f"▶️ Reproduciendo: {results[0].split('URL:')[0].strip()}"
+        async def fetch(index: int, video: dict) -> tuple:
+            async with semaphore:
+                return index, await self._fetch_metadata(video)
         
-        return f"📺 Videos encontrados:\n" + "\n".join(results)
+        tasks = [asyncio.ensure_future(fetch(i, v)) for i, v in top]
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=deadline.timeout(self.enrich_timeout)):
+                index, info = await next_done
+                if info:
+                    videos[index] = info
+                    progress.emit({"type": "video", "index": index, "enriched": True, **info})
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _fetch_metadata(self, video: dict) -> Optional[dict]:
+        """Metadatos completos de un video (caché por id); None si yt-dlp falla"""
+        cached = self.metadata_cache.get(video['id'])
+        if cached:
+            return cached
+        try:
+            result = await executor.run(
+                ['yt-dlp', '--dump-json', '--skip-download', '--no-playlist', '--no-warnings',
+                 video['url']],
+                timeout=self.enrich_timeout
+            )
+            if not result.ok:
+                return None
+            info = _video_info(json.loads(result.text))
+        except (OSError, ValueError, asyncio.TimeoutError):
+            return None
+        # La URL plana ya es reproducible: no depender de la que venga en el JSON completo
+        info['url'] = info['url'] or video['url']
+        self.metadata_cache.put(video['id'], info)
+        return info
 
     async def _play(self, params: dict) -> str:
         url = params.get('url')
-        # Usar termux-open-url
-        subprocess.run(['termux-open-url', url])
+        if not url:
+            return "❌ Especifica la URL del video"
+        error = await self._open_url(url)
+        if error:
+            return f"❌ No pude abrir el video: {error}"
         return f"▶️ Abriendo video..."
+
+    async def _open_url(self, url: str) -> Optional[str]:
+        """termux-open-url por el breaker de Termux:API (el mismo que usa el Mobile MCP)
+
+        Devuelve None si se abrió o el motivo del fallo; salir con código
+        distinto de 0 cuenta como fallo del breaker.
+        """
+        try:
+            result = await circuit_breaker.get('termux').call(
+                executor.run, ['termux-open-url', url], timeout=10,
+                failed_result=lambda r: not r.ok)
+        except CircuitOpenError as e:
+            return str(e)
+        except OSError:
+            return "termux-open-url no está disponible (pkg install termux-api)"
+        except asyncio.TimeoutError:
+            return "termux-open-url no respondió"
+        if not result.ok:
+            return result.error_text or f"termux-open-url salió con código {result.returncode}"
+        return None
@@ -0,0 +1,247 @@
+"""
+Mock Backend - Sustitutos locales de Groq (chat y Whisper) y MCPs de prueba
+Usado por benchmark.py y las pruebas de larga duración; no hace llamadas reales
+"""
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import stat
+import tempfile
+import threading
+import time
+import wave
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockLLMServer:
+    """Servidor local compatible con /chat/completions y /audio/transcriptions
+
+    latency: segundos hasta el primer token; jitter: ± uniforme sobre latency
+    token_rate: tokens/segundo de generación (0 = instantáneo)
+    routes: {texto del comando: plan} con lo que responde el router
+    rpm_limit: si > 0, simula la cuota por minuto de Groq (cabeceras x-ratelimit-* y 429)
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.05, token_rate: float = 0,
+                 stt_latency: float = 0.3, routes: dict = None, transcript: str = '',
+                 chat_reply: str = 'Claro, aquí tienes una respuesta de prueba.', seed: int = None,
+                 rpm_limit: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_rate = token_rate
+        self.stt_latency = stt_latency
+        self.routes = routes or {}
+        self.transcript = transcript
+        self.chat_reply = chat_reply
+        self.random = random.Random(seed)
+        self.rpm_limit = rpm_limit
+        self.requests = {'chat': 0, 'transcriptions': 0, 'rate_limited': 0}
+        self._window = []
+        self._window_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/openai/v1"
+
+    def start(self):
+        """Arranca en un hilo, en un puerto libre"""
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                if self.path.endswith('/chat/completions'):
+                    mock._handle_chat(self, json.loads(body))
+                elif self.path.endswith('/audio/transcriptions'):
+                    mock._handle_transcription(self, body)
+                else:
+                    self.send_error(404)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _delay(self, base: float):
+        time.sleep(max(0.0, base + self.random.uniform(-self.jitter, self.jitter)))
+
+    def _reply_for(self, messages: list) -> str:
+        """Plan JSON para prompts del router, texto para el resto"""
+        prompt = messages[-1]['content'] if messages else ''
+        if 'Responde SOLO en formato JSON' not in prompt:
+            return self.chat_reply
+        for command, plan in self.routes.items():
+            if f'Comando: "{command}"' in prompt:
+                return json.dumps(plan, ensure_ascii=False)
+        return '{"requires_mcp": false}'
+
+    def _rate_limit_headers(self) -> dict:
+        """Cuenta la petición en la ventana de 60s; None si excede rpm_limit"""
+        if not self.rpm_limit:
+            return {}
+        with self._window_lock:
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 60]
+            reset = 60 - (now - self._window[0]) if self._window else 0
+            if len(self._window) >= self.rpm_limit:
+                return None
+            self._window.append(now)
+            return {
+                'x-ratelimit-limit-requests': str(self.rpm_limit),
+                'x-ratelimit-remaining-requests': str(self.rpm_limit - len(self._window)),
+                'x-ratelimit-reset-requests': f"{reset:.2f}s",
+            }
+
+    def _handle_chat(self, handler, data: dict):
+        self.requests['chat'] += 1
+        limit_headers = self._rate_limit_headers()
+        if limit_headers is None:
+            self.requests['rate_limited'] += 1
+            body = b'{"error": {"message": "Rate limit reached", "type": "requests"}}'
+            handler.send_response(429)
+            handler.send_header('Retry-After', '1')
+            handler.send_header('x-ratelimit-remaining-requests', '0')
+            handler.send_header('Content-Type', 'application/json')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+            return
+        content = self._reply_for(data.get('messages', []))
+        tokens = content.split(' ')
+        usage = {
+            "prompt_tokens": sum(len(m.get('content', '')) for m in data.get('messages', [])) // 4,
+            "completion_tokens": len(tokens),
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        self._delay(self.latency)
+
+        if not data.get('stream'):
+            if self.token_rate:
+                time.sleep(len(tokens) / self.token_rate)
+            body = json.dumps({
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage
+            }).encode('utf-8')
+            handler.send_response(200)
+            for name, value in limit_headers.items():
+                handler.send_header(name, value)
+            handler.send_header('Content-Type', 'application/json')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+            return
+
+        # Streaming SSE: un token por evento, al ritmo de token_rate
+        handler.send_response(200)
+        for name, value in limit_headers.items():
+            handler.send_header(name, value)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Connection', 'close')
+        handler.end_headers()
+        try:
+            for i, token in enumerate(tokens):
+                piece = token if i == 0 else ' ' + token
+                chunk = {"choices": [{"index": 0, "delta": {"content": piece}}]}
+                handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                handler.wfile.flush()
+                if self.token_rate:
+                    time.sleep(1 / self.token_rate)
+            final = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            handler.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # El cliente cortó la generación
+        handler.close_connection = True
+
+    def _handle_transcription(self, handler, body: bytes):
+        self.requests['transcriptions'] += 1
+        self._delay(self.stt_latency)
+        data = json.dumps({"text": self.transcript}).encode('utf-8')
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+class StubMCP:
+    """MCP de prueba: responde tras una latencia fija, sin tocar el dispositivo"""
+
+    def __init__(self, name: str, actions: list, latency: float = 0.05):
+        self.name = name
+        self.description = f"MCP de prueba '{name}'"
+        self.actions = actions
+        self.latency = latency
+        self.calls = 0
+
+    def get_tools(self) -> list:
+        return [{"name": a, "description": f"Acción de prueba {a}", "params": {}} for a in self.actions]
+
+    async def execute(self, action: str, params: dict) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return f"✅ {self.name}.{action}"
+
+
+def make_wav(seconds: float = 1.0, rate: int = 16000, tone_hz: float = 0) -> bytes:
+    """WAV mono de 16 bits para alimentar el camino de voz (silencio, o un tono que pasa por voz)"""
+    count = int(seconds * rate)
+    if tone_hz:
+        samples = array('h', (int(6000 * math.sin(2 * math.pi * tone_hz * i / rate))
+                              for i in range(count)))
+        frames = samples.tobytes()
+    else:
+        frames = b'\x00\x00' * count
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(frames)
+    return buffer.getvalue()
+
+
+def install_fake_termux_bin(speak_seconds_per_char: float = 0.0) -> str:
+    """Crea un directorio con sustitutos de termux-* y devuelve su ruta (para anteponer a PATH)"""
+    bin_dir = tempfile.mkdtemp(prefix='fake-termux-')
+    sample = os.path.join(bin_dir, 'sample.wav')
+    with open(sample, 'wb') as f:
+        f.write(make_wav(1.0, tone_hz=220))
+    scripts = {
+        # Simula la duración de la locución: bloquea en proporción al texto
+        'termux-tts-speak': f'#!/bin/sh\npython3 -c "import sys,time; '
+                            f'time.sleep(len(\' \'.join(sys.argv[1:])) * {speak_seconds_per_char})" "$@"\n',
+        # "-f archivo" deja una grabación con voz simulada; "-q" no hace nada
+        'termux-microphone-record': '#!/bin/sh\nwhile [ $# -gt 0 ]; do\n'
+                                    f'  if [ "$1" = "-f" ]; then cp "{sample}" "$2"; fi\n'
+                                    '  shift\ndone\nexit 0\n',
+        'termux-open-url': '#!/bin/sh\nexit 0\n',
+        'termux-notification': '#!/bin/sh\nexit 0\n',
+        'termux-vibrate': '#!/bin/sh\nexit 0\n',
+        'termux-toast': '#!/bin/sh\nexit 0\n',
+    }
+    for name, content in scripts.items():
+        path = os.path.join(bin_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return bin_dir
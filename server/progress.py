@@ -0,0 +1,32 @@
+"""
+Progress - Avances parciales de un comando en curso
+El plan de acciones y los MCPs emiten eventos que el daemon transmite en streaming
+"""
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+
+# Receptor de eventos del comando actual (se hereda en las tareas hijas de asyncio)
+_sink: contextvars.ContextVar = contextvars.ContextVar('progress_sink', default=None)
+
+
+@contextmanager
+def listening(callback: Optional[Callable[[dict], None]]):
+    """Dirige los eventos emitidos dentro del bloque hacia callback"""
+    token = _sink.set(callback)
+    try:
+        yield
+    finally:
+        _sink.reset(token)
+
+
+def emit(event: dict):
+    """Emite un evento parcial; no hace nada si nadie está escuchando"""
+    callback = _sink.get()
+    if callback is None:
+        return
+    try:
+        callback(event)
+    except Exception:
+        pass  # Un cliente lento o caído no debe romper el comando
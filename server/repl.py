@@ -0,0 +1,188 @@
+"""
+REPL - Modo texto asíncrono y cancelable
+La entrada se lee en un hilo y llega al event loop por una cola, así que mientras
+se espera a que el usuario escriba siguen corriendo las tareas de fondo
+(refrescos, verificaciones del índice, TTS). Cada comando se lanza como tarea
+con un número (#1, #2...): se puede escribir el siguiente sin esperar al anterior.
+
+Ctrl+C cancela el último comando en curso (sin ninguno en curso, sale);
+'/cancelar [n]' cancela uno concreto y '/pendientes' lista los que siguen.
+"""
+import asyncio
+import signal
+import sys
+import threading
+import time
+from typing import Optional
+
+
+EXIT_WORDS = ('salir', 'exit', 'quit')
+
+
+class LineReader:
+    """Líneas de stdin leídas en un hilo daemon (no retiene la salida del programa)"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdin
+        self._queue = asyncio.Queue()
+        self._loop = None
+        self._thread = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        while True:
+            try:
+                line = self.stream.readline()
+            except (OSError, ValueError):
+                line = ''
+            try:
+                # '' = fin de la entrada (Ctrl+D o tubería cerrada)
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, line or None)
+            except RuntimeError:
+                return  # El loop ya se cerró
+            if not line:
+                return
+
+    async def readline(self) -> Optional[str]:
+        """Siguiente línea sin el salto final, o None al acabarse la entrada"""
+        line = await self._queue.get()
+        return None if line is None else line.rstrip('\r\n')
+
+
+class TextREPL:
+    """Bucle de texto que no bloquea el event loop y admite varios comandos en vuelo"""
+
+    def __init__(self, assistant, reader: LineReader = None, prompt: str = "Tú: "):
+        self.assistant = assistant
+        self.reader = reader or LineReader()
+        self.prompt = prompt
+        self.running = {}
+        self._next_id = 1
+        self._stop = asyncio.Event()
+
+    def _show_prompt(self):
+        print(self.prompt, end='', flush=True)
+
+    def submit(self, text: str) -> int:
+        """Lanza el comando como tarea y devuelve su número"""
+        command_id = self._next_id
+        self._next_id += 1
+        task = asyncio.create_task(self._run(command_id, text))
+        self.running[command_id] = task
+        task.add_done_callback(lambda _: self.running.pop(command_id, None))
+        return command_id
+
+    async def _run(self, command_id: int, text: str):
+        start = time.perf_counter()
+
+        def on_event(event: dict):
+            if event.get('type') == 'action':
+                print(f"\n   [#{command_id}] {event.get('action')}: {event.get('result')}")
+            elif event.get('type') == 'video' and event.get('enriched'):
+                print(f"\n   [#{command_id}] 📺 {event.get('title')} ({event.get('duration')})")
+
+        try:
+            response = await self.assistant.process_command(text, on_event=on_event)
+        except asyncio.CancelledError:
+            print(f"\n🛑 [#{command_id}] cancelado")
+            self._show_prompt()
+            raise
+        except Exception as e:
+            print(f"\n❌ [#{command_id}] Error: {e}")
+        else:
+            elapsed = time.perf_counter() - start
+            print(f"\n🤖 [#{command_id}, {elapsed:.1f}s]: {response}\n")
+        self._show_prompt()
+
+    def cancel(self, command_id: int = None) -> Optional[int]:
+        """Cancela command_id (o el último lanzado que siga en curso)"""
+        if command_id is None:
+            if not self.running:
+                return None
+            command_id = max(self.running)
+        task = self.running.get(command_id)
+        if task is None:
+            return None
+        task.cancel()
+        return command_id
+
+    def _on_interrupt(self):
+        """Ctrl+C: cancela el último comando; sin ninguno en curso, termina"""
+        if self.cancel() is None:
+            print()
+            self._stop.set()
+
+    def _handle_builtin(self, text: str) -> bool:
+        """Órdenes del propio REPL; True si text era una de ellas"""
+        parts = text.split()
+        if parts[0] in ('/cancelar', '/cancel'):
+            try:
+                command_id = int(parts[1].lstrip('#')) if len(parts) > 1 else None
+            except ValueError:
+                print("❌ Uso: /cancelar [número]")
+                return True
+            if self.cancel(command_id) is None:
+                print("ℹ️ No hay ningún comando en curso con ese número")
+            return True
+        if parts[0] in ('/pendientes', '/jobs'):
+            if not self.running:
+                print("ℹ️ Nada en curso")
+            for command_id in sorted(self.running):
+                print(f"   #{command_id} en curso")
+            return True
+        return False
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGINT, self._on_interrupt)
+            handles_sigint = True
+        except (NotImplementedError, RuntimeError):
+            # Sin señales en el loop (Windows): Ctrl+C sale como antes
+            handles_sigint = False
+        self.reader.start()
+        self._show_prompt()
+        try:
+            while not self._stop.is_set():
+                line_task = asyncio.ensure_future(self.reader.readline())
+                stop_task = asyncio.ensure_future(self._stop.wait())
+                done, _ = await asyncio.wait({line_task, stop_task},
+                                             return_when=asyncio.FIRST_COMPLETED)
+                stop_task.cancel()
+                if line_task not in done:
+                    line_task.cancel()
+                    break
+                line = line_task.result()
+                if line is None:
+                    # Fin de la entrada: se terminan los comandos pendientes y se sale
+                    if self.running:
+                        await asyncio.wait(list(self.running.values()))
+                    break
+
+                text = line.strip()
+                if text.lower() in EXIT_WORDS:
+                    break
+                if not text:
+                    self._show_prompt()
+                    continue
+                if text.startswith('/') and self._handle_builtin(text):
+                    self._show_prompt()
+                    continue
+
+                command_id = self.submit(text)
+                if len(self.running) > 1:
+                    print(f"⏳ [#{command_id}] en curso ({len(self.running)} pendientes)")
+                # Se puede escribir el siguiente sin esperar la respuesta
+                self._show_prompt()
+        finally:
+            if handles_sigint:
+                loop.remove_signal_handler(signal.SIGINT)
+            for task in list(self.running.values()):
+                task.cancel()
+            if self.running:
+                await asyncio.wait(list(self.running.values()))
+            print("👋 ¡Hasta luego!")
@@ -0,0 +1,293 @@
+"""
+Soak - Prueba de larga duración de memoria y recursos
+Ejecutar: python soak.py [--duration 3600] [--interval 60] [--output soak.json]
+
+Repite comandos (y el camino de voz) contra el backend simulado durante horas y
+muestrea RSS, descriptores abiertos, procesos hijo, archivos temporales, tamaño
+de cachés y las asignaciones que más crecen (tracemalloc). Al final informa la
+tendencia por hora de cada métrica y marca las que crecen sin parar.
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmark import SCENARIOS, build_assistant
+from mock_backend import MockLLMServer, StubMCP, install_fake_termux_bin
+
+
+# Crecimiento por hora a partir del cual una métrica se considera fuga
+LEAK_THRESHOLDS = {
+    'rss_mb': 8.0,
+    'traced_mb': 4.0,
+    'open_fds': 2.0,
+    'children': 1.0,
+    'temp_files': 1.0,
+    'tts_cache_mb': 25.0,
+}
+
+# Lo que asigna la propia prueba (muestras, snapshots, imports) no cuenta como fuga
+HARNESS_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, __file__),
+]
+
+
+def rss_mb() -> float:
+    """Memoria residente actual (VmRSS); sin /proc, el máximo de getrusage"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def open_fds() -> int:
+    for path in ('/proc/self/fd', '/dev/fd'):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return -1
+
+
+def child_processes() -> int:
+    """Procesos cuyo padre es este (subprocesos sin recoger incluidos)"""
+    pid = str(os.getpid())
+    count = 0
+    for stat_path in glob.glob('/proc/[0-9]*/stat'):
+        try:
+            with open(stat_path) as f:
+                # El nombre va entre paréntesis y puede tener espacios
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if fields[1] == pid:
+            count += 1
+    return count
+
+
+def temp_files(work_dir: str) -> int:
+    """Restos de grabaciones y síntesis en el directorio de trabajo y en /tmp"""
+    patterns = [os.path.join(work_dir, 'temp_audio*'),
+                os.path.join(tempfile.gettempdir(), 'tmp*.wav')]
+    return sum(len(glob.glob(pattern)) for pattern in patterns)
+
+
+def directory_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total / (1024 * 1024)
+
+
+def slope_per_hour(points: list) -> float:
+    """Pendiente por mínimos cuadrados de [(segundos, valor), ...], en unidades por hora"""
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var = sum((t - mean_t) ** 2 for t, _ in points)
+    if not var:
+        return 0.0
+    cov = sum((t - mean_t) * (v - mean_v) for t, v in points)
+    return cov / var * 3600
+
+
+def trends(samples: list, warmup_s: float = 0) -> dict:
+    """Inicio, fin, máximo y pendiente por hora de cada métrica (tras el calentamiento)
+
+    Las muestras de los primeros warmup_s segundos (cachés e índices llenándose)
+    no entran en el ajuste; si tras ellas quedan menos de dos, se usan todas.
+    """
+    steady = [s for s in samples if s['elapsed_s'] >= warmup_s]
+    if len(steady) < 2:
+        steady = samples
+    result = {}
+    for metric, threshold in LEAK_THRESHOLDS.items():
+        points = [(s['elapsed_s'], s[metric]) for s in steady if s.get(metric) is not None]
+        if not points:
+            continue
+        slope = slope_per_hour(points)
+        result[metric] = {
+            'start': round(points[0][1], 3),
+            'end': round(points[-1][1], 3),
+            'max': round(max(v for _, v in points), 3),
+            'per_hour': round(slope, 3),
+            'suspect': slope > threshold and points[-1][1] > points[0][1],
+        }
+    return result
+
+
+def traced_snapshot():
+    """Snapshot de tracemalloc sin las asignaciones de la propia prueba"""
+    return tracemalloc.take_snapshot().filter_traces(HARNESS_FILTERS)
+
+
+def top_growth(baseline, limit: int = 15) -> list:
+    """Líneas de código cuyas asignaciones más crecieron desde baseline"""
+    stats = traced_snapshot().compare_to(baseline, 'lineno')
+    return [{'where': str(stat.traceback[0]), 'size_kb': round(stat.size / 1024, 1),
+             'growth_kb': round(stat.size_diff / 1024, 1), 'count_growth': stat.count_diff}
+            for stat in stats[:limit] if stat.size_diff > 0]
+
+
+async def run_soak(args) -> dict:
+    routes = {command: plan for command, plan in SCENARIOS.items() if plan}
+    mock = MockLLMServer(latency=args.latency, jitter=args.latency / 4, stt_latency=args.latency,
+                         routes=routes, transcript="hey yeni, pausa spotify", seed=args.seed).start()
+    bin_dir = install_fake_termux_bin()
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ.get('PATH', '')
+    os.environ['GROQ_API_KEY'] = 'soak'
+    work_dir = tempfile.mkdtemp(prefix='soak-')
+    cache_dir = os.path.join(work_dir, 'cache')
+    os.environ['XDG_CACHE_HOME'] = cache_dir
+    os.environ['XDG_DATA_HOME'] = os.path.join(work_dir, 'data')
+    previous_cwd = os.getcwd()
+    # temp_audio.wav se crea en el directorio actual: así se ve si queda alguno
+    os.chdir(work_dir)
+
+    tracemalloc.start(args.frames)
+    samples = []
+    counters = {'commands': 0, 'voice': 0, 'errors': 0}
+    commands = list(SCENARIOS)
+
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            from mcps.mobile_mcp import MobileMCP
+            from voice import VoiceManagerTermux
+            assistant = build_assistant(mock.base_url, args.mcp_latency)
+            # Mobile real (termux-* simulados): ejercita el manejo de subprocesos
+            assistant.mcps['mobile'] = MobileMCP()
+            assistant.mcps['youtube'] = StubMCP('youtube', ['search_video'], args.mcp_latency)
+            assistant.system_prompt = assistant._build_system_prompt()
+            voice_manager = VoiceManagerTermux('es', api_base=mock.base_url)
+            await voice_manager.start_tts()
+
+            start = time.monotonic()
+            # Tras el calentamiento se vuelve a tomar: lo que crece antes es llenado, no fuga
+            baseline = traced_snapshot()
+            warmed_up = args.warmup <= 0
+            next_sample = start
+
+            def sample():
+                elapsed = time.monotonic() - start
+                traced = sum(stat.size for stat in traced_snapshot().statistics('filename'))
+                _, peak = tracemalloc.get_traced_memory()
+                entry = {
+                    'elapsed_s': round(elapsed, 1),
+                    'rss_mb': round(rss_mb(), 2),
+                    'traced_mb': round(traced / (1024 * 1024), 3),
+                    'traced_peak_mb': round(peak / (1024 * 1024), 3),
+                    'open_fds': open_fds(),
+                    'children': child_processes(),
+                    'temp_files': temp_files(work_dir),
+                    'tts_cache_mb': round(directory_mb(cache_dir), 3),
+                    'llm_inflight': len(assistant.llm._inflight),
+                    'background_tasks': len(asyncio.all_tasks()),
+                    **counters,
+                }
+                if assistant.intent_index:
+                    entry['intent_entries'] = len(assistant.intent_index.entries)
+                samples.append(entry)
+                print(f"⏱️ {entry['elapsed_s']:>8}s rss={entry['rss_mb']}MB fds={entry['open_fds']} "
+                      f"hijos={entry['children']} tmp={entry['temp_files']} "
+                      f"comandos={counters['commands']}", file=sys.stderr)
+
+            i = 0
+            while time.monotonic() - start < args.duration:
+                if not warmed_up and time.monotonic() - start >= args.warmup:
+                    baseline = traced_snapshot()
+                    warmed_up = True
+                if time.monotonic() >= next_sample:
+                    sample()
+                    next_sample += args.interval
+                command = f"hey yeni, {commands[i % len(commands)]}"
+                try:
+                    if args.voice_every and i % args.voice_every == 0:
+                        heard = await asyncio.to_thread(voice_manager.listen, 1)
+                        command = heard or command
+                        counters['voice'] += 1
+                    response = await assistant.process_command(command)
+                    voice_manager.say(response)
+                    counters['commands'] += 1
+                except Exception:
+                    counters['errors'] += 1
+                i += 1
+                await asyncio.sleep(args.pause)
+            sample()
+            growth = top_growth(baseline, args.top)
+            await voice_manager.stop_tts()
+            voice_manager.close()
+    finally:
+        tracemalloc.stop()
+        os.chdir(previous_cwd)
+        mock.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+        shutil.rmtree(bin_dir, ignore_errors=True)
+
+    analysis = trends(samples, args.warmup)
+    return {
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'counters': counters,
+        'upstream_requests': mock.requests,
+        'trends': analysis,
+        'suspects': [metric for metric, trend in analysis.items() if trend['suspect']],
+        'top_growth': growth,
+        'samples': samples,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de larga duración (fugas de memoria y recursos)")
+    parser.add_argument('--duration', type=float, default=3600, help="segundos de prueba")
+    parser.add_argument('--interval', type=float, default=60, help="segundos entre muestras")
+    parser.add_argument('--warmup', type=float, default=300,
+                        help="segundos iniciales que no entran en las tendencias ni en top_growth")
+    parser.add_argument('--pause', type=float, default=0.05, help="pausa entre comandos (s)")
+    parser.add_argument('--latency', type=float, default=0.05, help="latencia LLM/STT simulada (s)")
+    parser.add_argument('--mcp-latency', type=float, default=0.01)
+    parser.add_argument('--voice-every', type=int, default=5,
+                        help="pasar por grabación + STT + TTS cada N comandos (0 = nunca)")
+    parser.add_argument('--frames', type=int, default=1, help="profundidad de pila de tracemalloc")
+    parser.add_argument('--top', type=int, default=15, help="asignaciones que más crecen a mostrar")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', default='-', help="archivo JSON de salida (- = stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(run_soak(args))
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"📊 Resultados en {args.output}", file=sys.stderr)
+    if result['suspects']:
+        print(f"⚠️ Posibles fugas: {', '.join(result['suspects'])}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Speculation - Intent anticipado a partir de transcripciones parciales
+Mientras el STT por trozos sigue transcribiendo, cada texto parcial se intenta
+resolver (índice local y, si se activa, el router LLM) y las acciones previstas
+se "precalientan" en su MCP: búsqueda de Spotify o YouTube ya lanzada. Nada de
+eso tiene efectos visibles: la acción real solo se ejecuta cuando el transcript
+final confirma el intent, y entonces encuentra el trabajo hecho. Solo el modo
+voz alimenta y cierra la especulación (process_command(..., spoken=True)).
+
+Los MCPs que quieran participar definen:
+    async def prewarm(self, action: str, params: dict): ...
+"""
+import asyncio
+import json
+from typing import Optional
+
+import deadline
+from text_utils import normalize
+
+
+class IntentSpeculator:
+    """Resuelve intents de textos parciales y precalienta los MCPs previstos
+
+    use_llm: además del índice local, lanzar el router LLM sobre cada parcial
+    (gasta tokens; si el texto final coincide, su plan se reutiliza)
+    min_words: parciales más cortos no se intentan
+    """
+
+    def __init__(self, assistant, use_llm: bool = False, min_words: int = 2,
+                 max_prewarms: int = 8):
+        self.assistant = assistant
+        self.use_llm = use_llm
+        self.min_words = min_words
+        self.max_prewarms = max_prewarms
+        self._seen = set()
+        self._routing = {}
+        self._prewarmed = set()
+        self._tasks = set()
+        self.stats = {'partials': 0, 'predicted': 0, 'prewarmed': 0, 'reused_plans': 0,
+                      'confirmed': 0, 'discarded': 0}
+
+    def on_partial(self, text: str):
+        """Texto parcial nuevo (llamar desde el event loop)"""
+        self.stats['partials'] += 1
+        command = self.assistant._strip_wake_word(text)
+        key = normalize(command)
+        if len(key.split()) < self.min_words or key in self._seen:
+            return
+        self._seen.add(key)
+
+        plan = None
+        if self.assistant.intent_index:
+            plan = self.assistant.intent_index.lookup(command, record=False)
+        if plan:
+            self.stats['predicted'] += 1
+            self._prewarm(plan)
+        elif self.use_llm:
+            self._routing[key] = self._spawn(self._route(command))
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _route(self, command: str) -> tuple:
+        routed = {}
+        with deadline.scope(self.assistant.command_timeout):
+            plan = await self.assistant._analyze_for_mcp(command, report=routed)
+        if plan:
+            self.stats['predicted'] += 1
+            self._prewarm(plan)
+        return plan, routed.get('complete', False)
+
+    def _prewarm(self, plan: list):
+        """Lanza el prewarm de cada acción del plan (una vez por acción y parámetros)"""
+        for action in plan:
+            mcp = self.assistant.mcps.get(str(action.get('mcp', '')).split('.')[0])
+            hook = getattr(mcp, 'prewarm', None)
+            if hook is None or len(self._prewarmed) >= self.max_prewarms:
+                continue
+            params = dict(action.get('params') or {})
+            signature = (action.get('mcp'), action.get('action'),
+                         json.dumps(params, sort_keys=True, default=str))
+            if signature in self._prewarmed:
+                continue
+            self._prewarmed.add(signature)
+            self.stats['prewarmed'] += 1
+            self._spawn(self._run_hook(hook, action.get('action', ''), params))
+
+    @staticmethod
+    async def _run_hook(hook, action: str, params: dict):
+        try:
+            await hook(action, params)
+        except Exception:
+            pass  # Especulativo: si falla, la acción real lo hará por su cuenta
+
+    async def claim(self, command: str) -> tuple:
+        """(True, plan, completo) si ya se estaba resolviendo exactamente este texto
+
+        Si no, (False, None, False). completo es False si el router se cortó a medias.
+        """
+        task = self._routing.pop(normalize(command), None)
+        if task is None:
+            return False, None, False
+        try:
+            plan, complete = await asyncio.shield(task)
+        except Exception:
+            return False, None, False
+        self.stats['reused_plans'] += 1
+        return True, plan, complete
+
+    def settle(self, plan: Optional[list]):
+        """El transcript final ya tiene intent: contabiliza aciertos y olvida lo especulado"""
+        final = {(a.get('mcp'), a.get('action')) for a in plan or []}
+        predicted = {(mcp, action) for mcp, action, _ in self._prewarmed}
+        if predicted:
+            self.stats['confirmed' if predicted & final else 'discarded'] += 1
+        for task in self._routing.values():
+            task.cancel()
+        self._routing.clear()
+        self._seen.clear()
+        self._prewarmed.clear()
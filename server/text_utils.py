@@ -0,0 +1,14 @@
+"""
+Text Utils - Normalización de texto compartida
+La usan el índice de intents, la especulación y los MCPs para comparar lo que
+dice el usuario sin depender de mayúsculas, tildes ni puntuación.
+"""
+import re
+import unicodedata
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sin tildes ni puntuación, espacios simples"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', text))
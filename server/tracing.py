@@ -0,0 +1,213 @@
+"""
+Tracing - Spans con tiempo e histogramas de latencia en memoria
+Desactivado no cuesta casi nada: los decoradores llaman directo a la función
+
+Uso:
+    @tracing.traced('llm.analyze')
+    async def _analyze_for_mcp(...): ...
+
+    with tracing.span('mcp.spotify.play'):
+        ...
+"""
+import asyncio
+import functools
+import json
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+ENABLED = False
+
+# Límites superiores de los buckets en ms (escala aproximadamente logarítmica)
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, float('inf')]
+
+# Evita que nombres generados por el LLM creen histogramas sin límite
+MAX_HISTOGRAMS = 256
+
+
+class Histogram:
+    """Histograma de latencias con buckets fijos"""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.min_ms = float('inf')
+        self.max_ms = 0.0
+
+    def record(self, ms: float, error: bool = False):
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.errors += error
+        self.total_ms += ms
+        self.min_ms = min(self.min_ms, ms)
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, pct: float) -> float:
+        """Estimación por bucket: devuelve el límite superior del bucket que contiene el percentil"""
+        if not self.count:
+            return 0.0
+        target = pct / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "min_ms": round(self.min_ms, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "buckets": {("+Inf" if b == float('inf') else str(b)): c
+                        for b, c in zip(BUCKETS_MS, self.counts)},
+        }
+
+
+_histograms = {}
+# Reentrante: un volcado por señal puede interrumpir a record() en el mismo hilo
+_lock = threading.RLock()
+
+
+def enable(enabled: bool = True):
+    """Activa o desactiva la instrumentación en caliente"""
+    global ENABLED
+    ENABLED = enabled
+
+
+def record(name: str, ms: float, error: bool = False):
+    """Registra una duración en el histograma de name"""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            if len(_histograms) >= MAX_HISTOGRAMS:
+                name = 'other'
+                histogram = _histograms.get(name)
+            if histogram is None:
+                histogram = _histograms[name] = Histogram()
+        histogram.record(ms, error)
+
+
+@contextmanager
+def _timed(name: str):
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record(name, (time.perf_counter() - start) * 1000, error)
+
+
+@contextmanager
+def _noop():
+    yield
+
+
+def span(name: str):
+    """Context manager que mide el bloque (no hace nada si el tracing está apagado)"""
+    if not ENABLED:
+        return _noop()
+    return _timed(name)
+
+
+def traced(name: str):
+    """Decorador para funciones sync o async"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not ENABLED:
+                    return await func(*args, **kwargs)
+                with _timed(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _timed(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot() -> dict:
+    """Copia de todos los histogramas como dict serializable"""
+    with _lock:
+        return {name: h.to_dict() for name, h in sorted(_histograms.items())}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def dump(file=None):
+    """Escribe los histogramas como JSON (por defecto a stderr)"""
+    file = file or sys.stderr
+    file.write(json.dumps({"enabled": ENABLED, "spans": snapshot()}, indent=2) + "\n")
+    file.flush()
+
+
+def install_signal_handler(signum=None):
+    """Vuelca los histogramas al recibir la señal (SIGUSR1 por defecto: kill -USR1 <pid>)
+
+    Con un event loop en marcha el volcado corre como callback del loop, fuera
+    del frame que interrumpió la señal.
+    """
+    signum = signum or getattr(signal, 'SIGUSR1', None)
+    if signum is None:
+        return False  # Windows
+    try:
+        asyncio.get_running_loop().add_signal_handler(signum, dump)
+    except RuntimeError:
+        signal.signal(signum, lambda *_: dump())
+    return True
+
+
+async def serve_metrics(host: str = '127.0.0.1', port: int = 9464):
+    """Endpoint HTTP mínimo: GET /metrics devuelve los histogramas en JSON"""
+    async def handle(reader, writer):
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+            body = json.dumps({"enabled": ENABLED, "spans": snapshot()}).encode('utf-8')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                         + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                         + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"📈 Métricas en http://{host}:{port}/metrics")
+    return server
+
+
+async def configure(config: dict):
+    """Aplica la sección "tracing" de la configuración"""
+    enable(config.get('enabled', False))
+    if not ENABLED:
+        return None
+    install_signal_handler()
+    if config.get('metrics_port'):
+        return await serve_metrics(config.get('metrics_host', '127.0.0.1'), config['metrics_port'])
+    return None
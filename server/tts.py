@@ -0,0 +1,324 @@
+"""
+TTS - Cola de voz no bloqueante con caché de frases e interrupción (barge-in)
+La reproducción corre en una tarea aparte; un comando nuevo corta lo que se esté diciendo
+"""
+import asyncio
+import collections
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from typing import Awaitable, Callable, List, Optional
+
+import deadline
+
+
+# Segundos tras terminar una locución en los que el micro aún puede captar su eco
+ECHO_TAIL = 1.0
+
+# Reproductores de WAV por orden de preferencia (el primero instalado gana)
+PLAYERS = [
+    ['paplay'],
+    ['aplay', '-q'],
+    ['play', '-q'],
+    ['mpv', '--no-video', '--really-quiet'],
+    ['ffplay', '-nodisp', '-autoexit', '-loglevel', 'quiet'],
+]
+
+
+def find_player() -> Optional[List[str]]:
+    """Primer reproductor disponible en PATH"""
+    for player in PLAYERS:
+        if shutil.which(player[0]):
+            return player
+    return None
+
+
+def command_synthesizer(language: str = 'es') -> Optional[Callable[[str, str], Awaitable[bool]]]:
+    """Sintetizador a WAV con espeak-ng/espeak o pico2wave, si alguno está instalado"""
+    if shutil.which('espeak-ng') or shutil.which('espeak'):
+        binary = 'espeak-ng' if shutil.which('espeak-ng') else 'espeak'
+        build = lambda text, out: [binary, '-v', language, '-w', out, text]
+    elif shutil.which('pico2wave'):
+        voice = {'es': 'es-ES', 'en': 'en-US'}.get(language, language)
+        build = lambda text, out: ['pico2wave', '-l', voice, '-w', out, text]
+    else:
+        return None
+
+    async def synthesize(text: str, out_path: str) -> bool:
+        process = await asyncio.create_subprocess_exec(
+            *build(text, out_path),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True
+        )
+        await deadline.communicate(process, cap=30)
+        return process.returncode == 0 and os.path.getsize(out_path) > 0
+
+    return synthesize
+
+
+class PhraseCache:
+    """Caché en disco de audio sintetizado, acotada en bytes (expulsa lo menos usado)"""
+
+    def __init__(self, directory: str = None, max_bytes: int = 20 * 1024 * 1024, voice: str = ''):
+        base = os.getenv('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+        self.directory = directory or os.path.join(base, 'asistente-movil', 'tts')
+        self.max_bytes = max_bytes
+        self.voice = voice
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, text: str) -> str:
+        digest = hashlib.sha1(f"{self.voice}\0{text.strip()}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.wav")
+
+    def get(self, text: str) -> Optional[str]:
+        """Ruta del audio si está en caché (y lo marca como usado)"""
+        path = self.path_for(text)
+        if not os.path.exists(path):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    async def store(self, text: str, synthesize: Callable[[str, str], Awaitable[bool]]) -> Optional[str]:
+        """Sintetiza text a un temporal y lo mueve a la caché de forma atómica"""
+        path = self.path_for(text)
+        fd, tmp_path = tempfile.mkstemp(suffix='.wav', dir=self.directory)
+        os.close(fd)
+        try:
+            if not await synthesize(text, tmp_path):
+                return None
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evict()
+        return path
+
+    def _evict(self):
+        """Borra los archivos usados hace más tiempo hasta quedar bajo max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.wav'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                total -= size
+            except OSError:
+                pass
+
+
+class TTSQueue:
+    """Cola de locuciones que se reproduce en segundo plano
+
+    live_command(text) → argv que habla directamente (p.ej. termux-tts-speak)
+    synthesizer(text, ruta) genera un WAV; player es el argv que lo reproduce
+    fallback(text) es una función bloqueante de último recurso (se corre en un hilo);
+    fallback_stop() la corta desde otro hilo
+    """
+
+    def __init__(self, live_command: Callable[[str], List[str]] = None,
+                 synthesizer: Callable[[str, str], Awaitable[bool]] = None,
+                 player: List[str] = None, cache: PhraseCache = None,
+                 fallback: Callable[[str], None] = None,
+                 fallback_stop: Callable[[], None] = None, max_phrase_chars: int = 80):
+        self.live_command = live_command
+        self.synthesizer = synthesizer
+        self.player = player
+        self.cache = cache if (synthesizer and player) else None
+        self.fallback = fallback
+        self.fallback_stop = fallback_stop
+        self.max_phrase_chars = max_phrase_chars
+        self.queue = asyncio.Queue()
+        # interrupt() la incrementa: lo sintetizado para una generación anterior no suena
+        self.generation = 0
+        self._playing = 0
+        self._play_started = 0.0
+        # (inicio, fin) de las últimas reproducciones, para el filtro de eco
+        self._spans = collections.deque(maxlen=16)
+        self._in_fallback = False
+        self._current = None
+        # Futuro de say() de la locución en curso: se resuelve al empezar a sonar
+        self._starting = None
+        self._worker_task = None
+        self._background = set()
+        self.stats = {'spoken': 0, 'cache_hits': 0, 'cache_misses': 0, 'interrupted': 0}
+
+    def start(self, prewarm: List[str] = None):
+        """Arranca la reproducción y, si se indica, precalienta esas frases en segundo plano"""
+        if self._worker_task is None:
+            self._worker_task = asyncio.create_task(self._worker())
+        if prewarm:
+            self._in_background(self.prewarm(prewarm))
+
+    async def close(self):
+        self.interrupt()
+        for task in [self._worker_task, *self._background]:
+            if task:
+                task.cancel()
+        await asyncio.gather(*[t for t in [self._worker_task, *self._background] if t],
+                             return_exceptions=True)
+        self._worker_task = None
+
+    def say(self, text: str) -> asyncio.Future:
+        """Encola una locución y vuelve al instante
+
+        El futuro devuelto pasa a True cuando empieza a sonar, o a False si se
+        descarta (interrupt(), fallo de síntesis) sin llegar a sonar.
+        """
+        started = asyncio.get_running_loop().create_future()
+        if text:
+            self.queue.put_nowait((text, started))
+        else:
+            started.set_result(False)
+        return started
+
+    def interrupt(self):
+        """Barge-in: descarta lo pendiente y corta lo que está sonando o sintetizándose"""
+        self.generation += 1
+        dropped = 0
+        while not self.queue.empty():
+            _, started = self.queue.get_nowait()
+            if not started.done():
+                started.set_result(False)
+            dropped += 1
+        if self._current is not None and self._current.returncode is None:
+            deadline.kill_process(self._current)
+            dropped += 1
+        if self._in_fallback and self.fallback_stop:
+            try:
+                self.fallback_stop()
+            except Exception:
+                pass
+            dropped += 1
+        self.stats['interrupted'] += dropped
+
+    def spoke_during(self, start: float, end: float) -> bool:
+        """True si algo sonaba (o quedaba su eco) entre start y end (time.monotonic)"""
+        if self._playing > 0 and self._play_started <= end:
+            return True
+        return any(began <= end and ended + ECHO_TAIL >= start for began, ended in self._spans)
+
+    def _playback_started(self):
+        if self._starting is not None and not self._starting.done():
+            self._starting.set_result(True)
+        if self._playing == 0:
+            self._play_started = time.monotonic()
+        self._playing += 1
+
+    def _playback_ended(self):
+        self._playing -= 1
+        if self._playing == 0:
+            self._spans.append((self._play_started, time.monotonic()))
+
+    async def prewarm(self, phrases: List[str]):
+        """Sintetiza en segundo plano las frases frecuentes que falten en la caché"""
+        if not self.cache:
+            return
+        for phrase in phrases:
+            if not self.cache.get(phrase):
+                try:
+                    await self.cache.store(phrase, self.synthesizer)
+                except Exception:
+                    pass
+
+    def _cacheable(self, text: str) -> bool:
+        return self.cache is not None and len(text) <= self.max_phrase_chars
+
+    async def _worker(self):
+        while True:
+            text, self._starting = await self.queue.get()
+            try:
+                await self._speak(text, self.generation)
+                self.stats['spoken'] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ TTS: {e}")
+            finally:
+                if not self._starting.done():
+                    self._starting.set_result(False)
+                self._starting = None
+
+    async def _speak(self, text: str, generation: int):
+        cached = self.cache.get(text) if self._cacheable(text) else None
+        if cached:
+            self.stats['cache_hits'] += 1
+            await self._run([*self.player, cached], generation)
+            return
+        if self._cacheable(text):
+            self.stats['cache_misses'] += 1
+
+        if self.live_command:
+            if self._cacheable(text):
+                # La próxima vez sonará desde la caché
+                self._in_background(self.prewarm([text]))
+            await self._run(self.live_command(text), generation)
+        elif self.synthesizer and self.player:
+            if self._cacheable(text):
+                path = await self.cache.store(text, self.synthesizer)
+                if path:
+                    await self._run([*self.player, path], generation)
+                return
+            fd, path = tempfile.mkstemp(suffix='.wav')
+            os.close(fd)
+            try:
+                if await self.synthesizer(text, path):
+                    await self._run([*self.player, path], generation)
+            finally:
+                os.remove(path)
+        elif self.fallback and generation == self.generation:
+            self._in_fallback = True
+            self._playback_started()
+            try:
+                await asyncio.to_thread(self.fallback, text)
+            finally:
+                self._in_fallback = False
+                self._playback_ended()
+
+    def _in_background(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _run(self, argv: List[str], generation: int):
+        """Reproduce y espera; interrupt() mata el proceso
+
+        Si hubo un interrupt() desde que se sacó la locución de la cola (p.ej.
+        mientras se sintetizaba), no se reproduce.
+        """
+        if generation != self.generation:
+            return
+        self._playback_started()
+        try:
+            self._current = await asyncio.create_subprocess_exec(
+                *argv,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                start_new_session=True
+            )
+            if generation != self.generation:
+                # interrupt() llegó mientras arrancaba el reproductor
+                deadline.kill_process(self._current)
+            try:
+                await self._current.wait()
+            except asyncio.CancelledError:
+                deadline.kill_process(self._current)
+                raise
+            finally:
+                self._current = None
+        finally:
+            self._playback_ended()
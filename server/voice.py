@@ -2,18 +2,327 @@
 Voice Manager - Speech-to-Text y Text-to-Speech
 Soporta múltiples backends para máxima compatibilidad
 """
+import asyncio
+import collections
+import io
 import os
+import queue
+import re
 import subprocess
 import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import audio_analysis
+import deadline
+from capture import CaptureDaemon
+import tracing
+from tts import PhraseCache, TTSQueue, command_synthesizer, find_player
+
+
+# Frases fijas que se sintetizan al arrancar para que suenen al instante
+COMMON_PHRASES = [
+    "¿En qué puedo ayudarte?",
+    "¡Hasta luego!",
+    "⏸️ Pausado",
+    "▶️ Reproducción reanudada",
+    "⏱️ Lo siento, eso está tardando demasiado. Inténtalo de nuevo.",
+]
+
+
+class MicrophoneStream:
+    """Micrófono abierto de forma continua con suelo de ruido adaptativo y pre-roll
+
+    Un hilo lee bloques sin parar: calibra el ruido una sola vez al arrancar, lo
+    actualiza con los bloques sin voz y guarda los últimos preroll_seconds para
+    que el inicio de la frase no se pierda.
+    """
+    
+    def __init__(self, microphone, calibrate_seconds: float = 1.0, preroll_seconds: float = 0.5,
+                 speech_ratio: float = 2.5, noise_adapt: float = 0.05):
+        self.microphone = microphone
+        self.calibrate_seconds = calibrate_seconds
+        self.speech_ratio = speech_ratio
+        self.noise_adapt = noise_adapt
+        self.preroll_seconds = preroll_seconds
+        self.noise_floor = None
+        self.source = None
+        self.speech_span = None
+        self._preroll = None
+        self._frames = None
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+    
+    @property
+    def seconds_per_chunk(self) -> float:
+        return self.source.CHUNK / self.source.SAMPLE_RATE
+    
+    def start(self):
+        """Abre el micrófono (una sola vez) y calibra el ruido"""
+        if self._running:
+            return
+        self.source = self.microphone.__enter__()
+        self._preroll = collections.deque(
+            maxlen=max(1, int(self.preroll_seconds / self.seconds_per_chunk)))
+        
+        # Calibración única (antes se hacía 0.5s en cada escucha)
+        chunks = max(1, int(self.calibrate_seconds / self.seconds_per_chunk))
+        energies = [audio_analysis.block_rms(self._read(), self.source.SAMPLE_WIDTH)
+                    for _ in range(chunks)]
+        self.noise_floor = sum(energies) / len(energies)
+        
+        self._running = True
+        self._thread = threading.Thread(target=self._reader, daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        if self.source is not None:
+            self.microphone.__exit__(None, None, None)
+            self.source = None
+    
+    def _read(self) -> bytes:
+        return self.source.stream.read(self.source.CHUNK)
+    
+    def _reader(self):
+        """Hilo lector: pre-roll, ruido adaptativo y entrega a quien esté escuchando"""
+        while self._running:
+            try:
+                frame = self._read()
+            except Exception:
+                time.sleep(0.05)
+                continue
+            # Energía sobre el umbral y, con NumPy, espectro de voz (no ruido plano)
+            energy, is_speech = audio_analysis.is_speech_block(
+                frame, self.source.SAMPLE_RATE, self.source.SAMPLE_WIDTH,
+                max(self.noise_floor, 50.0), self.speech_ratio)
+            if not is_speech:
+                # El suelo de ruido sigue al ambiente solo con bloques sin voz
+                self.noise_floor += self.noise_adapt * (energy - self.noise_floor)
+            stamp = time.monotonic()
+            with self._lock:
+                if self._frames is not None:
+                    self._frames.put((frame, is_speech, stamp))
+                else:
+                    self._preroll.append((frame, is_speech, stamp))
+    
+    def capture(self, timeout: float = 5, phrase_time_limit: float = 10,
+                pause_seconds: float = 0.8,
+                on_frame: Optional[Callable[[bytes, bool], None]] = None) -> bytes:
+        """Espera el inicio de voz (hasta timeout) y devuelve la frase PCM con su pre-roll
+        
+        on_frame recibe cada bloque de la frase en cuanto se graba (para procesar en vivo)
+        speech_span queda con (inicio de la voz, último bloque) en time.monotonic
+        """
+        self.speech_span = None
+        with self._lock:
+            preroll = list(self._preroll)
+            self._preroll.clear()
+            self._frames = queue.Queue()
+        try:
+            frames = [frame for frame, _, _ in preroll]
+            onset = next((stamp for _, speech, stamp in preroll if speech), None)
+            last = preroll[-1][2] if preroll else None
+            if onset is not None and on_frame:
+                for frame, speech, _ in preroll:
+                    on_frame(frame, speech)
+            start = time.monotonic()
+            speech_start = start if onset is not None else None
+            silence = 0.0
+            while True:
+                now = time.monotonic()
+                if speech_start is None and now - start > timeout:
+                    return b''
+                if speech_start is not None and now - speech_start > phrase_time_limit:
+                    break
+                try:
+                    frame, is_speech, last = self._frames.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if speech_start is None:
+                    frames.append(frame)
+                    # Mantener solo el pre-roll mientras no haya voz
+                    frames = frames[-self._preroll.maxlen:]
+                    if is_speech:
+                        speech_start = now
+                        onset = last
+                        if on_frame:
+                            for pending in frames:
+                                on_frame(pending, True)
+                    continue
+                frames.append(frame)
+                if on_frame:
+                    on_frame(frame, is_speech)
+                silence = 0.0 if is_speech else silence + self.seconds_per_chunk
+                if silence >= pause_seconds:
+                    break
+            self.speech_span = (onset, last)
+            return b''.join(frames)
+        finally:
+            with self._lock:
+                self._frames = None
+
+
+def pcm_to_wav(pcm: bytes, rate: int, width: int = 2) -> bytes:
+    """Envuelve PCM mono en un WAV en memoria"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(width)
+        wav.setframerate(rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def _words(text: str) -> list:
+    return re.findall(r"\w+", text.lower())
+
+
+def stitch_transcripts(texts: list, max_overlap_words: int = 6) -> str:
+    """Une transcripciones de trozos solapados quitando las palabras repetidas en cada costura"""
+    result = ''
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        if result:
+            tail, head = _words(result), _words(text)
+            tokens = text.split()
+            for k in range(min(max_overlap_words, len(tail), len(head)), 0, -1):
+                if tail[-k:] == head[:k]:
+                    # Saltar los tokens del texto que cubren esas k palabras
+                    covered, skip = 0, 0
+                    while skip < len(tokens) and covered < k:
+                        covered += len(_words(tokens[skip]))
+                        skip += 1
+                    text = ' '.join(tokens[skip:])
+                    break
+        result = f"{result} {text}".strip() if text else result
+    return result
+
+
+class ChunkedTranscriber:
+    """Transcribe una frase larga por trozos mientras todavía se está grabando
+
+    Los bloques PCM llegan con feed(); al ver un silencio tras min_chunk_seconds
+    (o al llegar a max_chunk_seconds) el trozo se sube en paralelo, con hasta
+    max_parallel subidas a la vez. Cada trozo arranca con overlap_seconds del
+    anterior y las palabras repetidas se quitan al unir.
+    """
+    
+    def __init__(self, transcribe: Callable[[bytes], str], rate: int, width: int = 2,
+                 max_parallel: int = 3, min_chunk_seconds: float = 4.0,
+                 max_chunk_seconds: float = 15.0, split_silence_seconds: float = 0.35,
+                 overlap_seconds: float = 0.3,
+                 on_partial: Optional[Callable[[str], None]] = None):
+        self.transcribe = transcribe
+        self.rate = rate
+        self.width = width
+        self.bytes_per_second = rate * width
+        self.min_chunk_bytes = int(min_chunk_seconds * self.bytes_per_second)
+        self.max_chunk_bytes = int(max_chunk_seconds * self.bytes_per_second)
+        self.split_silence_bytes = int(split_silence_seconds * self.bytes_per_second)
+        self.overlap_bytes = int(overlap_seconds * self.bytes_per_second) // width * width
+        self.on_partial = on_partial
+        self._pool = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix='stt-chunk')
+        self._futures = []
+        self._results = []
+        self._lock = threading.Lock()
+        self._chunk = bytearray()
+        self._trailing_silence = 0
+        self._fresh = 0
+    
+    def feed(self, frame: bytes, is_speech: bool):
+        """Añade un bloque; corta y sube el trozo si toca"""
+        self._chunk += frame
+        self._fresh += len(frame)
+        self._trailing_silence = 0 if is_speech else self._trailing_silence + len(frame)
+        
+        at_silence = (len(self._chunk) >= self.min_chunk_bytes
+                      and self._trailing_silence >= self.split_silence_bytes)
+        if at_silence or len(self._chunk) >= self.max_chunk_bytes:
+            self._submit()
+    
+    def _submit(self):
+        if not self._fresh:
+            return
+        chunk = bytes(self._chunk)
+        index = len(self._futures)
+        self._results.append(None)
+        future = self._pool.submit(self.transcribe, pcm_to_wav(chunk, self.rate, self.width))
+        future.add_done_callback(lambda f, i=index: self._on_done(i, f))
+        self._futures.append(future)
+        # El siguiente trozo empieza con el final de este (la costura se resuelve al unir)
+        self._chunk = bytearray(chunk[-self.overlap_bytes:]) if self.overlap_bytes else bytearray()
+        self._fresh = 0
+        self._trailing_silence = 0
+    
+    def _on_done(self, index: int, future):
+        try:
+            text = future.result()
+        except Exception:
+            text = ''
+        with self._lock:
+            self._results[index] = text
+            # Texto parcial: solo el prefijo de trozos ya resueltos, en orden
+            ready = []
+            for result in self._results:
+                if result is None:
+                    break
+                ready.append(result)
+        if self.on_partial and ready:
+            try:
+                self.on_partial(stitch_transcripts(ready))
+            except Exception:
+                pass
+    
+    def finish(self) -> str:
+        """Sube lo que queda, espera todos los trozos y devuelve el texto completo"""
+        self._submit()
+        for future in self._futures:
+            try:
+                future.result()
+            except Exception:
+                pass
+        self._pool.shutdown(wait=False)
+        with self._lock:
+            return stitch_transcripts([r or '' for r in self._results])
+    
+    def cancel(self):
+        for future in self._futures:
+            future.cancel()
+        self._pool.shutdown(wait=False)
+    
+    @property
+    def chunks(self) -> int:
+        return len(self._futures)
 
 
 class VoiceManager:
     """Maneja entrada y salida de voz (PC/Generic)"""
     
-    def __init__(self, language: str = 'es'):
+    def __init__(self, language: str = 'es', persistent_mic: bool = True,
+                 stt_backend: str = 'google', api_base: str = None,
+                 phrase_time_limit: float = 10, stt_parallel: int = 3,
+                 preroll_seconds: float = 0.5):
         self.language = language
         self.stt_engine = None
         self.tts_engine = None
+        self.tts_queue = None
+        self.persistent_mic = persistent_mic
+        self.mic_stream = None
+        # 'whisper' transcribe con Groq por trozos mientras se graba (dictados largos)
+        self.stt_backend = stt_backend
+        self.api_base = (api_base or 'https://api.groq.com/openai/v1').rstrip('/')
+        self.phrase_time_limit = phrase_time_limit
+        self.stt_parallel = stt_parallel
+        self.preroll_seconds = preroll_seconds
         
         self._init_stt()
         self._init_tts()
@@ -42,25 +351,181 @@ class VoiceManager:
         except Exception:
             pass
     
-    def listen(self, timeout: int = 5) -> str:
-        """Escucha y convierte voz a texto"""
+    @tracing.traced('voice.listen')
+    def listen(self, timeout: int = 5, on_partial: Callable[[str], None] = None) -> str:
+        """Escucha y convierte voz a texto
+
+        on_partial recibe el texto parcial a medida que se transcriben los trozos
+        (solo con STT por trozos; se llama desde hilos del transcriptor)
+        """
         if not self.stt_engine:
             return input("🎤 (Escribe aquí): ")
         
         import speech_recognition as sr
         try:
-            with self.microphone as source:
-                print("🎤 Escuchando...")
-                self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                audio = self.recognizer.listen(source, timeout=timeout, phrase_time_limit=10)
+            if self.persistent_mic and self.stt_backend == 'whisper':
+                return self._listen_chunked(timeout, on_partial)
+            
+            if self.persistent_mic:
+                audio = self._capture_persistent(timeout)
+                if audio is None:
+                    return ""
+            else:
+                with self.microphone as source, tracing.span('voice.record'):
+                    print("🎤 Escuchando...")
+                    self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                    audio = self.recognizer.listen(source, timeout=timeout,
+                                                   phrase_time_limit=self.phrase_time_limit)
             
             print("🔄 Procesando...")
-            text = self.recognizer.recognize_google(audio, language=self.language)
+            with tracing.span('voice.stt_google'):
+                text = self.recognizer.recognize_google(audio, language=self.language)
             print(f"📝 Escuché: {text}")
             return text
         except Exception:
             return ""
     
+    def _ensure_mic_stream(self) -> MicrophoneStream:
+        if self.mic_stream is None:
+            print("🎚️ Calibrando ruido ambiente...")
+            self.mic_stream = MicrophoneStream(self.microphone,
+                                               preroll_seconds=self.preroll_seconds)
+            self.mic_stream.start()
+        return self.mic_stream
+    
+    def _capture_persistent(self, timeout: int):
+        """Captura con el micrófono siempre abierto (sin recalibrar ni reabrir)"""
+        import speech_recognition as sr
+        self._ensure_mic_stream()
+        
+        with tracing.span('voice.record'):
+            print("🎤 Escuchando...")
+            pcm = self.mic_stream.capture(timeout=timeout, phrase_time_limit=self.phrase_time_limit)
+        if not pcm:
+            return None
+        source = self.mic_stream.source
+        if audio_analysis.HAS_NUMPY:
+            pcm = self._trim_silence(pcm, source.SAMPLE_WIDTH, source.SAMPLE_RATE)
+            if not pcm:
+                return None
+        return sr.AudioData(pcm, source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+    
+    def _trim_silence(self, pcm: bytes, width: int, rate: int) -> bytes:
+        """Quita el silencio de los extremos (menos audio que subir)
+
+        Vectorizado con NumPy tarda milisegundos: corre en el hilo de listen().
+        """
+        try:
+            with tracing.span('voice.trim'):
+                start, end = audio_analysis.trim_bounds(pcm, rate, width,
+                                                        self.mic_stream.noise_floor)
+        except Exception as e:
+            print(f"⚠️ Recorte de silencio: {e}")
+            return pcm
+        return pcm[start:end]
+    
+    def _listen_chunked(self, timeout: int, on_partial: Callable[[str], None] = None) -> str:
+        """Graba y transcribe a la vez: los trozos se suben en cuanto hay un silencio"""
+        stream = self._ensure_mic_stream()
+        source = stream.source
+        transcriber = ChunkedTranscriber(self._transcribe_audio, source.SAMPLE_RATE,
+                                         source.SAMPLE_WIDTH, max_parallel=self.stt_parallel,
+                                         on_partial=on_partial)
+        with tracing.span('voice.record'):
+            print("🎤 Escuchando...")
+            pcm = stream.capture(timeout=timeout, phrase_time_limit=self.phrase_time_limit,
+                                 on_frame=transcriber.feed)
+        if not pcm:
+            transcriber.cancel()
+            return ""
+        
+        print("🔄 Procesando...")
+        with tracing.span('voice.stt_chunked'):
+            text = transcriber.finish()
+        if text:
+            print(f"📝 Escuché: {text} ({transcriber.chunks} trozos)")
+        return text
+    
+    def _transcribe_with_groq(self, audio_file: str) -> str:
+        """Transcribe un archivo de audio usando Groq Whisper API"""
+        with open(audio_file, 'rb') as f:
+            audio_data = f.read()
+        return self._transcribe_audio(audio_data)
+    
+    @tracing.traced('voice.transcribe')
+    def _transcribe_audio(self, audio_data: bytes) -> str:
+        """Transcribe audio (WAV en memoria) usando Groq Whisper API"""
+        import urllib.request
+        import urllib.error
+        import json
+        
+        # Leer API key desde variable de entorno o config
+        api_key = os.getenv('GROQ_API_KEY')
+        if not api_key:
+            # Intentar leer del config
+            try:
+                import json
+                with open('../configs/config.json', 'r') as f:
+                    config = json.load(f)
+                    api_key = config.get('llm', {}).get('api_key')
+            except:
+                pass
+        
+        if not api_key:
+            raise Exception("No se encontró GROQ_API_KEY")
+        
+        # Preparar multipart/form-data manualmente
+        boundary = '----WebKitFormBoundary7MA4YWxkTrZu0gW'
+        
+        # Construir body multipart
+        body_parts = []
+        
+        # Parte 1: file
+        body_parts.append(f'--{boundary}'.encode())
+        body_parts.append(b'Content-Disposition: form-data; name="file"; filename="audio.wav"')
+        body_parts.append(b'Content-Type: audio/wav')
+        body_parts.append(b'')
+        body_parts.append(audio_data)
+        
+        # Parte 2: model
+        body_parts.append(f'--{boundary}'.encode())
+        body_parts.append(b'Content-Disposition: form-data; name="model"')
+        body_parts.append(b'')
+        body_parts.append(b'whisper-large-v3-turbo')
+        
+        # Parte 3: language (opcional)
+        body_parts.append(f'--{boundary}'.encode())
+        body_parts.append(b'Content-Disposition: form-data; name="language"')
+        body_parts.append(b'')
+        body_parts.append(self.language.encode())
+        
+        # Fin
+        body_parts.append(f'--{boundary}--'.encode())
+        body_parts.append(b'')
+        
+        body = b'\r\n'.join(body_parts)
+        
+        # Hacer request
+        url = f'{self.api_base}/audio/transcriptions'
+        headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': f'multipart/form-data; boundary={boundary}',
+            'User-Agent': 'Mozilla/5.0 (Linux; Android 10) AppleWebKit/537.36',
+            'Accept': '*/*'
+        }
+        
+        req = urllib.request.Request(url, data=body, headers=headers, method='POST')
+        
+        try:
+            with urllib.request.urlopen(req, timeout=deadline.timeout(30)) as response:
+                result = json.loads(response.read().decode())
+                return result.get('text', '').strip()
+        except urllib.error.HTTPError as e:
+            error_body = e.read().decode()
+            raise Exception(f"Groq Whisper error: {error_body}")
+        except Exception as e:
+            raise Exception(f"Error transcribiendo: {e}")
+    
     def speak(self, text: str):
         """Convierte texto a voz"""
         if self.tts_engine:
@@ -71,20 +536,109 @@ class VoiceManager:
                 print(f"🔊 {text}")
         else:
             print(f"🔊 {text}")
+    
+    async def start_tts(self, prewarm: list = None, cache_mb: int = 20):
+        """Arranca la cola de voz no bloqueante y precalienta la caché de frases"""
+        self.tts_queue = self._build_tts_queue(cache_mb)
+        self.tts_queue.start(prewarm=COMMON_PHRASES + (prewarm or []))
+    
+    async def stop_tts(self):
+        if self.tts_queue:
+            await self.tts_queue.close()
+            self.tts_queue = None
+    
+    def close(self):
+        """Libera micrófono y captura continua"""
+        if self.mic_stream is not None:
+            self.mic_stream.stop()
+            self.mic_stream = None
+        if getattr(self, 'capture', None) is not None:
+            self.capture.stop()
+            self.capture = None
+    
+    def say(self, text: str) -> Optional[asyncio.Future]:
+        """Habla sin bloquear (encola); sin cola arrancada, cae en speak()
+
+        Con cola devuelve el futuro de TTSQueue.say() (True al empezar a sonar).
+        """
+        if self.tts_queue is None:
+            self.speak(text)
+            return None
+        return self.tts_queue.say(text)
+    
+    def interrupt(self):
+        """Corta lo que se esté diciendo (llega un comando nuevo)"""
+        if self.tts_queue:
+            self.tts_queue.interrupt()
+    
+    def heard_echo(self) -> bool:
+        """True si la última frase capturada se solapó con la voz de la respuesta (o su eco)
+
+        Solo con micro persistente, que sabe cuándo empezó y acabó la voz; en los
+        demás modos el micro no está abierto mientras suena la respuesta.
+        """
+        span = self.mic_stream.speech_span if self.mic_stream is not None else None
+        return self.tts_queue is not None and span is not None and self.tts_queue.spoke_during(*span)
+    
+    def _build_tts_queue(self, cache_mb: int) -> TTSQueue:
+        """PC: WAV con espeak/pico2wave o pyttsx3 + reproductor; si no hay, speak() en un hilo"""
+        synthesizer = command_synthesizer(self.language)
+        if synthesizer is None and self.tts_engine:
+            synthesizer = self._pyttsx3_synthesize
+        player = find_player()
+        cache = None
+        if synthesizer and player:
+            cache = PhraseCache(max_bytes=cache_mb * 1024 * 1024, voice=f"{self.language}")
+        return TTSQueue(synthesizer=synthesizer, player=player, cache=cache, fallback=self.speak,
+                        fallback_stop=self._stop_speaking)
+    
+    def _stop_speaking(self):
+        """Corta speak() desde otro hilo (barge-in sobre pyttsx3)"""
+        if self.tts_engine:
+            self.tts.stop()
+    
+    async def _pyttsx3_synthesize(self, text: str, out_path: str) -> bool:
+        """Sintetiza a archivo con pyttsx3 (bloqueante, en un hilo)"""
+        def run():
+            self.tts.save_to_file(text, out_path)
+            self.tts.runAndWait()
+            return os.path.exists(out_path) and os.path.getsize(out_path) > 0
+        return await asyncio.to_thread(run)
 
 
 class VoiceManagerTermux(VoiceManager):
     """Versión para Termux usando termux-microphone-record (más estable)"""
     
-    def __init__(self, language: str = 'es'):
+    def __init__(self, language: str = 'es', api_base: str = None,
+                 continuous_capture: bool = False, capture_seconds: float = 30,
+                 preroll_seconds: float = 0.5, phrase_time_limit: float = 10,
+                 stt_parallel: int = 3):
         self.language = language
+        self.tts_queue = None
+        self.api_base = (api_base or 'https://api.groq.com/openai/v1').rstrip('/')
+        self.preroll_seconds = preroll_seconds
+        self.phrase_time_limit = phrase_time_limit
+        self.stt_parallel = stt_parallel
+        self.mic_stream = None
+        self.capture = None
         print("📱 Voice Manager: Modo Termux (Whisper API)")
         
+        if continuous_capture:
+            # Un grabador fijo a un ring buffer en vez de termux-microphone-record por frase
+            daemon = CaptureDaemon(seconds=capture_seconds)
+            if daemon.available:
+                daemon.start()
+                self.capture = daemon
+                self.microphone = daemon.microphone()
+                print(f"🎙️ Captura continua: {daemon.command[0]} ({capture_seconds:.0f}s de ring)")
+            else:
+                print("⚠️ Sin parec/arecord: se graba por frase con termux-microphone-record")
+        
         # Verificar dependencias críticas
         import shutil
         missing = []
         
-        if not shutil.which('termux-microphone-record'):
+        if not shutil.which('termux-microphone-record') and self.capture is None:
             missing.append("termux-api (pkg install termux-api)")
             
         if missing:
@@ -96,8 +650,17 @@ class VoiceManagerTermux(VoiceManager):
         else:
             self.disabled = False
 
-    def listen(self, timeout: int = 5) -> str:
+    @tracing.traced('voice.listen')
+    def listen(self, timeout: int = 5, on_partial: Callable[[str], None] = None) -> str:
         """Graba audio a archivo y luego lo transcribe con Groq Whisper"""
+        if self.capture is not None:
+            # Captura continua: frase sacada del ring y transcrita por trozos
+            try:
+                return self._listen_chunked(timeout, on_partial)
+            except Exception as e:
+                print(f"❌ Error: {e}")
+                return ""
+        
         if getattr(self, 'disabled', False):
             return input("⌨️ (Falta termux-api) Escribe aquí: ")
             
@@ -115,14 +678,15 @@ class VoiceManagerTermux(VoiceManager):
             print(f"🎤 Escuchando... (habla por {timeout}s)")
             
             # Iniciar grabación
-            subprocess.run([
-                'termux-microphone-record',
-                '-l', str(timeout),
-                '-f', filename
-            ], check=True)
-            
-            # Esperar a que el archivo se escriba bien
-            time.sleep(0.5)
+            with tracing.span('voice.record'):
+                subprocess.run([
+                    'termux-microphone-record',
+                    '-l', str(timeout),
+                    '-f', filename
+                ], check=True)
+                
+                # Esperar a que el archivo se escriba bien
+                time.sleep(0.5)
             
             if not os.path.exists(filename) or os.path.getsize(filename) < 100:
                 print("❌ Audio vacío o no generado")
@@ -150,82 +714,6 @@ class VoiceManagerTermux(VoiceManager):
             if os.path.exists(filename):
                 os.remove(filename)
 
-    def _transcribe_with_groq(self, audio_file: str) -> str:
-        """Transcribe audio usando Groq Whisper API"""
-        import urllib.request
-        import urllib.error
-        import json
-        
-        # Leer API key desde variable de entorno o config
-        api_key = os.getenv('GROQ_API_KEY')
-        if not api_key:
-            # Intentar leer del config
-            try:
-                import json
-                with open('../configs/config.json', 'r') as f:
-                    config = json.load(f)
-                    api_key = config.get('llm', {}).get('api_key')
-            except:
-                pass
-        
-        if not api_key:
-            raise Exception("No se encontró GROQ_API_KEY")
-        
-        # Preparar multipart/form-data manualmente
-        boundary = '----WebKitFormBoundary7MA4YWxkTrZu0gW'
-        
-        with open(audio_file, 'rb') as f:
-            audio_data = f.read()
-        
-        # Construir body multipart
-        body_parts = []
-        
-        # Parte 1: file
-        body_parts.append(f'--{boundary}'.encode())
-        body_parts.append(b'Content-Disposition: form-data; name="file"; filename="audio.wav"')
-        body_parts.append(b'Content-Type: audio/wav')
-        body_parts.append(b'')
-        body_parts.append(audio_data)
-        
-        # Parte 2: model
-        body_parts.append(f'--{boundary}'.encode())
-        body_parts.append(b'Content-Disposition: form-data; name="model"')
-        body_parts.append(b'')
-        body_parts.append(b'whisper-large-v3-turbo')
-        
-        # Parte 3: language (opcional)
-        body_parts.append(f'--{boundary}'.encode())
-        body_parts.append(b'Content-Disposition: form-data; name="language"')
-        body_parts.append(b'')
-        body_parts.append(self.language.encode())
-        
-        # Fin
-        body_parts.append(f'--{boundary}--'.encode())
-        body_parts.append(b'')
-        
-        body = b'\r\n'.join(body_parts)
-        
-        # Hacer request
-        url = 'https://api.groq.com/openai/v1/audio/transcriptions'
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': f'multipart/form-data; boundary={boundary}',
-            'User-Agent': 'Mozilla/5.0 (Linux; Android 10) AppleWebKit/537.36',
-            'Accept': '*/*'
-        }
-        
-        req = urllib.request.Request(url, data=body, headers=headers, method='POST')
-        
-        try:
-            with urllib.request.urlopen(req, timeout=30) as response:
-                result = json.loads(response.read().decode())
-                return result.get('text', '').strip()
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode()
-            raise Exception(f"Groq Whisper error: {error_body}")
-        except Exception as e:
-            raise Exception(f"Error transcribiendo: {e}")
-
     def speak(self, text: str):
         """Habla usando termux-tts-speak"""
         print(f"🔊 {text}")
@@ -233,3 +721,13 @@ class VoiceManagerTermux(VoiceManager):
             subprocess.run(['termux-tts-speak', text], check=False)
         except Exception:
             pass
+    
+    def _build_tts_queue(self, cache_mb: int) -> TTSQueue:
+        """Termux: termux-tts-speak en vivo; caché si hay sintetizador a WAV y reproductor"""
+        synthesizer = command_synthesizer(self.language)
+        player = find_player()
+        cache = None
+        if synthesizer and player:
+            cache = PhraseCache(max_bytes=cache_mb * 1024 * 1024, voice=f"{self.language}")
+        return TTSQueue(live_command=lambda text: ['termux-tts-speak', text],
+                        synthesizer=synthesizer, player=player, cache=cache)
@@ -0,0 +1,5 @@
+"""Los módulos viven planos en server/ (así los importa main.py)"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
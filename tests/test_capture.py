@@ -0,0 +1,96 @@
+"""RingBuffer: vuelta al final, sobrescritura y lecturas concurrentes con el escritor"""
+import struct
+import threading
+import time
+
+import pytest
+
+from capture import RingBuffer
+
+
+def _ring(capacity_bytes: int) -> RingBuffer:
+    # 8 kHz, 16 bits: capacity_bytes / 16000 segundos
+    return RingBuffer(seconds=capacity_bytes / 16000, rate=8000, width=2)
+
+
+def test_read_inside_capacity():
+    ring = _ring(100)
+    ring.write(bytes(range(60)))
+    assert ring.read(10, 20) == bytes(range(10, 20))
+    assert ring.oldest == 0
+
+
+def test_wrap_returns_two_views():
+    ring = _ring(100)
+    ring.write(bytes(80))
+    ring.write(bytes(range(40)))
+    views = ring.views(80, 120)
+    assert len(views) == 2
+    assert b''.join(bytes(v) for v in views) == bytes(range(40))
+    assert ring.read(80, 120) == bytes(range(40))
+
+
+def test_write_larger_than_capacity_keeps_the_tail():
+    ring = _ring(100)
+    ring.write(bytes(i % 256 for i in range(250)))
+    assert ring.written == 250
+    assert ring.oldest == 150
+    assert ring.read(0, 250) == bytes(i % 256 for i in range(150, 250))
+
+
+def test_overwritten_start_is_clamped_and_invalid():
+    ring = _ring(100)
+    ring.write(bytes(150))
+    assert not ring.valid(20)
+    assert ring.valid(50)
+    assert ring.views(20, 60)[0].nbytes == 10
+
+
+def test_read_detects_write_announced_during_copy():
+    ring = _ring(100)
+    ring.write(bytes(100))
+    views = ring.views
+
+    def copy_while_writing(start, end):
+        # El escritor anuncia que va a pisar [0, 50) mientras se copia
+        found = views(start, end)
+        ring.writing = ring.written + 50
+        return found
+
+    ring.views = copy_while_writing
+    with pytest.raises(BufferError):
+        ring.read(0, 40)
+    assert ring.read(60, 100) == bytes(40)
+
+
+def test_concurrent_reads_never_return_torn_data():
+    """Un escritor dando vueltas sin parar: cada lectura es correcta o se rechaza"""
+    ring = RingBuffer(seconds=0.01, rate=16000)  # 320 bytes: vuelta constante
+    stop = threading.Event()
+
+    def writer():
+        n = 0
+        while not stop.is_set():
+            ring.write(struct.pack('<64H', *[(n + i) & 0xffff for i in range(64)]))
+            n += 64
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    corrupt = reads = 0
+    try:
+        until = time.monotonic() + 1.0
+        while time.monotonic() < until:
+            start = max(0, ring.written - ring.capacity + 64)
+            start -= start % 2
+            try:
+                data = ring.read(start, start + 100)
+            except BufferError:
+                continue
+            values = struct.unpack(f'<{len(data) // 2}H', data)
+            reads += 1
+            corrupt += any(b != (a + 1) & 0xffff for a, b in zip(values, values[1:]))
+    finally:
+        stop.set()
+        thread.join()
+    assert reads > 0
+    assert corrupt == 0
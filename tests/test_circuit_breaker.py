@@ -0,0 +1,78 @@
+"""CircuitBreaker: cerrado → abierto → semiabierto → cerrado (o abierto otra vez)"""
+import asyncio
+import time
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+async def _ok():
+    return 'ok'
+
+
+async def _boom():
+    raise OSError('caído')
+
+
+def _trip(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(OSError):
+            asyncio.run(breaker.call(_boom))
+
+
+def test_opens_after_threshold_and_fails_fast():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=30)
+    _trip(breaker)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.call(_ok))
+    assert breaker.stats['rejected'] == 1
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker('test', failure_threshold=2)
+    with pytest.raises(OSError):
+        asyncio.run(breaker.call(_boom))
+    assert asyncio.run(breaker.call(_ok)) == 'ok'
+    with pytest.raises(OSError):
+        asyncio.run(breaker.call(_boom))
+    assert breaker.state == CLOSED
+
+
+def test_half_open_trial_closes_on_success():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=30)
+    _trip(breaker)
+    breaker.retry_at = time.monotonic()
+    breaker.check()
+    assert breaker.state == HALF_OPEN
+    # Solo una llamada de prueba a la vez
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_failed_trial_reopens_with_doubled_wait():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=30, max_reset_timeout=50)
+    _trip(breaker)
+    breaker.retry_at = time.monotonic()
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.retry_at - time.monotonic() == pytest.approx(50, abs=1)
+
+
+def test_failed_result_and_slow_calls_count_as_failures():
+    breaker = CircuitBreaker('test', failure_threshold=3, slow_ms=1)
+    assert asyncio.run(breaker.call(_ok, failed_result=lambda r: r == 'ok')) == 'ok'
+    breaker.record_success(duration_ms=5)
+    assert breaker.failures == 2
+    assert breaker.stats['slow'] == 1
+
+
+def test_is_failure_filters_exceptions():
+    breaker = CircuitBreaker('test', failure_threshold=1)
+    with pytest.raises(OSError):
+        asyncio.run(breaker.call(_boom, is_failure=lambda e: False))
+    assert breaker.state == CLOSED
@@ -0,0 +1,38 @@
+"""IntentIndex: re-extracción de slots al reutilizar un plan del router"""
+from intent_index import IntentIndex
+
+
+def _plan(mcp: str, action: str, **params) -> list:
+    return [{'id': 1, 'mcp': mcp, 'action': action, 'params': params, 'depends_on': []}]
+
+
+def _index() -> IntentIndex:
+    index = IntentIndex(verify_rate=0)
+    index.add('pon despacito en youtube', _plan('youtube', 'search_video', query='despacito'))
+    index.add('abre la app de whatsapp', _plan('mobile', 'open_app', app_name='whatsapp'))
+    index.add('sube el volumen al 30', _plan('spotify', 'volume', level=30))
+    return index
+
+
+def test_slot_between_fixed_words_takes_the_new_span():
+    plan = _index().lookup('pon La Bamba de Ritchie en youtube')
+    assert plan[0]['params'] == {'query': 'La Bamba de Ritchie'}
+
+
+def test_trailing_slot_keeps_the_template_length():
+    index = _index()
+    assert index.lookup('abre la app de telegram')[0]['params'] == {'app_name': 'telegram'}
+    # Sin palabra fija detrás, "ahora" no entra en el nombre de la app
+    plan = index.lookup('abre la app de telegram ahora')
+    assert plan[0]['params'] == {'app_name': 'telegram'}
+
+
+def test_numeric_slot_is_parsed():
+    plan = _index().lookup('sube el volumen al 75')
+    assert plan[0]['params'] == {'level': 75}
+
+
+def test_unrelated_command_misses():
+    index = _index()
+    assert index.lookup('cuéntame un chiste') is None
+    assert index.stats['misses'] == 1
@@ -0,0 +1,39 @@
+"""JSONStreamParser: objetos emitidos en cuanto se cierran, sea cual sea el troceo"""
+from json_stream import JSONStreamParser
+
+PLAN = ('Claro: {"requires_mcp": true, "actions": ['
+        '{"id": 1, "mcp": "spotify", "action": "pause", "params": {}}, '
+        '{"id": 2, "mcp": "mobile", "action": "open_app", "params": {"app_name": "whats {app}"}}'
+        ']} fin')
+
+
+def _feed(chunks):
+    parser = JSONStreamParser()
+    found = []
+    for chunk in chunks:
+        found.extend(parser.feed(chunk))
+    return found
+
+
+def test_char_by_char_matches_single_chunk():
+    assert _feed(PLAN) == _feed([PLAN])
+
+
+def test_actions_come_before_the_root():
+    paths = [path for path, _ in _feed(PLAN)]
+    assert paths.index(('actions', 0)) < paths.index(('actions', 1)) < paths.index(())
+
+
+def test_action_is_emitted_as_soon_as_it_closes():
+    parser = JSONStreamParser()
+    first_end = PLAN.index('}}') + 2
+    found = parser.feed(PLAN[:first_end])
+    assert (('actions', 0), {'id': 1, 'mcp': 'spotify', 'action': 'pause', 'params': {}}) in found
+    assert all(path != ('actions', 1) for path, _ in found)
+
+
+def test_braces_inside_strings_and_prose_are_ignored():
+    inside = PLAN.index('{app}') + 1
+    found = dict(_feed([PLAN[:9], PLAN[9:inside], PLAN[inside:]]))
+    assert found[('actions', 1)]['params'] == {'app_name': 'whats {app}'}
+    assert found[()]['requires_mcp'] is True
@@ -0,0 +1,29 @@
+"""TokenBucket: relleno por minuto y espera hasta tener presupuesto"""
+import pytest
+
+from llm_client import TokenBucket
+
+
+def test_full_bucket_does_not_wait():
+    bucket = TokenBucket(60)
+    assert bucket.wait_time(10, bucket.updated) == 0.0
+
+
+def test_wait_is_proportional_to_the_missing_tokens():
+    bucket = TokenBucket(60)  # 1 token/s
+    bucket.level = 0.0
+    assert bucket.wait_time(5, bucket.updated) == pytest.approx(5.0)
+
+
+def test_refill_is_capped_at_capacity():
+    bucket = TokenBucket(60)
+    bucket.level = 0.0
+    now = bucket.updated + 3600
+    assert bucket.wait_time(1, now) == 0.0
+    assert bucket.level == 60.0
+
+
+def test_cost_above_capacity_waits_for_a_full_bucket_only():
+    bucket = TokenBucket(60)
+    bucket.level = 30.0
+    assert bucket.wait_time(1000, bucket.updated) == pytest.approx(30.0)